@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+依成交活躍度調整各交易所的輪詢頻率
+固定每 CHECK_INTERVAL 秒輪詢所有交易所時，冷清的市場白白消耗請求，活躍的市場又等太久；
+排程器以每次輪詢看到的新成交數估計成交到達率（EWMA），讓每次輪詢約看到
+POLL_TARGET_TRADES 筆新成交：
+  - 活躍市場縮短間隔（最短 POLL_FLOOR），成交頁全是新成交（可能漏看）時立即減半
+  - 冷清市場拉長間隔（最長 POLL_CEILING）
+  - 間隔不低於該交易所令牌補充速率允許的下限，收到429時加倍
+只有行情沒有成交頁的交易所維持 CHECK_INTERVAL
+"""
+
+import time
+from typing import Dict, List, Optional
+
+from config import (
+    CHECK_INTERVAL, POLL_FLOOR, POLL_CEILING, POLL_TARGET_TRADES,
+    POLL_RATE_ALPHA, POLL_BUDGET_SHARE, EXCHANGE_LIST
+)
+
+
+class VenueSchedule:
+    """單一交易所的輪詢狀態"""
+
+    __slots__ = ("interval", "next_due", "rate", "last_poll", "last_trade_time",
+                 "pending_trades", "overflow", "has_trades", "weight_used", "throttled")
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_due = 0.0  # 啟動時立即輪詢
+        self.rate: Optional[float] = None  # 每秒新成交數（EWMA）
+        self.last_poll: Optional[float] = None
+        self.last_trade_time: Optional[int] = None
+        self.pending_trades = 0
+        self.overflow = False
+        self.has_trades = False
+        self.weight_used = 0.0
+        self.throttled = 0
+
+
+class AdaptiveScheduler:
+    """各交易所獨立的輪詢間隔"""
+
+    def __init__(self, limiter=None, exchanges: Optional[List[str]] = None,
+                 floor: Optional[float] = None, ceiling: Optional[float] = None):
+        self.limiter = limiter
+        self.floor = POLL_FLOOR if floor is None else floor
+        self.ceiling = POLL_CEILING if ceiling is None else ceiling
+        self.venues: Dict[str, VenueSchedule] = {
+            exchange_id: VenueSchedule(CHECK_INTERVAL) for exchange_id in (EXCHANGE_LIST if exchanges is None else exchanges)
+        }
+        self.stats = {"polls": 0, "fixed_equivalent": 0,
+                      "intervals": {exchange_id: float(CHECK_INTERVAL) for exchange_id in self.venues}}
+        self._started = time.monotonic()
+
+    def observe_trades(self, exchange_id: str, trades):
+        """記錄本次成交頁（TradeArrays / TradeRows），計算新成交數"""
+        venue = self.venues.get(exchange_id)
+        if venue is None or not len(trades):
+            return
+        venue.has_trades = True
+        newest = trades.newest()
+        if venue.last_trade_time is None:
+            venue.last_trade_time = newest
+            return
+        fresh = trades.count_after(venue.last_trade_time)
+        venue.pending_trades += fresh
+        # 整頁都是新成交代表上次之後的成交比一頁多，可能已漏看
+        venue.overflow = venue.overflow or fresh == len(trades)
+        venue.last_trade_time = max(venue.last_trade_time, newest)
+
+    def _budget_floor(self, exchange_id: str, venue: VenueSchedule) -> float:
+        """依令牌桶補充速率計算的最短間隔；期間收到429時加倍目前間隔"""
+        if self.limiter is None or exchange_id not in self.limiter.buckets:
+            return self.floor
+        bucket = self.limiter.buckets[exchange_id]
+        weight = bucket.stats['weight_used'] - venue.weight_used
+        venue.weight_used = bucket.stats['weight_used']
+        if bucket.stats['throttled'] > venue.throttled:
+            venue.throttled = bucket.stats['throttled']
+            return min(self.ceiling, venue.interval * 2)
+        if weight <= 0 or bucket.refill <= 0:
+            return self.floor
+        return max(self.floor, weight / (bucket.refill * POLL_BUDGET_SHARE))
+
+    def record_poll(self, exchange_id: str, now: Optional[float] = None):
+        """一次輪詢完成（含回應未變更），更新到達率並排定下次輪詢"""
+        venue = self.venues.get(exchange_id)
+        if venue is None:
+            return
+        now = time.monotonic() if now is None else now
+        self.stats['polls'] += 1
+        elapsed = now - venue.last_poll if venue.last_poll is not None else None
+        venue.last_poll = now
+
+        interval = float(CHECK_INTERVAL)
+        if venue.has_trades and elapsed:
+            observed = venue.pending_trades / elapsed
+            venue.rate = observed if venue.rate is None else (
+                POLL_RATE_ALPHA * observed + (1 - POLL_RATE_ALPHA) * venue.rate
+            )
+            interval = POLL_TARGET_TRADES / venue.rate if venue.rate > 0 else self.ceiling
+            if venue.overflow:
+                interval = min(interval, venue.interval / 2)
+        interval = min(max(interval, self.floor), self.ceiling)
+        interval = max(interval, self._budget_floor(exchange_id, venue))
+
+        venue.pending_trades = 0
+        venue.overflow = False
+        venue.interval = interval
+        venue.next_due = now + interval
+        self.stats['intervals'][exchange_id] = round(interval, 1)
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """到期應輪詢的交易所；取出後先延後到 ceiling（輪詢完成時重新排定，失敗時即為退避）"""
+        now = time.monotonic() if now is None else now
+        due = [exchange_id for exchange_id, venue in self.venues.items() if venue.next_due <= now]
+        for exchange_id in due:
+            self.venues[exchange_id].next_due = now + self.ceiling
+        self.stats['fixed_equivalent'] = int((now - self._started) / CHECK_INTERVAL + 1) * len(self.venues)
+        return due
+
+    def configure(self, exchanges: List[str], floor: Optional[float] = None, ceiling: Optional[float] = None):
+        """設定熱重載：對齊交易所（新增的立即輪詢）並更新間隔上下限"""
+        self.floor = self.floor if floor is None else floor
+        self.ceiling = self.ceiling if ceiling is None else ceiling
+        for exchange_id in list(self.venues):
+            if exchange_id not in exchanges:
+                del self.venues[exchange_id]
+                self.stats['intervals'].pop(exchange_id, None)
+        for exchange_id in exchanges:
+            if exchange_id not in self.venues:
+                self.venues[exchange_id] = VenueSchedule(CHECK_INTERVAL)
+                self.stats['intervals'][exchange_id] = float(CHECK_INTERVAL)
+
+    def next_wakeup(self, now: Optional[float] = None) -> float:
+        """距離下一個到期交易所的秒數；沒有交易所時為 ceiling（仍定期醒來檢查設定檔）"""
+        now = time.monotonic() if now is None else now
+        return max(0.0, min((venue.next_due for venue in self.venues.values()), default=now + self.ceiling) - now)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+警報規則評估
+根據K線顏色、主動買賣比率與盤口失衡判斷是否觸發警報
+買賣比可依 THRESHOLD_MODE 改用各交易所自身分佈的 z 分數或百分位判斷
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from config import (
+    EXCHANGES, BUY_SELL_THRESHOLD, BOOK_IMBALANCE_THRESHOLD,
+    THRESHOLD_MODE, ZSCORE_THRESHOLD, PERCENTILE_THRESHOLD,
+    TAIWAN_TZ, format_taiwan_time
+)
+from streaming_stats import FlowScore
+
+
+def _build_alert_data(exchange_id: str, kline, trigger: str) -> Dict[str, Any]:
+    """組裝警報數據（與 telegram_bot 模板欄位一致）"""
+    return {
+        "exchange": EXCHANGES.get(exchange_id, {}).get('name', exchange_id),
+        "symbol": kline.symbol,
+        "price": kline.close,
+        "buy_volume": kline.buy_volume,
+        "sell_volume": kline.sell_volume,
+        "volume": kline.volume,
+        "book_imbalance": kline.book_imbalance,
+        "trigger": trigger,
+        "kline_time": format_taiwan_time(kline.fetch_time, "%H:%M:%S"),
+        "whale_ratio": getattr(kline, "whale_ratio", None),
+    }
+
+
+def _attach_score(alert_data: Dict[str, Any], score: Optional[FlowScore]):
+    if score is not None and score.warmed_up and score.percentile is not None:
+        alert_data["flow_zscore"] = score.zscore
+        alert_data["flow_percentile"] = score.percentile
+
+
+def _trigger_label(ratio_hit: bool, book_hit: bool) -> str:
+    if ratio_hit and book_hit:
+        return "買賣比+盤口失衡"
+    return "買賣比" if ratio_hit else "盤口失衡"
+
+
+def _flow_hit(kline, score: Optional[FlowScore], buy_side: bool, mode: str) -> Tuple[bool, str]:
+    """買賣比是否異常，回傳 (是否觸發, 觸發條件說明)
+
+    自適應模式在樣本足夠前退回固定買賣比
+    """
+    if mode != "ratio" and score is not None and score.warmed_up:
+        if mode == "zscore":
+            z = score.zscore if buy_side else -score.zscore
+            return z >= ZSCORE_THRESHOLD, f"失衡 z 分數 ≥ {ZSCORE_THRESHOLD}"
+        if mode == "percentile" and score.percentile is not None:
+            pct = score.percentile if buy_side else 1 - score.percentile
+            return pct >= PERCENTILE_THRESHOLD, f"失衡百分位 ≥ {PERCENTILE_THRESHOLD:.0%}"
+
+    if buy_side:
+        return kline.buy_sell_ratio > BUY_SELL_THRESHOLD, f"買/賣比 > {BUY_SELL_THRESHOLD}"
+    return kline.sell_buy_ratio > BUY_SELL_THRESHOLD, f"賣/買比 > {BUY_SELL_THRESHOLD}"
+
+
+def evaluate_kline_alert(exchange_id: str, kline, score: Optional[FlowScore] = None,
+                         mode: Optional[str] = None) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """評估單一交易所K線
+
+    陰線時主動買入比率過高，或前N檔買盤明顯較厚 → BUY_IN_RED
+    陽線時主動賣出比率過高，或前N檔賣盤明顯較厚 → SELL_IN_GREEN
+    score 為該交易所本次買賣失衡相對歷史分佈的評分（見 streaming_stats）
+    mode 未指定時使用目前的 THRESHOLD_MODE（設定熱重載後立即生效）
+    """
+    mode = mode or THRESHOLD_MODE
+    imbalance = kline.book_imbalance
+
+    if kline.is_red:
+        ratio_hit, condition = _flow_hit(kline, score, True, mode)
+        book_hit = imbalance is not None and imbalance >= BOOK_IMBALANCE_THRESHOLD
+        if ratio_hit or book_hit:
+            alert_data = _build_alert_data(exchange_id, kline, _trigger_label(ratio_hit, book_hit))
+            alert_data["buy_ratio"] = kline.buy_sell_ratio
+            alert_data["condition"] = condition
+            _attach_score(alert_data, score)
+            return "BUY_IN_RED", alert_data
+
+    elif kline.is_green:
+        ratio_hit, condition = _flow_hit(kline, score, False, mode)
+        book_hit = imbalance is not None and imbalance <= -BOOK_IMBALANCE_THRESHOLD
+        if ratio_hit or book_hit:
+            alert_data = _build_alert_data(exchange_id, kline, _trigger_label(ratio_hit, book_hit))
+            alert_data["sell_ratio"] = kline.sell_buy_ratio
+            alert_data["condition"] = condition
+            _attach_score(alert_data, score)
+            return "SELL_IN_GREEN", alert_data
+
+    return None, None
+
+
+def evaluate_candle_alert(exchange_id: str, candle) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """評估已收盤的彙總K線（candle_rollup.FlowCandle）
+
+    失衡分佈統計是以每次掃描的快照累積，與較大時間框架不可比，固定使用買賣比門檻
+    """
+    alert_type, alert_data = evaluate_kline_alert(exchange_id, candle, mode="ratio")
+    if alert_type is not None:
+        alert_data["timeframe"] = candle.timeframe
+        alert_data["kline_time"] = candle.label()
+    return alert_type, alert_data
+
+
+def evaluate_large_trade(exchange_id: str, kline) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """本次新成交中有成交額超過 LARGE_TRADE_QUANTILE 分位的大額成交 → LARGE_TRADE"""
+    trade = getattr(kline, "large_trade", None)
+    if not trade:
+        return None, None
+    alert_data = _build_alert_data(exchange_id, kline, "大額成交")
+    alert_data["large_trade"] = trade
+    alert_data["kline_time"] = format_taiwan_time(datetime.fromtimestamp(trade["time"] / 1000, TAIWAN_TZ), "%H:%M:%S")
+    return "LARGE_TRADE", alert_data
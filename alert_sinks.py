@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+多通道警報分發
+同一則警報同時送到多個通道（多個 Telegram 聊天室、Webhook、本機 JSONL 檔、Unix socket），
+每個通道有獨立的有界佇列、批次與重試策略；
+慢速或失敗的通道只會讓自己的佇列丟棄最舊警報，不會拖慢其他通道或掃描器
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from config import (
+    ALERT_SINKS, ALERT_SINK_QUEUE_SIZE, ALERT_SINK_MAX_RETRIES,
+    TELEGRAM_BOT_TOKEN
+)
+from radar_logging import get_logger
+from scan_profiler import profiler
+
+logger = get_logger("alerts")
+
+
+class AlertSink:
+    """通道基底類別：子類別實作 deliver(batch)"""
+
+    kind = "sink"
+
+    def __init__(self, name: Optional[str] = None, queue_size: Optional[int] = None,
+                 batch_size: int = 1, batch_wait: float = 0.0,
+                 max_retries: Optional[int] = None, retry_backoff: float = 1.0):
+        self.name = name or self.kind
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=ALERT_SINK_QUEUE_SIZE if queue_size is None else queue_size)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_retries = ALERT_SINK_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = retry_backoff
+        self._task: Optional[asyncio.Task] = None
+        self._latency_total = 0.0
+        self.stats = {"sent": 0, "dropped": 0, "failed": 0, "retries": 0,
+                      "queued": 0, "avg_ms": 0.0, "max_ms": 0.0}
+
+    def offer(self, alert: Dict[str, Any]):
+        """非阻塞放入佇列，已滿時丟棄最舊一則"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.stats['dropped'] += 1
+        self.queue.put_nowait((time.monotonic(), alert))
+        self.stats['queued'] = self.queue.qsize()
+
+    async def deliver(self, batch: List[Dict[str, Any]]):
+        """送出一批警報；逐則送出的通道可從 batch 移除已送出的，重試時只送剩下的"""
+        raise NotImplementedError
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def _next_batch(self) -> List[tuple]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _deliver_with_retry(self, alerts: List[Dict[str, Any]]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                with profiler.phase("notify", self.name):
+                    await self.deliver(alerts)
+                return True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("❌ 警報通道 %s 發送失敗: %s: %s", self.name, type(e).__name__, str(e)[:80],
+                                 extra={"sink": self.name, "error": type(e).__name__, "alerts": len(alerts)})
+                    return False
+                self.stats['retries'] += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+        return False
+
+    async def run(self):
+        while True:
+            batch = await self._next_batch()
+            self.stats['queued'] = self.queue.qsize()
+            alerts = [alert for _, alert in batch]
+            try:
+                delivered = await self._deliver_with_retry(alerts)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if delivered:
+                now = time.monotonic()
+                for enqueued_at, _ in batch:
+                    latency = (now - enqueued_at) * 1000
+                    self._latency_total += latency
+                    self.stats['max_ms'] = round(max(self.stats['max_ms'], latency), 1)
+                self.stats['sent'] += len(batch)
+                self.stats['avg_ms'] = round(self._latency_total / self.stats['sent'], 1)
+            else:
+                # alerts 只剩未送出的部分
+                self.stats['sent'] += len(batch) - len(alerts)
+                self.stats['failed'] += len(alerts)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """等待佇列中與發送中的警報處理完（最多 drain_timeout 秒）後停止"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.close()
+
+
+class TelegramSink(AlertSink):
+    """Telegram 聊天室（每則警報一則訊息，每則間隔0.5秒）"""
+
+    kind = "telegram"
+
+    def __init__(self, chat_id: str, token: Optional[str] = TELEGRAM_BOT_TOKEN, **kwargs):
+        kwargs.setdefault("name", f"telegram:{chat_id}")
+        super().__init__(**kwargs)
+        self.chat_id = chat_id
+        self.url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def open(self):
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+    async def deliver(self, batch: List[Dict[str, Any]]):
+        from telegram_bot import bot
+
+        messages = bot.render_batch([(alert['alert_type'], alert) for alert in batch])
+        for message in messages:
+            if not message:
+                del batch[0]
+                continue
+            payload = {"chat_id": self.chat_id, "text": message, "parse_mode": "HTML",
+                       "disable_web_page_preview": True}
+            async with self.session.post(self.url, json=payload) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"Telegram HTTP {response.status}")
+            del batch[0]  # 已送出：重試時不再重發
+            # 避免Telegram API限制（只延遲本通道）
+            await asyncio.sleep(0.5)
+
+
+class WebhookSink(AlertSink):
+    """HTTP Webhook：每批以 JSON 陣列 POST"""
+
+    kind = "webhook"
+
+    def __init__(self, url: str, timeout: float = 5.0, **kwargs):
+        kwargs.setdefault("batch_size", 20)
+        kwargs.setdefault("batch_wait", 0.5)
+        super().__init__(**kwargs)
+        self.url = url
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def open(self):
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+    async def deliver(self, batch: List[Dict[str, Any]]):
+        async with self.session.post(self.url, json=batch) as response:
+            response.raise_for_status()
+
+
+class JsonlFileSink(AlertSink):
+    """本機 JSONL 檔（每則一行，寫入在執行緒中進行）"""
+
+    kind = "jsonl"
+
+    def __init__(self, path: str, **kwargs):
+        kwargs.setdefault("name", f"jsonl:{path}")
+        kwargs.setdefault("batch_size", 100)
+        kwargs.setdefault("batch_wait", 0.2)
+        super().__init__(**kwargs)
+        self.path = path
+
+    def _append(self, lines: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    async def deliver(self, batch: List[Dict[str, Any]]):
+        lines = "".join(json.dumps(alert, ensure_ascii=False, default=str) + "\n" for alert in batch)
+        await asyncio.to_thread(self._append, lines)
+
+
+class UnixSocketSink(AlertSink):
+    """Unix socket 消費端（JSON lines，斷線時下次發送重新連線）"""
+
+    kind = "unix"
+
+    def __init__(self, path: str, **kwargs):
+        kwargs.setdefault("name", f"unix:{path}")
+        kwargs.setdefault("batch_size", 50)
+        super().__init__(**kwargs)
+        self.path = path
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def deliver(self, batch: List[Dict[str, Any]]):
+        if self._writer is None or self._writer.is_closing():
+            _, self._writer = await asyncio.open_unix_connection(self.path)
+        try:
+            self._writer.write("".join(json.dumps(alert, ensure_ascii=False, default=str) + "\n"
+                                       for alert in batch).encode("utf-8"))
+            await asyncio.wait_for(self._writer.drain(), timeout=5)
+        except Exception:
+            await self.close()
+            raise
+
+
+SINK_TYPES = {cls.kind: cls for cls in (TelegramSink, WebhookSink, JsonlFileSink, UnixSocketSink)}
+
+
+def build_sinks(specs: List[Dict[str, Any]] = ALERT_SINKS) -> List[AlertSink]:
+    """依配置建立通道：{"type": "webhook", "url": ..., 其餘為建構參數}"""
+    sinks = []
+    for spec in specs:
+        options = dict(spec)
+        sink_type = options.pop("type")
+        if sink_type not in SINK_TYPES:
+            raise ValueError(f"未知的警報通道類型: {sink_type}")
+        sinks.append(SINK_TYPES[sink_type](**options))
+    return sinks
+
+
+class AlertFanout:
+    """把警報分發到所有通道"""
+
+    def __init__(self, sinks: Optional[List[AlertSink]] = None):
+        self.sinks = sinks if sinks is not None else build_sinks()
+        self.stats = {sink.name: sink.stats for sink in self.sinks}
+
+    async def start(self):
+        for sink in self.sinks:
+            await sink.open()
+            sink.start()
+        logger.info("📣 警報分發已啟動: %s", ", ".join(self.stats) or "無通道", extra={"sinks": list(self.stats)})
+
+    async def stop(self):
+        await asyncio.gather(*(sink.stop() for sink in self.sinks))
+
+    def publish(self, alert_type: str, alert_data: Dict[str, Any]):
+        """非阻塞：放入每個通道的佇列後立即返回"""
+        alert = dict(alert_data, alert_type=alert_type, published_at=time.time())
+        for sink in self.sinks:
+            sink.offer(alert)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+警報引擎吞吐量基準測試
+以 market_simulator 的模擬數據（數千個交易對 × 所有交易所）端到端驅動：
+  成交解析與彙總（掃描器的 summarize_page，含成交額草圖）→ 規則評估與去重 (evaluate_tick)
+回報每秒處理的成交數、每輪延遲分位數與記憶體用量，並以注入的異常計算召回率與誤報率
+
+用法: python bench_alert_engine.py [--symbols=1000] [--ticks=60] [--warmup=20] [--seed=0] [--cold] [--tracemalloc]
+暖機輪只用於累積統計，不計時也不計分；成交額草圖需 WHALE_MIN_SAMPLES 筆才判斷大額成交，
+預設以模擬器的基準成交額分佈預先填入（相當於從 trade_sketches.json 檢查點啟動），--cold 則從零開始
+"""
+
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Tuple
+
+import numpy as np
+
+import dusk_monitor
+from config import TAIWAN_TZ, EXCHANGES, WHALE_MIN_SAMPLES
+from candle_rollup import RollupEngine
+from market_simulator import SyntheticMarket, SyntheticTick, ANOMALY_TYPES
+from multi_exchange_scanner import EnhancedKlineData, summarize_page
+from radar_state import RadarState
+from streaming_stats import FlowStatsStore
+from trade_sketch import TradeSizeStore
+
+
+def stream_id(symbol: str, exchange_id: str) -> str:
+    """模擬數據的串流鍵：警報引擎以交易所 ID 為鍵，這裡以「交易對@交易所」區分各交易對"""
+    return f"{symbol}@{exchange_id}"
+
+
+def build_klines(tick: SyntheticTick, trade_sizes: TradeSizeStore) -> Dict[str, EnhancedKlineData]:
+    """解析與彙總一輪成交頁（與掃描器相同，經 summarize_page）
+
+    模擬數據沒有 24 小時行情，開收盤價取自最近成交視窗
+    """
+    fetch_time = datetime.fromtimestamp(tick.time_ms / 1000, TAIWAN_TZ)
+    kline_data = {}
+    for (symbol, exchange_id), page in tick.pages.items():
+        _, summary, flow = summarize_page(exchange_id, page, trade_sizes, symbol)
+        if summary is None:
+            continue
+        kline_data[stream_id(symbol, exchange_id)] = EnhancedKlineData(
+            exchange=EXCHANGES[exchange_id]['name'], symbol=symbol,
+            open=summary.open, high=summary.high, low=summary.low, close=summary.close,
+            volume=summary.volume, buy_volume=summary.buy_volume, sell_volume=summary.sell_volume,
+            vwap=summary.vwap, whale_buy_volume=flow.buy_volume, whale_sell_volume=flow.sell_volume,
+            large_trade=flow.large_trade, fetch_time=fetch_time
+        )
+    for (symbol, exchange_id), price in tick.prices.items():
+        kline_data[stream_id(symbol, exchange_id)] = EnhancedKlineData(
+            exchange=EXCHANGES[exchange_id]['name'], symbol=symbol,
+            open=price, high=price, low=price, close=price, volume=0, fetch_time=fetch_time
+        )
+    return kline_data
+
+
+def seed_trade_sizes(market: SyntheticMarket, trade_sizes: TradeSizeStore, samples: int = WHALE_MIN_SAMPLES):
+    """以模擬器的基準成交額分佈預先填入各串流的草圖"""
+    for index, symbol in enumerate(market.symbols):
+        for exchange_id in market.trade_venues:
+            trade_sizes.get(symbol, exchange_id).update_many(market.baseline_notional(index, samples))
+
+
+def _percentile(values, q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_benchmark(symbols: int = 1000, ticks: int = 60, warmup: int = 20, seed: int = 0,
+                  seed_sketches: bool = True, trace_memory: bool = False) -> Dict:
+    market = SyntheticMarket(symbols=symbols, seed=seed)
+    state = RadarState()
+    flow_stats = FlowStatsStore(path=os.devnull)
+    trade_sizes = TradeSizeStore(path=os.devnull)
+    rollups = RollupEngine()
+    if seed_sketches:
+        seed_trade_sizes(market, trade_sizes)
+    dusk_monitor.alert_minute_tracker.clear()
+    dusk_monitor.last_large_trade_time.clear()
+
+    print("⏱️  警報引擎吞吐量基準測試")
+    print("=" * 70)
+    print(f"交易對 {symbols:,} × 交易所 {len(market.exchanges)}，每輪 {market.interval:g} 秒，"
+          f"暖機 {warmup} 輪 + 計時 {ticks} 輪（seed {seed}）")
+    print(f"成交量對數標準差 {market.size_sigma:.3f}（依買賣比門檻校準），"
+          f"草圖{'預先填入 ' + str(WHALE_MIN_SAMPLES) + ' 筆' if seed_sketches else '從零開始'}")
+
+    if trace_memory:
+        tracemalloc.start()
+    generate_sec = 0.0
+    parse_ms, evaluate_ms, tick_ms = [], [], []
+    trades = klines = 0
+    # 召回率：(輪次, 串流鍵, 類型) -> 是否偵測到
+    truth: Dict[Tuple[int, str, str], bool] = {}
+    skipped = {"cold": 0, "deduped": 0}  # 草圖未暖機 / 本分鐘已觸發過而被去重
+    false_positives = dict.fromkeys(ANOMALY_TYPES, 0)
+    devnull = open(os.devnull, "w")
+
+    for number in range(warmup + ticks):
+        started = time.perf_counter()
+        tick = market.next_tick()
+        generate_sec += time.perf_counter() - started
+        scored = number >= warmup
+        scan_time = datetime.fromtimestamp(tick.time_ms / 1000, TAIWAN_TZ)
+        minute_key = scan_time.strftime("%Y%m%d%H%M")
+
+        expected = {}
+        for event in tick.anomalies if scored else ():
+            key = stream_id(event.symbol, event.exchange_id)
+            if event.kind == "LARGE_TRADE" and trade_sizes.get(event.symbol, event.exchange_id).n < WHALE_MIN_SAMPLES:
+                skipped["cold"] += 1
+                continue
+            if event.kind != "LARGE_TRADE" and key in dusk_monitor.alert_minute_tracker.get(minute_key, ()):
+                skipped["deduped"] += 1
+                continue
+            expected[(key, event.kind)] = (tick.tick, key, event.kind)
+            truth[(tick.tick, key, event.kind)] = False
+
+        t0 = time.perf_counter()
+        kline_data = build_klines(tick, trade_sizes)
+        t1 = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            outgoing = dusk_monitor.evaluate_tick(state, flow_stats, rollups, kline_data, scan_time)
+        t2 = time.perf_counter()
+        if not scored:
+            continue
+
+        parse_ms.append((t1 - t0) * 1000)
+        evaluate_ms.append((t2 - t1) * 1000)
+        tick_ms.append((t2 - t0) * 1000)
+        trades += tick.trades
+        klines += len(kline_data)
+        for alert_type, alert_data in outgoing:
+            if alert_data.get('timeframe'):
+                continue  # 彙總K線收盤警報不對應單輪注入的異常
+            hit = expected.get((alert_data['exchange'], alert_type))
+            if hit is not None:
+                truth[hit] = True
+            else:
+                false_positives[alert_type] = false_positives.get(alert_type, 0) + 1
+    devnull.close()
+
+    elapsed = sum(tick_ms) / 1000
+    report = {
+        "trades_per_sec": trades / elapsed if elapsed else 0.0,
+        "klines_per_sec": klines / elapsed if elapsed else 0.0,
+        "tick_ms": {"p50": _percentile(tick_ms, 50), "p95": _percentile(tick_ms, 95),
+                    "max": max(tick_ms, default=0.0)},
+        "parse_ms_p50": _percentile(parse_ms, 50),
+        "evaluate_ms_p50": _percentile(evaluate_ms, 50),
+        "recall": {},
+        "skipped": skipped,
+        "false_positive_rate": sum(false_positives.values()) / klines if klines else 0.0,
+        "false_positives": false_positives,
+    }
+    for kind in ANOMALY_TYPES:
+        hits = [found for (_, _, event_kind), found in truth.items() if event_kind == kind]
+        report["recall"][kind] = (sum(hits), len(hits))
+
+    print("-" * 70)
+    print(f"成交數       {trades:>12,}   ({report['trades_per_sec']:,.0f} 筆/秒)")
+    print(f"K線快照      {klines:>12,}   ({report['klines_per_sec']:,.0f} 個/秒)")
+    print(f"每輪延遲     p50 {report['tick_ms']['p50']:.1f} ms   p95 {report['tick_ms']['p95']:.1f} ms   "
+          f"max {report['tick_ms']['max']:.1f} ms")
+    print(f"  解析+彙總  p50 {report['parse_ms_p50']:.1f} ms   規則+去重+狀態 p50 {report['evaluate_ms_p50']:.1f} ms")
+    print(f"模擬數據產生 {generate_sec:.1f} 秒（不計入）")
+    print("-" * 70)
+    for kind, (found, total) in report["recall"].items():
+        rate = f"{found / total:.1%}" if total else "—"
+        print(f"召回率 {kind:14} {found:>5}/{total:<5} {rate:>7}")
+    print(f"略過：草圖未暖機 {skipped['cold']}、本分鐘已觸發 {skipped['deduped']}")
+    print(f"誤報率（未注入異常卻觸發 / K線快照）{report['false_positive_rate']:.3%}："
+          + "、".join(f"{kind} {count}" for kind, count in false_positives.items()))
+    print("-" * 70)
+
+    try:
+        import resource
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        report["peak_rss_mb"] = peak_mb
+        print(f"記憶體峰值 (RSS) {peak_mb:,.0f} MB")
+    except ImportError:
+        pass
+    if trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report["traced_peak_mb"] = peak / 1024 / 1024
+        print(f"Python 配置 目前 {current / 1024 / 1024:,.1f} MB / 峰值 {peak / 1024 / 1024:,.1f} MB")
+    print(f"狀態規模：草圖 {len(trade_sizes.sketches):,}、失衡統計 {len(flow_stats):,}、"
+          f"歷史 {len(state.history)} 輪")
+    print("=" * 70)
+    return report
+
+
+if __name__ == "__main__":
+    options = {"symbols": 1000, "ticks": 60, "warmup": 20, "seed": 0}
+    trace = False
+    seeded = True
+    for arg in sys.argv[1:]:
+        if arg == "--tracemalloc":
+            trace = True
+            continue
+        if arg == "--cold":
+            seeded = False
+            continue
+        name, _, value = arg.lstrip("-").partition("=")
+        if name not in options:
+            sys.exit(f"未知參數: {arg}")
+        options[name] = int(value)
+    run_benchmark(seed_sketches=seeded, trace_memory=trace, **options)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+成交解析微基準測試
+  1. 只算買賣量 / 高低價：原本逐筆 float()/字串比較的迴圈 vs 逐筆解析 (TradeRows) vs 向量化解析 (TradeArrays)
+  2. 掃描器每頁的完整工作（解析、最近 20 筆彙總、分鐘買賣量、成交額草圖、成交到達率）：
+     TradeRows vs TradeArrays，用來決定 PAGE_VECTORIZE_MIN_TRADES
+各路徑結果先確認一致；耗時取多次重複的最小值（降低機器雜訊）
+"""
+
+import os
+import random
+import sys
+import timeit
+
+from adaptive_poller import AdaptiveScheduler
+from config import TRADE_FIELD_MAPPING
+from trade_normalizer import (
+    normalize_trades, parse_rows, summarize_trades, minute_flow, PAGE_VECTORIZE_MIN_TRADES
+)
+from trade_sketch import TradeSizeStore
+
+
+def make_page(exchange_id: str, size: int, seed: int = 0) -> list:
+    """產生與交易所格式相同的模擬成交頁面"""
+    rng = random.Random(seed)
+    base_ms = 1_700_000_000_000
+    page = []
+    for i in range(size):
+        price = f"{0.25 + rng.uniform(-0.01, 0.01):.5f}"
+        qty = f"{rng.uniform(1, 5000):.2f}"
+        is_buy = rng.random() < 0.5
+        ts = base_ms + i * 250
+        if exchange_id == "kraken":
+            page.append([price, qty, ts / 1000, "b" if is_buy else "s", "m", "", i])
+        elif exchange_id == "okx":
+            page.append({"instId": "DUSK-USDT", "tradeId": str(i), "px": price, "sz": qty,
+                         "side": "buy" if is_buy else "sell", "ts": str(ts)})
+        elif exchange_id == "bybit":
+            page.append({"execId": str(i), "symbol": "DUSKUSDT", "price": price, "size": qty,
+                         "side": "Buy" if is_buy else "Sell", "time": str(ts)})
+        elif exchange_id == "gateio":
+            page.append({"id": str(i), "create_time_ms": f"{ts}.000", "side": "buy" if is_buy else "sell",
+                         "amount": qty, "price": price})
+        elif exchange_id == "mexc":
+            page.append({"id": None, "price": price, "qty": qty, "quoteQty": "0",
+                         "time": ts, "isBuyerMaker": not is_buy, "isBestMatch": True})
+    if TRADE_FIELD_MAPPING[exchange_id]['newest_first']:
+        page.reverse()
+    return page
+
+
+def legacy_loop(exchange_id: str, trades: list):
+    """原 fetch_single_exchange 的逐筆迴圈（含 Kraken 的價格統計）"""
+    buy_vol = 0.0
+    sell_vol = 0.0
+    prices = []
+    for trade in trades:
+        if exchange_id == "kraken":
+            price, vol, side = float(trade[0]), float(trade[1]), trade[3]
+            prices.append(price)
+            if side == 'b':
+                buy_vol += vol
+            elif side == 's':
+                sell_vol += vol
+        elif exchange_id == "okx":
+            vol = float(trade['sz'])
+            prices.append(float(trade['px']))
+            if trade['side'] == 'buy':
+                buy_vol += vol
+            elif trade['side'] == 'sell':
+                sell_vol += vol
+        elif exchange_id == "bybit":
+            vol = float(trade['size'])
+            prices.append(float(trade['price']))
+            if trade['side'] == 'Buy':
+                buy_vol += vol
+            elif trade['side'] == 'Sell':
+                sell_vol += vol
+        elif exchange_id == "gateio":
+            vol = float(trade['amount'])
+            prices.append(float(trade['price']))
+            if trade['side'] == 'buy':
+                buy_vol += vol
+            elif trade['side'] == 'sell':
+                sell_vol += vol
+        elif exchange_id == "mexc":
+            vol = float(trade['qty'])
+            prices.append(float(trade['price']))
+            if not trade['isBuyerMaker']:
+                buy_vol += vol
+            else:
+                sell_vol += vol
+    return buy_vol, sell_vol, min(prices), max(prices)
+
+
+def _time_us(func, size: int) -> float:
+    number = max(10, 20000 // size)
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def scan_page(exchange_id: str, page, store: TradeSizeStore, scheduler: AdaptiveScheduler, watermark: int):
+    """掃描器 _summarize 對一頁成交做的工作（page 為已解析的 TradeRows / TradeArrays）"""
+    window = page.tail(20)
+    flow = minute_flow(page, watermark)
+    whales = store.ingest("DUSK/USDT", exchange_id, page, window)
+    scheduler.observe_trades(exchange_id, page)
+    return summarize_trades(window), flow, whales
+
+
+def warm_store(exchange_id: str, page) -> TradeSizeStore:
+    """已暖機、且已看過本頁的草圖（與穩定運作時相同：重疊的成交頁只有少數新成交）"""
+    store = TradeSizeStore(path=os.devnull)
+    store.get("DUSK/USDT", exchange_id).update_many(random.Random(1).uniform(1, 2000) for _ in range(2000))
+    store.ingest("DUSK/USDT", exchange_id, normalize_trades(exchange_id, page[:len(page) // 2]
+                                                            if not TRADE_FIELD_MAPPING[exchange_id]['newest_first']
+                                                            else page[len(page) // 2:]), normalize_trades(exchange_id, []))
+    return store
+
+
+def run_benchmark(sizes=(20, 60, 100, 500, 1000)):
+    print("⏱️  成交解析基準測試（每頁平均耗時，微秒；加速為相對左側基準）")
+    print("=" * 78)
+    print("1. 只算買賣量 / 高低價")
+    print(f"{'交易所':10} {'筆數':>8} {'逐筆迴圈':>10} {'TradeRows':>10} {'加速':>7} {'向量化':>10} {'加速':>7}")
+    print("-" * 78)
+    for exchange_id in ("kraken", "okx", "bybit", "gateio", "mexc"):
+        for size in sizes:
+            page = make_page(exchange_id, size)
+            buy_vol, sell_vol, low, high = legacy_loop(exchange_id, page)
+            for summary in (summarize_trades(parse_rows(exchange_id, page)),
+                            summarize_trades(normalize_trades(exchange_id, page))):
+                assert abs(summary.buy_volume - buy_vol) < 1e-6 * max(buy_vol, 1)
+                assert abs(summary.sell_volume - sell_vol) < 1e-6 * max(sell_vol, 1)
+                assert summary.low == low and summary.high == high
+            assert parse_rows(exchange_id, page).timestamp == normalize_trades(exchange_id, page).timestamp.tolist()
+
+            legacy_us = _time_us(lambda: legacy_loop(exchange_id, page), size)
+            rows_us = _time_us(lambda: summarize_trades(parse_rows(exchange_id, page)), size)
+            vector_us = _time_us(lambda: summarize_trades(normalize_trades(exchange_id, page)), size)
+            print(f"{exchange_id:10} {size:>8} {legacy_us:>10.1f} {rows_us:>10.1f} {legacy_us / rows_us:>6.1f}x "
+                  f"{vector_us:>10.1f} {legacy_us / vector_us:>6.1f}x")
+
+    print("=" * 78)
+    print(f"2. 掃描器整頁流程（目前在 {PAGE_VECTORIZE_MIN_TRADES} 筆以上改用向量化）")
+    print(f"{'交易所':10} {'筆數':>8} {'TradeRows':>10} {'向量化':>10} {'向量化加速':>10}")
+    print("-" * 78)
+    for exchange_id in ("kraken", "okx", "bybit", "gateio", "mexc"):
+        for size in sizes:
+            page = make_page(exchange_id, size)
+            parsed = normalize_trades(exchange_id, page)
+            watermark = int(parsed.timestamp[size // 2])
+            results = []
+            for parse in (parse_rows, normalize_trades):
+                store = warm_store(exchange_id, page)
+                results.append(scan_page(exchange_id, parse(exchange_id, page), store,
+                                         AdaptiveScheduler(exchanges=[exchange_id]), watermark))
+                results[-1] += (store.get("DUSK/USDT", exchange_id).n,)
+            (rows_summary, rows_flow, rows_whales, rows_n), (vec_summary, vec_flow, vec_whales, vec_n) = results
+            assert rows_n == vec_n and rows_flow.keys() == vec_flow.keys()
+            assert all(abs(a - b) < 1e-6 * max(a, 1) for minute in rows_flow
+                       for a, b in zip(rows_flow[minute], vec_flow[minute]))
+            assert abs(rows_summary.vwap - vec_summary.vwap) < 1e-9 and rows_whales.threshold == vec_whales.threshold
+            assert abs(rows_whales.buy_volume - vec_whales.buy_volume) < 1e-6 * max(rows_whales.buy_volume, 1)
+
+            times = []
+            for parse in (parse_rows, normalize_trades):
+                store = warm_store(exchange_id, page)
+                scheduler = AdaptiveScheduler(exchanges=[exchange_id])
+                times.append(_time_us(lambda: scan_page(exchange_id, parse(exchange_id, page), store,
+                                                        scheduler, watermark), size))
+            print(f"{exchange_id:10} {size:>8} {times[0]:>10.1f} {times[1]:>10.1f} {times[0] / times[1]:>9.1f}x")
+
+    print("=" * 78)
+
+if __name__ == "__main__":
+    sizes = tuple(int(arg) for arg in sys.argv[1:]) or (20, 60, 100, 500, 1000)
+    run_benchmark(sizes)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+多時間框架K線彙總
+以交易所的已收盤 1m K線（kline_fetcher 快取）為基礎，分鐘收盤時再增量併入 5m / 15m / 1h，
+每次更新 O(1)，不需要向交易所另外請求較大時間框架的K線
+
+1m 的開高低收與成交量取自交易所K線；主動買賣量由成交頁累計，
+只計入時間晚於已計入最新成交時間的成交，並依成交所在分鐘歸入對應K線，
+重疊的成交頁、沿用的未變更回應與各交易所的輪詢頻率都不會重複計算
+（成交頁未涵蓋的成交不計，極活躍的交易所買賣量可能低於K線成交量）
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import EXCHANGES, ROLLUP_TIMEFRAMES, ROLLUP_FLOW_GRACE, TIMEFRAME_SECONDS, SYMBOL, TAIWAN_TZ
+
+BASE_TIMEFRAME = "1m"
+MAX_PENDING_MINUTES = 60  # K線持續取不到時，每個交易所最多保留的未收盤分鐘買賣量
+
+
+@dataclass
+class FlowCandle:
+    """含主動買賣量的K線（欄位與 EnhancedKlineData 相容，可直接套用警報規則）"""
+    exchange: str
+    timeframe: str
+    time: int  # 開盤時間（毫秒）
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float = 0.0
+    buy_volume: float = 0.0
+    sell_volume: float = 0.0
+    symbol: str = SYMBOL
+    book_imbalance: Optional[float] = None
+    fetch_time: Optional[datetime] = None  # 最後一筆數據的時間
+    closed: bool = False
+
+    @property
+    def is_red(self) -> bool:
+        return self.close < self.open
+
+    @property
+    def is_green(self) -> bool:
+        return self.close > self.open
+
+    @property
+    def buy_sell_ratio(self) -> float:
+        if self.sell_volume > 0:
+            return self.buy_volume / self.sell_volume
+        elif self.buy_volume > 0:
+            return 99.0  # 只有買入
+        return 1.0
+
+    @property
+    def sell_buy_ratio(self) -> float:
+        if self.buy_volume > 0:
+            return self.sell_volume / self.buy_volume
+        elif self.sell_volume > 0:
+            return 99.0  # 只有賣出
+        return 1.0
+
+    @property
+    def end_time(self) -> int:
+        return self.time + TIMEFRAME_SECONDS[self.timeframe] * 1000
+
+    def merge(self, other: "FlowCandle"):
+        """併入時間較晚的K線（開盤價不變）"""
+        self.high = max(self.high, other.high)
+        self.low = min(self.low, other.low)
+        self.close = other.close
+        self.volume += other.volume
+        self.buy_volume += other.buy_volume
+        self.sell_volume += other.sell_volume
+        self.book_imbalance = other.book_imbalance
+        self.fetch_time = other.fetch_time
+
+    def copy_as(self, timeframe: str, start: int) -> "FlowCandle":
+        return FlowCandle(self.exchange, timeframe, start, self.open, self.high, self.low, self.close,
+                          self.volume, self.buy_volume, self.sell_volume, self.symbol,
+                          self.book_imbalance, self.fetch_time)
+
+    def label(self) -> str:
+        """台灣時間區間，如 14:05–14:10"""
+        start = datetime.fromtimestamp(self.time / 1000, TAIWAN_TZ)
+        end = start + timedelta(seconds=TIMEFRAME_SECONDS[self.timeframe])
+        return f"{start:%H:%M}–{end:%H:%M}"
+
+
+def _bucket_start(time_ms: int, timeframe: str) -> int:
+    interval = TIMEFRAME_SECONDS[timeframe] * 1000
+    return time_ms - time_ms % interval
+
+
+class MinuteCandleBuilder:
+    """由交易所的已收盤 1m K線與新成交的買賣量組出各交易所的 1m 基礎K線
+
+    K線收盤後，等看到收盤時間之後的成交（或超過 ROLLUP_FLOW_GRACE 秒）才輸出，
+    讓下一輪成交頁補齊該分鐘最後幾秒的成交
+    """
+
+    def __init__(self, grace: Optional[float] = None):
+        self.grace = grace  # None：每次收盤時讀取 ROLLUP_FLOW_GRACE（設定熱重載後立即生效）
+        self.interval_ms = TIMEFRAME_SECONDS[BASE_TIMEFRAME] * 1000
+        self.flow: Dict[str, Dict[int, List[float]]] = {}  # 交易所 -> 分鐘 -> [主動買入量, 主動賣出量]
+        self.last_trade_time: Dict[str, int] = {}  # 已計入的最新成交時間（毫秒）
+        self.last_emitted: Dict[str, int] = {}  # 已輸出的最新 1m K線開盤時間（毫秒）
+        self.latest: Dict[str, object] = {}  # 各交易所最新快照（交易所名稱、交易對、盤口失衡）
+
+    def add_trades(self, exchange_id: str, kline):
+        """累計快照中尚未計入的成交（kline.minute_flow 依成交所在分鐘彙總）"""
+        self.latest[exchange_id] = kline
+        last_time = kline.last_trade_time
+        if last_time is None or last_time <= self.last_trade_time.get(exchange_id, -1):
+            return  # 沒有新成交（含沿用上次結果的未變更回應）
+        self.last_trade_time[exchange_id] = last_time
+        emitted = self.last_emitted.get(exchange_id, -1)
+        buckets = self.flow.setdefault(exchange_id, {})
+        for minute, (buy, sell) in (kline.minute_flow or {}).items():
+            if minute <= emitted:
+                continue  # 該分鐘K線已輸出，遲到的成交不再改寫
+            bucket = buckets.setdefault(minute, [0.0, 0.0])
+            bucket[0] += buy
+            bucket[1] += sell
+        while len(buckets) > MAX_PENDING_MINUTES:
+            del buckets[min(buckets)]
+
+    def close(self, exchange_id: str, candles, now_ms: int) -> List[FlowCandle]:
+        """併入交易所的已收盤 1m K線（依時間排序），回傳可輸出的 1m K線"""
+        last = self.last_emitted.get(exchange_id)
+        if last is None:
+            # 首次看到K線歷史：之前的分鐘沒有完整成交數據，從下一根開始輸出
+            if candles:
+                self.last_emitted[exchange_id] = candles[-1].time
+            return []
+
+        fresh = []
+        for candle in reversed(candles):
+            if candle.time <= last:
+                break
+            fresh.append(candle)
+
+        closed = []
+        seen = self.last_trade_time.get(exchange_id, -1)
+        buckets = self.flow.get(exchange_id, {})
+        kline = self.latest.get(exchange_id)
+        grace_ms = int((ROLLUP_FLOW_GRACE if self.grace is None else self.grace) * 1000)
+        for candle in reversed(fresh):
+            end = candle.time + self.interval_ms
+            if seen < end and now_ms < end + grace_ms:
+                break  # 尚未看到收盤後的成交，下一輪再輸出
+            buy, sell = buckets.pop(candle.time, (0.0, 0.0))
+            closed.append(FlowCandle(
+                kline.exchange if kline is not None else EXCHANGES[exchange_id]['name'],
+                BASE_TIMEFRAME, candle.time, candle.open, candle.high, candle.low, candle.close,
+                candle.volume, buy, sell, kline.symbol if kline is not None else SYMBOL,
+                kline.book_imbalance if kline is not None else None,
+                datetime.fromtimestamp(now_ms / 1000, TAIWAN_TZ), closed=True
+            ))
+            self.last_emitted[exchange_id] = candle.time
+        for minute in [minute for minute in buckets if minute <= self.last_emitted[exchange_id]]:
+            del buckets[minute]
+        return closed
+
+
+class CandleRollup:
+    """把已收盤的 1m K線增量併入較大時間框架"""
+
+    def __init__(self, timeframes: List[str]):
+        self.timeframes = [tf for tf in timeframes if tf != BASE_TIMEFRAME]
+        self.buckets: Dict[Tuple[str, str], FlowCandle] = {}
+
+    def add(self, exchange_id: str, minute: FlowCandle) -> List[FlowCandle]:
+        """併入一根 1m K線，回傳因此收盤的較大時間框架K線"""
+        closed = []
+        for timeframe in self.timeframes:
+            key = (exchange_id, timeframe)
+            start = _bucket_start(minute.time, timeframe)
+            bucket = self.buckets.get(key)
+            if bucket is not None and bucket.time != start:
+                # 漏掉了區間最後一分鐘，新區間開始時補收盤
+                bucket.closed = True
+                closed.append(bucket)
+                bucket = None
+            if bucket is None:
+                bucket = self.buckets[key] = minute.copy_as(timeframe, start)
+            else:
+                bucket.merge(minute)
+            if minute.end_time >= bucket.end_time:
+                bucket.closed = True
+                closed.append(self.buckets.pop(key))
+        return closed
+
+    def current(self, exchange_id: str, timeframe: str) -> Optional[FlowCandle]:
+        """未收盤的K線（只含已收盤的分鐘）"""
+        return self.buckets.get((exchange_id, timeframe))
+
+
+class RollupEngine:
+    """交易所 1m K線 + 新成交 → 1m → 各時間框架"""
+
+    def __init__(self, timeframes: List[str] = ROLLUP_TIMEFRAMES):
+        self.timeframes = list(timeframes)
+        self.minutes = MinuteCandleBuilder()
+        self.rollup = CandleRollup(self.timeframes)
+        self.stats = {"minutes": 0, **{f"closed_{tf}": 0 for tf in self.timeframes if tf != BASE_TIMEFRAME}}
+
+    def on_tick(self, kline_data: Dict[str, object], now: datetime,
+                candles: Optional[Dict[str, Sequence]] = None) -> Dict[str, Dict[str, FlowCandle]]:
+        """加入一次掃描結果，回傳 {時間框架: {交易所: 本次收盤的K線}}
+
+        candles 為各交易所快取的已收盤 1m K線（EnhancedExchangeScanner.closed_candles）；
+        一輪補上多根時，同一時間框架只回傳最新收盤的一根
+        """
+        for exchange_id, kline in kline_data.items():
+            self.minutes.add_trades(exchange_id, kline)
+
+        now_ms = int(now.timestamp() * 1000)
+        closed: Dict[str, Dict[str, FlowCandle]] = {}
+        for exchange_id, history in (candles or {}).items():
+            for minute in self.minutes.close(exchange_id, history, now_ms):
+                self.stats['minutes'] += 1
+                if BASE_TIMEFRAME in self.timeframes:
+                    closed.setdefault(BASE_TIMEFRAME, {})[exchange_id] = minute
+                for candle in self.rollup.add(exchange_id, minute):
+                    self.stats[f"closed_{candle.timeframe}"] += 1
+                    closed.setdefault(candle.timeframe, {})[exchange_id] = candle
+        return closed
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+多節點分片掃描
+部分交易所會封鎖執行器的 IP，單一節點的吞吐量也有限；多節點模式下：
+  HashRing         一致性雜湊：把「交易所:交易對」分配給節點，跳過宣告無法連線該交易所的節點
+  FileCoordinator  共享目錄上的協調者（fcntl 檔案鎖），單機多程序與測試使用
+  ClusterNode      每輪：心跳 → 依存活節點計算分片 → 掃描自己的分片（含 1m K線快取）→ 發布標準化結果
+                   與最近幾根已收盤K線；持有領導租約的節點另外收齊各分片結果，只由它評估規則與推送警報
+節點心跳逾時即視為離線，下一輪分片自動重新分配；領導者租約過期時由其他節點接手，
+並從協調者讀回前任領導者每輪寫入的警報去重與冷卻狀態（已推送的警報不會重發）
+"""
+
+import asyncio
+import bisect
+import fcntl
+import hashlib
+import json
+import os
+import platform
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from config import (
+    EXCHANGES, EXCHANGE_LIST, SYMBOL,
+    CLUSTER_EXCLUDE_EXCHANGES, CLUSTER_HEARTBEAT_TTL, CLUSTER_LEADER_LEASE,
+    CLUSTER_COLLECT_TIMEOUT, CLUSTER_VNODES
+)
+from kline_fetcher import Candle
+from radar_logging import get_logger
+from radar_state import kline_to_dict
+
+logger = get_logger("cluster")
+
+# 協調者只保留最近幾輪的結果
+KEPT_TICKS = 8
+# 每個分片隨結果發布的最近已收盤K線根數（領導者每輪收齊，足以補上換手時漏掉的幾分鐘）
+PUBLISHED_CANDLES = 5
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+def shard_key(exchange_id: str, symbol: str = SYMBOL) -> str:
+    return f"{exchange_id}:{symbol}"
+
+
+def default_node_id() -> str:
+    return f"{platform.node()}-{os.getpid()}"
+
+
+class HashRing:
+    """一致性雜湊環（每個節點 vnodes 個虛擬節點）"""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = CLUSTER_VNODES):
+        ring = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._points = [point for point, _ in ring]
+        self._nodes = [node for _, node in ring]
+
+    def owner(self, key: str, eligible: Callable[[str], bool] = lambda node: True) -> Optional[str]:
+        """從 key 的位置順時針找第一個符合條件的節點"""
+        if not self._points:
+            return None
+        start = bisect.bisect(self._points, _hash(key))
+        seen = set()
+        for i in range(len(self._nodes)):
+            node = self._nodes[(start + i) % len(self._nodes)]
+            if node in seen:
+                continue
+            if eligible(node):
+                return node
+            seen.add(node)
+        return None
+
+
+class FileCoordinator:
+    """以單一 JSON 狀態檔 + 檔案鎖協調節點（目錄可放在共享檔案系統上）
+
+    狀態: {"nodes": {id: {"seen", "exclude"}}, "leader": {"node", "expires"},
+           "ticks": {tick_key: {shard: {"node", "kline", "candles"}}}, "alerts": 警報去重狀態}
+    """
+
+    def __init__(self, directory: str, heartbeat_ttl: float = CLUSTER_HEARTBEAT_TTL):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "cluster.json")
+        self.lock_path = os.path.join(directory, "cluster.lock")
+        self.heartbeat_ttl = heartbeat_ttl
+
+    @contextmanager
+    def _locked(self):
+        """取得獨佔鎖並讀出狀態，離開時寫回"""
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                state.setdefault("nodes", {})
+                state.setdefault("leader", {})
+                state.setdefault("ticks", {})
+                state.setdefault("alerts", {})
+                yield state
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(state, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def heartbeat(self, node_id: str, exclude: List[str], now: Optional[float] = None) -> Dict[str, List[str]]:
+        """更新本節點心跳、移除逾時節點，回傳存活節點 {id: 無法連線的交易所}"""
+        now = time.time() if now is None else now
+        with self._locked() as state:
+            state["nodes"][node_id] = {"seen": now, "exclude": list(exclude)}
+            state["nodes"] = {node: info for node, info in state["nodes"].items()
+                              if now - info["seen"] < self.heartbeat_ttl}
+            return {node: info["exclude"] for node, info in state["nodes"].items()}
+
+    def acquire_leadership(self, node_id: str, lease: float = CLUSTER_LEADER_LEASE,
+                           now: Optional[float] = None) -> bool:
+        """租約無人持有、已過期或由本節點持有時取得（續約），回傳本節點是否為領導者"""
+        now = time.time() if now is None else now
+        with self._locked() as state:
+            leader = state["leader"]
+            if not leader or leader.get("expires", 0) <= now or leader.get("node") == node_id:
+                state["leader"] = {"node": node_id, "expires": now + lease}
+            return state["leader"]["node"] == node_id
+
+    def resign(self, node_id: str):
+        """正常關閉：移除心跳並釋出租約，讓分片與領導權立即轉移"""
+        with self._locked() as state:
+            state["nodes"].pop(node_id, None)
+            if state["leader"].get("node") == node_id:
+                state["leader"] = {}
+
+    def publish(self, tick_key: str, node_id: str, results: Dict[str, Optional[Dict[str, Any]]],
+                candles: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        """發布分片結果（kline_to_dict）與各分片最近的已收盤K線"""
+        candles = candles or {}
+        with self._locked() as state:
+            tick = state["ticks"].setdefault(tick_key, {})
+            for shard, kline in results.items():
+                tick[shard] = {"node": node_id, "kline": kline, "candles": candles.get(shard, [])}
+            for stale in sorted(state["ticks"])[:-KEPT_TICKS]:
+                del state["ticks"][stale]
+
+    def collect(self, tick_key: str) -> Dict[str, Dict[str, Any]]:
+        with self._locked() as state:
+            return dict(state["ticks"].get(tick_key, {}))
+
+    def save_alert_state(self, node_id: str, alert_state: Dict[str, Any]) -> bool:
+        """領導者寫入警報去重狀態；租約已不屬於本節點時不寫入，回傳是否寫入"""
+        with self._locked() as state:
+            if state["leader"].get("node") != node_id:
+                return False
+            state["alerts"] = alert_state
+            return True
+
+    def load_alert_state(self) -> Dict[str, Any]:
+        with self._locked() as state:
+            return dict(state["alerts"])
+
+
+def kline_from_dict(data: Dict[str, Any]):
+    """kline_to_dict 的反向（顏色等衍生欄位重新計算）"""
+    from multi_exchange_scanner import EnhancedKlineData
+
+    return EnhancedKlineData(
+        exchange=data["exchange"], symbol=data["symbol"],
+        open=data["open"], high=data["high"], low=data["low"], close=data["close"],
+        volume=data["volume"], buy_volume=data["buy_volume"], sell_volume=data["sell_volume"],
+        book_imbalance=data.get("book_imbalance"), vwap=data.get("vwap"),
+        whale_buy_volume=data.get("whale_buy_volume", 0.0), whale_sell_volume=data.get("whale_sell_volume", 0.0),
+        large_trade=data.get("large_trade"), bid=data.get("bid"), ask=data.get("ask"),
+        minute_flow={int(minute): tuple(flow) for minute, flow in (data.get("minute_flow") or {}).items()},
+        last_trade_time=data.get("last_trade_time"),
+    )
+
+
+class ClusterNode:
+    """單一掃描節點"""
+
+    def __init__(self, coordinator: FileCoordinator, node_id: Optional[str] = None,
+                 exclude: Optional[List[str]] = None, exchanges: Optional[List[str]] = None,
+                 collect_timeout: Optional[float] = None, lease: Optional[float] = None):
+        self.coordinator = coordinator
+        self.node_id = node_id or default_node_id()
+        self.exclude = list(CLUSTER_EXCLUDE_EXCHANGES if exclude is None else exclude)
+        self.exchanges = list(exchanges or EXCHANGE_LIST)
+        self.collect_timeout = CLUSTER_COLLECT_TIMEOUT if collect_timeout is None else collect_timeout
+        self.lease = CLUSTER_LEADER_LEASE if lease is None else lease
+        self.is_leader = False
+        self.took_over = False  # 本輪剛取得領導權（需從協調者接續警報去重狀態）
+        self.shards: List[str] = []
+        self.candles: Dict[str, List[Candle]] = {}  # 領導者收齊的各交易所已收盤K線
+        self.stats = {"node": self.node_id, "leader": False, "nodes": 0, "shards": 0,
+                      "published": 0, "collected": 0, "missing": 0}
+
+    def assign(self, live: Dict[str, List[str]]) -> Dict[str, Optional[str]]:
+        """交易所 → 負責節點（無節點可連線時為 None）"""
+        ring = HashRing(live)
+        return {exchange_id: ring.owner(shard_key(exchange_id),
+                                        lambda node: exchange_id not in live[node])
+                for exchange_id in self.exchanges}
+
+    async def _scan(self, scanner, exchange_id: str):
+        try:
+            return scanner.normalize(exchange_id, await scanner.fetch_raw(exchange_id))
+        except Exception as e:
+            scanner.log_fetch_error(exchange_id, e)
+            return None
+
+    async def run_tick(self, scanner, scan_time) -> Optional[Dict[str, Any]]:
+        """執行一輪；領導者回傳收齊的 {交易所: K線}，其餘節點回傳 None"""
+        live = await asyncio.to_thread(self.coordinator.heartbeat, self.node_id, self.exclude)
+        assignment = self.assign(live)
+        shards = [ex_id for ex_id, node in assignment.items() if node == self.node_id]
+        if shards != self.shards:
+            logger.info("🧩 節點 %s 負責: %s（%d 個存活節點）", self.node_id,
+                        ", ".join(EXCHANGES[ex_id]['name'] for ex_id in shards) or "無", len(live),
+                        extra={"node": self.node_id, "shards": shards, "nodes": len(live)})
+            self.shards = shards
+
+        # K線只更新自己分片的交易所（不請求被封鎖或由其他節點負責的交易所）
+        klines, _ = await asyncio.gather(asyncio.gather(*(self._scan(scanner, ex_id) for ex_id in shards)),
+                                         scanner.fetch_latest_candles(shards))
+        closed = scanner.closed_candles(shards)
+        tick_key = str(int(round(scan_time.timestamp())))
+        await asyncio.to_thread(self.coordinator.publish, tick_key, self.node_id, {
+            shard_key(ex_id): kline_to_dict(kline) if kline is not None else None
+            for ex_id, kline in zip(shards, klines)
+        }, {
+            shard_key(ex_id): [asdict(candle) for candle in list(history)[-PUBLISHED_CANDLES:]]
+            for ex_id, history in closed.items()
+        })
+
+        was_leader = self.is_leader
+        self.is_leader = await asyncio.to_thread(self.coordinator.acquire_leadership, self.node_id, self.lease)
+        self.took_over = self.is_leader and not was_leader
+        if self.is_leader != was_leader:
+            logger.info("👑 節點 %s %s領導者", self.node_id, "成為" if self.is_leader else "不再是",
+                        extra={"node": self.node_id, "leader": self.is_leader})
+        self.stats.update(leader=self.is_leader, nodes=len(live), shards=len(shards),
+                          published=self.stats['published'] + len(shards))
+        if not self.is_leader:
+            return None
+        return await self._collect(tick_key, assignment)
+
+    async def _collect(self, tick_key: str, assignment: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """等待所有已分配的分片發布結果（最多 collect_timeout 秒）"""
+        expected = {shard_key(ex_id) for ex_id, node in assignment.items() if node is not None}
+        deadline = time.monotonic() + self.collect_timeout
+        while True:
+            published = await asyncio.to_thread(self.coordinator.collect, tick_key)
+            if expected <= published.keys() or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(0.2)
+
+        kline_data = {}
+        self.candles = {}
+        for ex_id in self.exchanges:
+            entry = published.get(shard_key(ex_id))
+            if entry is None:
+                self.stats['missing'] += 1
+                logger.warning("⚠️  %s 本輪無分片結果（負責節點: %s）", EXCHANGES[ex_id]['name'],
+                               assignment.get(ex_id) or "無", extra={"exchange": ex_id})
+                continue
+            if entry["kline"] is not None:
+                kline_data[ex_id] = kline_from_dict(entry["kline"])
+            if entry.get("candles"):
+                self.candles[ex_id] = [Candle(**candle) for candle in entry["candles"]]
+        self.stats['collected'] += len(kline_data)
+        return kline_data
+
+    async def save_alert_state(self, alert_state: Dict[str, Any]) -> bool:
+        return await asyncio.to_thread(self.coordinator.save_alert_state, self.node_id, alert_state)
+
+    async def load_alert_state(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.coordinator.load_alert_state)
+
+    async def leave(self):
+        await asyncio.to_thread(self.coordinator.resign, self.node_id)
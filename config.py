@@ -1,3 +1,4 @@
+import json
 import os
 import pytz
 from datetime import datetime
@@ -23,12 +24,50 @@ def format_taiwan_time(dt=None, format_str="%Y-%m-%d %H:%M:%S"):
 TELEGRAM_BOT_TOKEN = os.getenv("TG_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TG_CHAT_ID")
 
+# 指令介面（getUpdates 長輪詢）：只回應 TELEGRAM_CHAT_ID 與下列額外聊天室
+TELEGRAM_COMMANDS_ENABLED = True
+TELEGRAM_COMMAND_CHATS = [c for c in os.getenv("TG_COMMAND_CHATS", "").split(",") if c]
+TELEGRAM_OFFSET_FILE = "telegram_offset.json"
+TELEGRAM_POLL_TIMEOUT = 30  # 長輪詢秒數
+TELEGRAM_REPLY_CONCURRENCY = 8  # 同時發送的回覆數
+TELEGRAM_DEFAULT_MUTE_MINUTES = 30
+TELEGRAM_LOCALE = "zh-TW"  # 訊息語系（"zh-TW" / "en"）
+TELEGRAM_TEMPLATE_CACHE_SIZE = 4096  # 已編譯模板數上限（語系 × 警報類型 × 交易所 × 交易對）
+
+# ======================
+# 警報通道設定
+# ======================
+# 每個通道一個字典：type 為 telegram / webhook / jsonl / unix，其餘為建構參數
+# （可另設 queue_size、batch_size、batch_wait、max_retries、retry_backoff）
+ALERT_SINK_QUEUE_SIZE = 100  # 每個通道的佇列上限，滿時丟棄最舊警報
+ALERT_SINK_MAX_RETRIES = 3
+ALERT_SINKS = [
+    {"type": "telegram", "chat_id": chat_id}
+    for chat_id in [TELEGRAM_CHAT_ID, *os.getenv("TG_ALERT_CHATS", "").split(",")] if chat_id
+]
+if os.getenv("ALERT_WEBHOOK_URL"):
+    ALERT_SINKS.append({"type": "webhook", "url": os.getenv("ALERT_WEBHOOK_URL")})
+if os.getenv("ALERT_JSONL_PATH"):
+    ALERT_SINKS.append({"type": "jsonl", "path": os.getenv("ALERT_JSONL_PATH")})
+if os.getenv("ALERT_SOCKET_PATH"):
+    ALERT_SINKS.append({"type": "unix", "path": os.getenv("ALERT_SOCKET_PATH")})
+
 # ======================
 # 交易對設定
 # ======================
 SYMBOL = "DUSKUSDT"
 TIMEFRAME = "1m"
+ROLLUP_TIMEFRAMES = ["1m", "5m", "15m", "1h"]  # 由 1m 增量彙總的時間框架
+ROLLUP_FLOW_GRACE = 90  # 1m K線收盤後等待成交頁補齊該分鐘成交的最長秒數
+ALERT_TIMEFRAMES = ["5m", "15m", "1h"]  # 收盤時也套用警報規則的時間框架（每次掃描的快照一律評估）
 CHECK_INTERVAL = 15  # 每15秒掃描一次（00、15、30、45秒）
+# 自適應輪詢：依各交易所成交到達率調整間隔（關閉時固定每 CHECK_INTERVAL 秒掃描全部交易所）
+POLL_ADAPTIVE = True
+POLL_FLOOR = 5.0  # 最短輪詢間隔（秒）
+POLL_CEILING = 60.0  # 最長輪詢間隔（秒）
+POLL_TARGET_TRADES = 20  # 每次輪詢期望看到的新成交數（與買賣比視窗相同）
+POLL_RATE_ALPHA = 0.3  # 成交到達率的 EWMA 權重
+POLL_BUDGET_SHARE = 0.5  # 輪詢最多使用各交易所令牌補充速率的比例
 
 # ======================
 # 警報條件（只保留前兩種）
@@ -36,6 +75,48 @@ CHECK_INTERVAL = 15  # 每15秒掃描一次（00、15、30、45秒）
 BUY_SELL_THRESHOLD = 1.8  # 買賣比率閾值
 # 注意：已移除 VOLUME_THRESHOLD 和 PRICE_CHANGE_THRESHOLD
 
+# 自適應閾值：依各 (交易對, 交易所) 的買賣失衡歷史分佈判斷異常
+# "ratio" = 固定買賣比；"zscore" = 偏離 EWMA 均值的標準差數；"percentile" = 在最近數次掃描中的實際百分位
+THRESHOLD_MODE = "ratio"
+ZSCORE_THRESHOLD = 2.5
+PERCENTILE_THRESHOLD = 0.99
+FLOW_PERCENTILE_WINDOW = 960  # 百分位模式參考的最近掃描次數（每15秒一次約4小時）
+ADAPTIVE_MIN_SAMPLES = 40  # 樣本不足時退回固定買賣比
+FLOW_EWMA_ALPHA = 0.02  # 約最近50次掃描的權重
+FLOW_STATS_FILE = "flow_stats.json"
+FLOW_STATS_CHECKPOINT_EVERY = 20  # 每N次掃描寫入一次
+
+# 大額成交：各 (交易對, 交易所) 的單筆成交額分佈以 KLL 分位數草圖累積（記憶體有上限）
+TRADE_SKETCH_ENABLED = True
+TRADE_SKETCH_K = 1000  # 草圖精度參數（每個串流約保留 1.5k 個數值，排名誤差約 0.17%，比 p99.9 的 0.1% 尾端還寬，大額成交門檻為近似值）
+TRADE_SKETCH_FILE = "trade_sketches.json"
+WHALE_QUANTILE = 0.99  # 成交額高於此分位視為大戶成交，另計大戶買賣比
+LARGE_TRADE_QUANTILE = 0.999  # 單筆成交額高於此分位觸發大額成交警報
+WHALE_MIN_SAMPLES = 500  # 樣本不足前不判斷大戶成交
+
+# 跨交易所領先/落後：對齊各交易所的報酬率與訂單流序列，以 FFT 互相關估計誰先動
+LEADLAG_ENABLED = True
+LEADLAG_STEP = 15  # 對齊網格（秒）
+LEADLAG_WINDOW = 240  # 滑動視窗格數（15秒一格約1小時）
+LEADLAG_MAX_LAG = 8  # 搜尋的最大領先格數（±2分鐘）
+LEADLAG_RECOMPUTE_EVERY = 4  # 每N格重新計算一次
+LEADLAG_MIN_SAMPLES = 60  # 有效格數不足的交易所不參與
+LEADLAG_MIN_CORR = 0.2  # 峰值相關係數低於此值不計入領先分數
+LEADLAG_ALERT_WEIGHT = 0.5  # 警報權重 = 1 + 係數 × 領先分數（-1 ~ 1）
+
+# 跨交易所價差：各交易所最優買賣價以索引堆積維護，扣除雙邊手續費後仍有價差時警報
+SPREAD_MONITOR_ENABLED = True
+TAKER_FEES = {  # 各交易所吃單手續費率（未列出的交易所以最高費率計）
+    "coinbase": 0.006, "kraken": 0.0026, "okx": 0.001,
+    "bybit": 0.001, "gateio": 0.002, "mexc": 0.0005,
+}
+SPREAD_ARB_THRESHOLD = 0.003  # 扣除手續費後的淨價差（0.3%）
+SPREAD_USE_LAST_PRICE = True  # 無買賣報價的交易所以最新成交價代替
+SPREAD_MAX_QUOTE_AGE = 60  # 報價超過N秒未更新即移除（自適應輪詢時未輪詢的交易所）
+PRICE_DEVIATION_THRESHOLD = 0.01  # 收盤價偏離跨交易所中位數 1% 以上
+PRICE_DEVIATION_MIN_VENUES = 3  # 有效報價少於N家時不計算中位數
+SPREAD_ALERT_COOLDOWN = 300  # 同一組交易所的價差 / 偏離警報冷卻時間（秒）
+
 # ======================
 # 監控設定
 # ======================
@@ -43,6 +124,17 @@ ALERT_COOLDOWN = 60  # 警報冷卻時間（秒）
 MAX_RETRIES = 3
 API_TIMEOUT = 10
 REQUEST_DELAY = 1.0  # API請求間隔（秒）
+COALESCE_TTL = 2.0  # 相同請求結果的重用時間（秒，需小於掃描間隔）
+PAYLOAD_CACHE_ENABLED = True  # 回應未變更（304 / 內容雜湊相同）時跳過解析與彙總
+# 分段掃描管線：各段並發數與佇列上限（佇列滿時丟棄最舊項目）
+PIPELINE_STAGES = {
+    "fetch": {"concurrency": 6, "queue_size": 24},
+    "normalize": {"concurrency": 1, "queue_size": 24},
+    "aggregate": {"concurrency": 1, "queue_size": 24},
+    "evaluate": {"concurrency": 1, "queue_size": 4},
+    "notify": {"concurrency": 2, "queue_size": 50},
+}
+PIPELINE_TICK_TIMEOUT = 12.0  # 一輪未收齊的最長等待（秒），逾時以部分結果結算
 
 # ======================
 # 6家交易所配置（完全不用幣安）
@@ -106,6 +198,132 @@ EXCHANGES = {
 # 交易所列表（方便迭代）
 EXCHANGE_LIST = list(EXCHANGES.keys())
 
+# ======================
+# API 端點鏡像（探測器會測速並自動選用最快的可用端點）
+# ======================
+EXCHANGE_MIRRORS = {
+    "coinbase": ["https://api.coinbase.com"],
+    "kraken": ["https://api.kraken.com"],
+    "okx": ["https://www.okx.com", "https://aws.okx.com", "https://okx.com"],
+    "bybit": ["https://api.bybit.com", "https://api.bytick.com"],
+    "gateio": ["https://api.gateio.ws", "https://api.gate.io"],
+    "mexc": ["https://api.mexc.com"]
+}
+
+ENDPOINT_TABLE_FILE = "endpoint_table.json"  # 端點排名快取檔
+ENDPOINT_PROBE_ENABLED = True  # 即時監控時在背景定期重新探測各端點
+ENDPOINT_PROBE_INTERVAL = 300  # 背景重新探測間隔（秒）
+
+# ======================
+# 共享記憶體快照（同機程序讀取最新掃描結果）
+# ======================
+SNAPSHOT_SHM_ENABLED = True  # 即時監控時發布每次掃描結果（多節點模式由領導者發布合併結果）
+SNAPSHOT_SHM_PATH = "/dev/shm/crypto_radar_dusk.snap"
+SNAPSHOT_RING_SIZE = 240  # 保留最近240次掃描（15秒一次約1小時）
+
+# ======================
+# 本機 HTTP / SSE 數據源
+# ======================
+FEED_SERVER_ENABLED = True
+FEED_SERVER_HOST = "127.0.0.1"
+FEED_SERVER_PORT = 8765
+FEED_HISTORY_SIZE = 240  # 保留最近240次掃描
+FEED_ALERT_TTL = 300  # 警報視為有效的時間（秒）
+FEED_SSE_QUEUE_SIZE = 16  # 每個SSE客戶端最多緩衝的事件數
+
+# ======================
+# 訂單簿設定
+# ======================
+ORDER_BOOK_ENABLED = True  # 即時監控時維護各交易所本地訂單簿（盤口失衡與最優買賣價）
+ORDER_BOOK_DEPTH = 100  # 本地維護的最大檔位數
+BOOK_IMBALANCE_LEVELS = 10  # 計算盤口失衡的前N檔
+BOOK_IMBALANCE_THRESHOLD = 0.3  # 盤口失衡閾值（-1 ~ 1，正值=買盤較厚）
+
+# REST 快照與 WebSocket 增量端點（rest_base 未設定時使用 api_base）
+ORDER_BOOK_CONFIG = {
+    "coinbase": {
+        "rest_base": "https://api.exchange.coinbase.com",
+        "rest_path": "/products/{symbol}/book",
+        "ws_url": "wss://ws-feed.exchange.coinbase.com"
+    },
+    "kraken": {
+        "rest_path": "/0/public/Depth",
+        "ws_url": "wss://ws.kraken.com",
+        "ws_symbol_mapping": {"DUSKUSDT": "DUSK/USD"},
+        "ws_depth": 10
+    },
+    "okx": {
+        "rest_path": "/api/v5/market/books",
+        "ws_url": "wss://ws.okx.com:8443/ws/v5/public"
+    },
+    "bybit": {
+        "rest_path": "/v5/market/orderbook",
+        "ws_url": "wss://stream.bybit.com/v5/public/spot"
+    },
+    "gateio": {
+        "rest_path": "/api/v4/spot/order_book",
+        "ws_url": "wss://api.gateio.ws/ws/v4/"
+    },
+    "mexc": {
+        "rest_path": "/api/v3/depth",
+        "ws_url": "wss://wbs.mexc.com/ws"
+    }
+}
+
+# ======================
+# 日誌設定
+# ======================
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")  # "text" 人類可讀 / "json" 每行一筆 JSON
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FILE = os.environ.get("LOG_FILE")  # 未設定時輸出到 stdout
+LOG_DEDUP_WINDOW = 60  # 相同警告/錯誤的抑制時間（秒）
+EXCHANGE_LOG_LEVELS = {}  # 個別交易所日誌等級，例如 {"kraken": "DEBUG"}
+
+# ======================
+# 效能分析設定
+# ======================
+PROFILE_DIR = "profiles"  # scan_profiler 抽樣輸出目錄
+
+# ======================
+# 錄製/重播設定
+# ======================
+CASSETTE_DIR = "cassettes"  # http_cassette 錄製檔預設目錄
+
+# ======================
+# 多節點分片設定
+# ======================
+CLUSTER_DIR = os.environ.get("CLUSTER_DIR")  # 協調者目錄（多節點共用），--cluster 未指定目錄時使用
+CLUSTER_NODE_ID = os.environ.get("CLUSTER_NODE_ID")  # 未設定時為 主機名-PID
+# 本節點無法連線（地區封鎖）的交易所，分片時改由其他節點負責，例如 "bybit,okx"
+CLUSTER_EXCLUDE_EXCHANGES = [x for x in os.environ.get("CLUSTER_EXCLUDE_EXCHANGES", "").split(",") if x]
+CLUSTER_HEARTBEAT_TTL = 45  # 心跳逾時（秒），超過即視為離線並重新分配分片
+CLUSTER_LEADER_LEASE = 30  # 領導者租約（秒），每輪續約
+CLUSTER_COLLECT_TIMEOUT = 8.0  # 領導者等待各分片結果的上限（秒）
+CLUSTER_VNODES = 64  # 一致性雜湊每節點的虛擬節點數
+
+# ======================
+# 速率限制設定
+# ======================
+# 每家交易所一個令牌桶：capacity 為桶容量（權重），refill 為每秒補充量
+# weights 依請求路徑設定權重（未列出為1）；headers 為回應中的限額標頭
+#   remaining = 剩餘額度、used = 已用權重（相對 capacity）
+RATE_LIMIT_HEADROOM = 0.8  # 只使用公佈額度的比例，保留給其他程序與誤差
+RATE_LIMIT_COOLDOWN = 5.0  # 收到429且無Retry-After時暫停的秒數
+
+RATE_LIMITS = {
+    "coinbase": {"capacity": 10, "refill": 10},
+    "kraken": {"capacity": 15, "refill": 1,
+               "weights": {"/0/public/Trades": 2, "/0/public/OHLC": 2}},
+    "okx": {"capacity": 20, "refill": 10},
+    "bybit": {"capacity": 600, "refill": 120,
+              "headers": {"remaining": "X-Bapi-Limit-Status"}},
+    "gateio": {"capacity": 200, "refill": 20,
+               "headers": {"remaining": "X-Gate-RateLimit-Requests-Remain"}},
+    "mexc": {"capacity": 500, "refill": 50,
+             "weights": {"/api/v3/trades": 5, "/api/v3/depth": 5},
+             "headers": {"used": "X-MBX-USED-WEIGHT"}}
+}
+
 # ======================
 # 數據解析配置
 # ======================
@@ -115,29 +333,146 @@ KLINE_FIELD_MAPPING = {
     "kraken": {"time": 0, "open": 1, "high": 2, "low": 3, "close": 4, "volume": 6},
     "okx": {"time": 0, "open": 1, "high": 2, "low": 3, "close": 4, "volume": 5},
     "bybit": {"time": 0, "open": 1, "high": 2, "low": 3, "close": 4, "volume": 5},
-    "gateio": {"time": 0, "open": 1, "high": 2, "low": 3, "close": 4, "volume": 5},
+    "gateio": {"time": 0, "open": 5, "high": 3, "low": 4, "close": 2, "volume": 6},
     "mexc": {"time": 0, "open": 1, "high": 2, "low": 3, "close": 4, "volume": 5}
 }
 
+# 時間框架對應秒數
+TIMEFRAME_SECONDS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600}
+
+# K線快取保留的已收盤K線數量
+KLINE_HISTORY_LIMIT = 500
+
+# 不同交易所的成交紀錄字段映射
+# side 欄位值等於 buy 視為主動買入、等於 sell 視為主動賣出；time_unit 為時間戳相對秒的倍數
+# newest_first 表示交易所回傳順序為由新到舊
+TRADE_FIELD_MAPPING = {
+    "kraken": {"price": 0, "qty": 1, "time": 2, "side": 3, "buy": "b", "sell": "s", "time_unit": 1, "newest_first": False},
+    "okx": {"price": "px", "qty": "sz", "time": "ts", "side": "side", "buy": "buy", "sell": "sell", "time_unit": 1000, "newest_first": True},
+    "bybit": {"price": "price", "qty": "size", "time": "time", "side": "side", "buy": "Buy", "sell": "Sell", "time_unit": 1000, "newest_first": True},
+    "gateio": {"price": "price", "qty": "amount", "time": "create_time_ms", "side": "side", "buy": "buy", "sell": "sell", "time_unit": 1000, "newest_first": True},
+    "mexc": {"price": "price", "qty": "qty", "time": "time", "side": "isBuyerMaker", "buy": False, "sell": True, "time_unit": 1000, "newest_first": False}
+}
+
 # ======================
 # 掃描時間點配置
 # ======================
 SCAN_SECONDS = [0, 15, 30, 45]  # 台灣時間的秒數
 
-def check_config():
-    """檢查配置是否完整"""
+# ======================
+# 設定檔（熱重載）
+# ======================
+# JSON 設定檔覆寫本檔的同名常數，例如 {"BUY_SELL_THRESHOLD": 2.0, "EXCHANGES": {...}}
+# 監控執行中修改設定檔，會在兩輪掃描之間驗證後套用，不需重新啟動
+CONFIG_FILE = os.environ.get("RADAR_CONFIG_FILE", "radar_config.json")
+CONFIG_RELOAD_INTERVAL = 5.0  # 檢查設定檔修改時間的間隔（秒）
+
+# 由其他設定推導、不可直接覆寫的常數
+DERIVED_CONFIG = {"EXCHANGE_LIST"}
+
+
+def read_config_file(path):
+    """讀取設定檔（不存在時為空），格式錯誤時拋出 ValueError"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        overrides = json.load(f)
+    if not isinstance(overrides, dict):
+        raise ValueError("設定檔最外層必須是物件")
+    return overrides
+
+
+def _same_kind(current, value):
+    """覆寫值的型別需與預設值相容（整數/浮點數互通，None 的設定可填字串）"""
+    if current is None:
+        return value is None or isinstance(value, str)
+    if isinstance(current, bool) or isinstance(value, bool):
+        return isinstance(current, bool) and isinstance(value, bool)
+    if isinstance(current, (int, float)):
+        return isinstance(value, (int, float))
+    return isinstance(value, type(current))
+
+
+def resolve_config(overrides, base):
+    """把覆寫合併到 base（常數名 → 值），回傳 (合併後的設定, 錯誤列表)"""
+    values = dict(base)
+    errors = []
+    for key, value in overrides.items():
+        if key not in base or not key.isupper() or key in DERIVED_CONFIG or callable(base[key]):
+            errors.append(f"未知或不可覆寫的設定: {key}")
+        elif not _same_kind(base[key], value):
+            errors.append(f"{key} 型別應為 {type(base[key]).__name__}")
+        else:
+            values[key] = value
+    values["EXCHANGE_LIST"] = list(values["EXCHANGES"].keys())
+    return values, errors
+
+
+def validate_config(values, require_credentials=True):
+    """檢查一組設定（常數名 → 值），回傳錯誤列表"""
     errors = []
     
-    if not TELEGRAM_BOT_TOKEN:
-        errors.append("TG_TOKEN 未設定")
-    if not TELEGRAM_CHAT_ID:
-        errors.append("TG_CHAT_ID 未設定")
+    if require_credentials:
+        if not values.get("TELEGRAM_BOT_TOKEN"):
+            errors.append("TG_TOKEN 未設定")
+        if not values.get("TELEGRAM_CHAT_ID"):
+            errors.append("TG_CHAT_ID 未設定")
     
     # 檢查交易所配置
+    exchanges = values["EXCHANGES"]
     required_exchanges = ["coinbase", "kraken", "okx", "bybit", "gateio", "mexc"]
     for exchange in required_exchanges:
-        if exchange not in EXCHANGES:
+        if exchange not in exchanges:
             errors.append(f"交易所 {exchange} 未配置")
+    for exchange, cfg in exchanges.items():
+        if not isinstance(cfg, dict) or not cfg.get("name") or not cfg.get("api_base"):
+            errors.append(f"交易所 {exchange} 缺少 name / api_base")
+        elif values["SYMBOL"] not in cfg.get("symbol_mapping", {}):
+            errors.append(f"交易所 {exchange} 缺少 {values['SYMBOL']} 的交易對對應")
+    
+    if values["BUY_SELL_THRESHOLD"] <= 0:
+        errors.append("BUY_SELL_THRESHOLD 必須大於 0")
+    if values["THRESHOLD_MODE"] not in ("ratio", "zscore", "percentile"):
+        errors.append(f"THRESHOLD_MODE 不支援: {values['THRESHOLD_MODE']}")
+    if values["FLOW_PERCENTILE_WINDOW"] < 1:
+        errors.append("FLOW_PERCENTILE_WINDOW 必須大於 0")
+    if values["CHECK_INTERVAL"] <= 0 or not 0 < values["POLL_FLOOR"] <= values["POLL_CEILING"]:
+        errors.append("輪詢間隔需滿足 0 < POLL_FLOOR ≤ POLL_CEILING，且 CHECK_INTERVAL > 0")
+    if any(not 0 <= fee < 0.1 for fee in values["TAKER_FEES"].values()):
+        errors.append("TAKER_FEES 需介於 0 ~ 0.1")
+    return errors
+
+
+def current_config():
+    """目前生效的所有設定常數"""
+    return {key: value for key, value in globals().items()
+            if key.isupper() and not key.startswith("_") and not callable(value)}
+
+
+def default_config():
+    """本檔的預設值（未套用設定檔；熱重載時從設定檔刪除的鍵會還原為此值）"""
+    return dict(_DEFAULTS)
+
+
+def _apply_config_file():
+    """啟動時套用設定檔；無法讀取或驗證失敗時沿用本檔的預設值"""
+    try:
+        values, errors = resolve_config(read_config_file(CONFIG_FILE), default_config())
+    except (OSError, ValueError) as e:
+        values, errors = None, [str(e)]
+    errors = errors or validate_config(values, require_credentials=False)
+    if errors:
+        print(f"⚠️  設定檔 {CONFIG_FILE} 未套用: {'; '.join(errors)}")
+        return
+    globals().update(values)
+
+
+_DEFAULTS = current_config()
+_apply_config_file()
+
+def check_config():
+    """檢查配置是否完整"""
+    errors = validate_config(current_config())
     
     if errors:
         print("❌ 配置錯誤:")
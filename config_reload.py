@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+設定檔熱重載
+修改閾值、新增交易所或調整交易對對應不必重新啟動（保留連線池、統計狀態與警報去重紀錄）：
+  - 每 CONFIG_RELOAD_INTERVAL 秒檢查 CONFIG_FILE 的修改時間，變更時讀取並以 validate_config 驗證
+  - 驗證通過才一次套用：更新 config 模組與本專案各模組 `from config import` 的同名綁定
+    （只處理與 config.py 同目錄的模組，不會改到 numpy / aiohttp 等第三方套件的同名全域變數）
+  - 只通知訂閱了變更鍵的元件重建（例如 RATE_LIMITS 變更只重建該交易所的令牌桶）
+驗證失敗時保留目前設定；只在啟動時讀取的設定會提示需重新啟動
+"""
+
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import config
+from config import CONFIG_FILE, CONFIG_RELOAD_INTERVAL, format_taiwan_time
+from radar_logging import get_logger
+
+logger = get_logger("config")
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(config.__file__))
+
+# 只在啟動時讀取、修改後需重新啟動才生效的設定
+RESTART_REQUIRED = {
+    "TELEGRAM_BOT_TOKEN", "TELEGRAM_CHAT_ID", "TELEGRAM_COMMANDS_ENABLED", "ALERT_SINKS",
+    "FEED_SERVER_ENABLED", "FEED_SERVER_HOST", "FEED_SERVER_PORT", "FEED_HISTORY_SIZE",
+    "LOG_FORMAT", "LOG_LEVEL", "LOG_FILE", "PIPELINE_STAGES", "ROLLUP_TIMEFRAMES", "TIMEFRAME",
+    "SNAPSHOT_SHM_PATH", "SNAPSHOT_RING_SIZE", "TRADE_SKETCH_K", "CLUSTER_DIR", "CLUSTER_NODE_ID",
+    "CONFIG_FILE", "API_TIMEOUT", "TELEGRAM_TEMPLATE_CACHE_SIZE", "ORDER_BOOK_ENABLED", "ORDER_BOOK_DEPTH",
+    "ENDPOINT_PROBE_ENABLED", "SNAPSHOT_SHM_ENABLED", "POLL_ADAPTIVE", "LEADLAG_ENABLED", "LEADLAG_STEP",
+    "LEADLAG_WINDOW", "LEADLAG_MAX_LAG", "LEADLAG_RECOMPUTE_EVERY", "SPREAD_MONITOR_ENABLED",
+    "KLINE_HISTORY_LIMIT", "ALERT_SINK_QUEUE_SIZE", "ALERT_SINK_MAX_RETRIES", "BOOK_IMBALANCE_LEVELS",
+    "RATE_LIMIT_HEADROOM", "TELEGRAM_OFFSET_FILE", "PAYLOAD_CACHE_ENABLED", "TRADE_SKETCH_ENABLED",
+}
+
+Listener = Callable[[Dict[str, Any]], None]
+
+
+def project_modules() -> List[Any]:
+    """已載入的本專案模組（與 config.py 同目錄，不含 config 本身）"""
+    modules = []
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if module is config or not path or os.path.dirname(os.path.abspath(path)) != PROJECT_DIR:
+            continue
+        modules.append(module)
+    return modules
+
+
+class ConfigReloader:
+    """監看設定檔並在掃描之間套用變更"""
+
+    def __init__(self, path: str = CONFIG_FILE, interval: float = CONFIG_RELOAD_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._signature = self._stat()  # 啟動時的設定檔已由 config 套用
+        self._checked = time.monotonic()
+        self._listeners: List[Tuple[frozenset, Listener]] = []
+        self.stats = {"checks": 0, "reloads": 0, "rejected": 0, "last_reload": None, "last_error": None}
+
+    def _stat(self) -> Optional[Tuple[float, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime, st.st_size
+
+    def on_change(self, keys: Iterable[str], callback: Listener):
+        """訂閱設定變更：keys 中任一鍵改變時以 {鍵: 新值} 呼叫 callback"""
+        self._listeners.append((frozenset(keys), callback))
+
+    def poll(self, force: bool = False) -> Dict[str, Any]:
+        """距上次檢查超過 interval 且設定檔有變更時重新載入，回傳已套用的變更"""
+        now = time.monotonic()
+        if not force and now - self._checked < self.interval:
+            return {}
+        self._checked = now
+        self.stats['checks'] += 1
+        signature = self._stat()
+        if signature == self._signature and not force:
+            return {}
+        self._signature = signature
+        return self.reload()
+
+    def reload(self) -> Dict[str, Any]:
+        """讀取、驗證並套用設定檔；失敗時不做任何變更"""
+        base = config.current_config()
+        try:
+            values, errors = config.resolve_config(config.read_config_file(self.path), config.default_config())
+        except (OSError, ValueError) as e:
+            values, errors = None, [f"讀取失敗: {e}"]
+        errors = errors or config.validate_config(values, require_credentials=False)
+        if errors:
+            self.stats['rejected'] += 1
+            self.stats['last_error'] = "; ".join(errors)
+            logger.error("❌ 設定檔未套用，沿用目前設定: %s", self.stats['last_error'],
+                         extra={"path": self.path, "errors": errors})
+            return {}
+
+        changes = {key: value for key, value in values.items() if base.get(key) != value}
+        if changes:
+            self.apply(changes)
+        return changes
+
+    def apply(self, changes: Dict[str, Any]):
+        """一次更新 config 與各模組的同名綁定（同步執行，掃描協程不會看到一半的設定）"""
+        previous = {key: getattr(config, key) for key in changes}
+        for module in project_modules():
+            namespace = module.__dict__
+            for key, old in previous.items():
+                if key in namespace and namespace[key] is old:
+                    namespace[key] = changes[key]
+        for key, value in changes.items():
+            setattr(config, key, value)
+
+        self.stats['reloads'] += 1
+        self.stats['last_reload'] = format_taiwan_time()
+        self.stats['last_error'] = None
+        logger.info("🔄 設定已重新載入: %s", ", ".join(sorted(changes)), extra={"keys": sorted(changes)})
+        restart = sorted(RESTART_REQUIRED & changes.keys())
+        if restart:
+            logger.warning("⚠️  以下設定需重新啟動才生效: %s", ", ".join(restart), extra={"keys": restart})
+
+        for keys, callback in self._listeners:
+            changed = {key: changes[key] for key in keys & changes.keys()}
+            if not changed:
+                continue
+            try:
+                callback(changed)
+            except Exception as e:
+                logger.error("❌ 設定變更處理失敗: %s", e, extra={"keys": sorted(changed)})
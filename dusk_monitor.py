@@ -11,14 +11,25 @@ from datetime import datetime, timedelta
 from config import (
     TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, SYMBOL, TIMEFRAME,
     BUY_SELL_THRESHOLD, ALERT_COOLDOWN,
-    API_TIMEOUT, SCAN_SECONDS,
+    API_TIMEOUT, SCAN_SECONDS, FEED_SERVER_ENABLED, FLOW_STATS_CHECKPOINT_EVERY,
+    TELEGRAM_COMMANDS_ENABLED, ALERT_TIMEFRAMES, CLUSTER_DIR, CLUSTER_NODE_ID, POLL_ADAPTIVE,
+    LEADLAG_ENABLED, SPREAD_MONITOR_ENABLED, ORDER_BOOK_ENABLED, ENDPOINT_PROBE_ENABLED,
+    SNAPSHOT_SHM_ENABLED,
     EXCHANGES, EXCHANGE_LIST,
     get_taiwan_time, format_taiwan_time, check_config
 )
+from alert_rules import evaluate_kline_alert, evaluate_candle_alert, evaluate_large_trade
+from candle_rollup import RollupEngine
+from lead_lag import LeadLagAnalyzer
+from radar_state import RadarState
+from streaming_stats import FlowStatsStore, flow_signal
+from scan_profiler import profiler
+from scan_pipeline import ScanPipeline
+from spread_monitor import SpreadMonitor
 
 # 檢查是否有multi_exchange_scanner
 try:
-    from multi_exchange_scanner import SimpleExchangeScanner
+    from multi_exchange_scanner import EnhancedExchangeScanner
     HAS_SCANNER = True
 except ImportError:
     HAS_SCANNER = False
@@ -26,7 +37,8 @@ except ImportError:
 
 # 狀態追蹤
 last_alert_time = {"BUY_IN_RED": 0, "SELL_IN_GREEN": 0}
-alert_minute_tracker = {}
+alert_minute_tracker = {}  # 分鐘 -> 本分鐘已觸發的交易所（集合，數千個交易對時查詢仍為 O(1)）
+last_large_trade_time = {}  # 已警報的最新大額成交時間（未變更的回應會沿用上次K線）
 scan_count = 0
 alert_count = 0
 error_count = 0
@@ -47,13 +59,29 @@ def send_telegram(message):
         print(f"❌ Telegram錯誤: {e}")
         return False
 
-def check_single_kline_alert(kline_data, exchange_id, minute_key):
+def check_single_kline_alert(kline_data, exchange_id, minute_key, flow_stats=None):
     exchange_name = EXCHANGES.get(exchange_id, {}).get('name', exchange_id)
     
-    triggered = alert_minute_tracker.get(minute_key, [])
+    # 每次掃描都更新買賣失衡統計（不論本分鐘是否已觸發），評分使用更新前的分佈
+    score = None
+    if flow_stats is not None and hasattr(kline_data, "buy_sell_ratio"):
+        score = flow_stats.score_and_update(kline_data.symbol, exchange_id, flow_signal(kline_data))
+    
+    triggered = alert_minute_tracker.get(minute_key, ())
     if exchange_id in triggered:
         return False, None, None, f"{exchange_name}已觸發"
     
+    # 有真實K線數據時使用規則評估（買賣比 + 盤口失衡）
+    if hasattr(kline_data, "buy_sell_ratio"):
+        with profiler.phase("alerts", exchange_id):
+            alert_type, alert_data = evaluate_kline_alert(exchange_id, kline_data, score)
+        if alert_type is None:
+            return False, None, None, "無警報"
+        alert_minute_tracker.setdefault(minute_key, set()).add(exchange_id)
+        if alert_type == "BUY_IN_RED":
+            return True, alert_type, alert_data, f"{exchange_name}陰線買入"
+        return True, alert_type, alert_data, f"{exchange_name}陽線賣出"
+    
     simulated_buy_ratio = random.uniform(1.0, 3.0)
     
     # 模擬kline屬性
@@ -62,9 +90,7 @@ def check_single_kline_alert(kline_data, exchange_id, minute_key):
     volume = random.uniform(10000, 50000)
     
     if is_red and simulated_buy_ratio > BUY_SELL_THRESHOLD:
-        if minute_key not in alert_minute_tracker:
-            alert_minute_tracker[minute_key] = []
-        alert_minute_tracker[minute_key].append(exchange_id)
+        alert_minute_tracker.setdefault(minute_key, set()).add(exchange_id)
         
         alert_data = {
             "exchange": exchange_name,
@@ -77,9 +103,7 @@ def check_single_kline_alert(kline_data, exchange_id, minute_key):
         return True, "BUY_IN_RED", alert_data, f"{exchange_name}陰線買入"
     
     elif not is_red and (1/simulated_buy_ratio) > BUY_SELL_THRESHOLD:
-        if minute_key not in alert_minute_tracker:
-            alert_minute_tracker[minute_key] = []
-        alert_minute_tracker[minute_key].append(exchange_id)
+        alert_minute_tracker.setdefault(minute_key, set()).add(exchange_id)
         
         alert_data = {
             "exchange": exchange_name,
@@ -93,6 +117,333 @@ def check_single_kline_alert(kline_data, exchange_id, minute_key):
     
     return False, None, None, "無警報"
 
+async def wait_for_next_scan():
+    """等待到下一個掃描時間點（台灣時間 SCAN_SECONDS）"""
+    now = get_taiwan_time()
+    second = now.second + now.microsecond / 1_000_000
+    upcoming = [s for s in SCAN_SECONDS if s > second]
+    target = upcoming[0] if upcoming else SCAN_SECONDS[0] + 60
+    await asyncio.sleep(target - second)
+
+def evaluate_tick(state, flow_stats, rollups, kline_data, scan_time, exchanges=None, lead_lag=None,
+                  spreads=None, candles=None):
+    """檢查一輪掃描結果的警報並更新狀態，回傳要推送的 (警報類型, 警報數據)
+
+    exchanges 為本輪輪詢的交易所（自適應輪詢時只有部分交易所），預設全部
+    candles 為各交易所快取的已收盤 1m K線（彙總K線的開高低收來源）
+    lead_lag 為 LeadLagAnalyzer 時，警報附上領先權重，領先交易所的警報優先推送
+    spreads 為 SpreadMonitor 時另外檢查跨交易所套利價差與價格偏離
+    """
+    if lead_lag is not None and lead_lag.on_tick(kline_data, scan_time):
+        state.lead_lag = lead_lag.summary()
+    
+    def weigh(exchange_id, alert_data):
+        if lead_lag is not None and lead_lag.scores:
+            alert_data['lead_weight'] = lead_lag.weight(exchange_id)
+    
+    minute_key = scan_time.strftime("%Y%m%d%H%M")
+    for stale in [key for key in alert_minute_tracker if key < minute_key]:
+        del alert_minute_tracker[stale]  # 已過的分鐘不再查詢
+    alerts, outgoing = [], []
+    for exchange_id, kline in kline_data.items():
+        should_alert, alert_type, alert_data, info = check_single_kline_alert(
+            kline, exchange_id, minute_key, flow_stats
+        )
+        if should_alert:
+            weigh(exchange_id, alert_data)
+            print(f"⚠️  {info}")
+            if state.is_muted:
+                print("🔕 已靜音，略過推送")
+            else:
+                outgoing.append((alert_type, alert_data))
+            alerts.append(dict(alert_data, alert_type=alert_type))
+        
+        alert_type, alert_data = evaluate_large_trade(exchange_id, kline)
+        if alert_type is not None and alert_data['large_trade']['time'] > last_large_trade_time.get(exchange_id, 0):
+            last_large_trade_time[exchange_id] = alert_data['large_trade']['time']
+            print(f"🐋 {alert_data['exchange']} 大額成交 ${alert_data['large_trade']['notional']:,.0f}")
+            weigh(exchange_id, alert_data)
+            if not state.is_muted:
+                outgoing.append((alert_type, alert_data))
+            alerts.append(dict(alert_data, alert_type=alert_type))
+    
+    if spreads is not None:
+        for alert_type, alert_data in spreads.on_tick(kline_data, scan_time):
+            if alert_type == "SPREAD_ARB":
+                print(f"💱 {alert_data['exchange']} 淨價差 {alert_data['net_spread']:.2%}")
+            else:
+                print(f"📐 {alert_data['exchange']} 偏離中位數 {alert_data['deviation']:+.2%}")
+            if not state.is_muted:
+                outgoing.append((alert_type, alert_data))
+            alerts.append(dict(alert_data, alert_type=alert_type))
+    
+    # 交易所 1m K線收盤時併入較大時間框架，收盤的K線同樣套用警報規則
+    for timeframe, candles in rollups.on_tick(kline_data, scan_time, candles).items():
+        if timeframe not in ALERT_TIMEFRAMES:
+            continue
+        for exchange_id, candle in candles.items():
+            alert_type, alert_data = evaluate_candle_alert(exchange_id, candle)
+            if alert_type is None:
+                continue
+            print(f"⚠️  {alert_data['exchange']} {timeframe} {'陰線買入' if alert_type == 'BUY_IN_RED' else '陽線賣出'}")
+            weigh(exchange_id, alert_data)
+            if not state.is_muted:
+                outgoing.append((alert_type, alert_data))
+            alerts.append(dict(alert_data, alert_type=alert_type))
+    
+    state.update(kline_data, alerts, exchanges)
+    outgoing.sort(key=lambda alert: -alert[1].get('lead_weight', 1.0))
+    return outgoing
+
+def alert_dedup_state(spreads=None, now=None):
+    """警報去重與冷卻狀態（可序列化）：本分鐘已觸發的交易所、已警報的大額成交時間、價差冷卻"""
+    now = time.time() if now is None else now
+    return {
+        "minutes": {minute: sorted(exchanges) for minute, exchanges in alert_minute_tracker.items()},
+        "large_trades": dict(last_large_trade_time),
+        "cooldowns": spreads.cooldowns(now) if spreads is not None else [],
+    }
+
+def restore_alert_dedup(saved, spreads=None):
+    """併入 alert_dedup_state() 的結果（多節點換手時由新領導者接續，已推送的警報不重發）"""
+    for minute, exchanges in saved.get("minutes", {}).items():
+        alert_minute_tracker.setdefault(minute, set()).update(exchanges)
+    for exchange_id, trade_time in saved.get("large_trades", {}).items():
+        last_large_trade_time[exchange_id] = max(trade_time, last_large_trade_time.get(exchange_id, 0))
+    if spreads is not None:
+        spreads.restore_cooldowns(saved.get("cooldowns", []))
+
+def watch_config(state, scanner, pipeline=None, scheduler=None, node=None):
+    """建立設定檔熱重載，並讓受影響的元件在設定變更時只重建需要的部分"""
+    import config
+    from config_reload import ConfigReloader
+    
+    reloader = ConfigReloader()
+    state.metrics['config'] = reloader.stats
+    
+    def on_exchanges(changed):
+        scanner.endpoints.sync()
+        state.sync_exchanges()
+        if pipeline is not None:
+            pipeline.exchanges = list(config.EXCHANGE_LIST)
+        if scheduler is not None:
+            scheduler.configure(config.EXCHANGE_LIST)
+        if node is not None:
+            node.exchanges = list(config.EXCHANGE_LIST)
+    
+    reloader.on_change(["EXCHANGES", "EXCHANGE_MIRRORS"], on_exchanges)
+    reloader.on_change(["RATE_LIMITS"], lambda changed: scanner.limiter.configure(changed["RATE_LIMITS"]))
+    if scheduler is not None:
+        reloader.on_change(["POLL_FLOOR", "POLL_CEILING"], lambda changed: scheduler.configure(
+            config.EXCHANGE_LIST, config.POLL_FLOOR, config.POLL_CEILING))
+    if pipeline is not None:
+        reloader.on_change(["PIPELINE_TICK_TIMEOUT"],
+                           lambda changed: setattr(pipeline, "tick_timeout", changed["PIPELINE_TICK_TIMEOUT"]))
+    if node is not None:
+        reloader.on_change(["CLUSTER_COLLECT_TIMEOUT"],
+                           lambda changed: setattr(node, "collect_timeout", changed["CLUSTER_COLLECT_TIMEOUT"]))
+    return reloader
+
+def create_order_books(state):
+    """建立訂單簿管理器（由掃描器以其連線池與速率限制啟動），未啟用時為 None"""
+    if not ORDER_BOOK_ENABLED:
+        return None
+    from order_book import OrderBookManager
+    order_books = OrderBookManager()
+    state.metrics['order_books'] = order_books.stats
+    return order_books
+
+def create_publisher():
+    """建立共享記憶體快照發布端，未啟用或無法建立時為 None"""
+    if not SNAPSHOT_SHM_ENABLED:
+        return None
+    from snapshot_shm import SnapshotPublisher
+    try:
+        return SnapshotPublisher()
+    except OSError as e:
+        print(f"⚠️  共享記憶體快照無法建立，略過發布: {e}")
+        return None
+
+async def run_live_monitor(cycles=None, serve_feed=None, profile=False, sample=None, adaptive=None):
+    """使用真實掃描器的監控循環，可選在同一程序內提供 HTTP/SSE 數據源
+
+    profile=True 啟用分段計時；sample=("cprofile", N) 對前 N 次掃描抽樣分析
+    adaptive=True 時各交易所依成交活躍度各自排程，每輪只輪詢到期的交易所
+    serve_feed / adaptive 未指定時讀取 FEED_SERVER_ENABLED / POLL_ADAPTIVE
+    """
+    serve_feed = FEED_SERVER_ENABLED if serve_feed is None else serve_feed
+    adaptive = POLL_ADAPTIVE if adaptive is None else adaptive
+    state = RadarState()
+    if profile:
+        profiler.enabled = True
+        state.metrics['profile'] = profiler.summary
+    if sample:
+        profiler.request_sample(*sample)
+    flow_stats = FlowStatsStore.load()
+    feed = None
+    if serve_feed:
+        from feed_server import FeedServer
+        feed = FeedServer(state)
+        await feed.start()
+    
+    from alert_sinks import AlertFanout
+    fanout = AlertFanout()
+    await fanout.start()
+    state.metrics['sinks'] = fanout.stats
+    
+    commands_task = None
+    if TELEGRAM_COMMANDS_ENABLED and TELEGRAM_BOT_TOKEN:
+        from telegram_commands import TelegramCommandHandler
+        commands = TelegramCommandHandler(state)
+        state.metrics['telegram_commands'] = commands.stats
+        commands_task = asyncio.create_task(commands.run_forever())
+    
+    scheduler = None
+    if adaptive:
+        from adaptive_poller import AdaptiveScheduler
+        from rate_limiter import shared_limiter
+        scheduler = AdaptiveScheduler(shared_limiter)
+        state.metrics['polling'] = scheduler.stats
+    
+    publisher = create_publisher()
+    try:
+        async with EnhancedExchangeScanner(order_books=create_order_books(state),
+                                           probe_endpoints=ENDPOINT_PROBE_ENABLED,
+                                           publisher=publisher, scheduler=scheduler) as scanner:
+            state.metrics['requests'] = scanner.coalescer.stats
+            state.metrics['rate_limit'] = scanner.limiter.stats
+            state.metrics['payloads'] = scanner.payloads.stats
+            rollups = RollupEngine()
+            state.metrics['rollups'] = rollups.stats
+            lead_lag = LeadLagAnalyzer() if LEADLAG_ENABLED else None
+            spreads = SpreadMonitor() if SPREAD_MONITOR_ENABLED else None
+            if spreads is not None:
+                state.metrics['spreads'] = spreads.stats
+            
+            def evaluate(result):
+                """管線 evaluate 段"""
+                outgoing = evaluate_tick(state, flow_stats, rollups, result.kline_data, result.scan_time,
+                                         result.exchanges, lead_lag, spreads, scanner.closed_candles())
+                profiler.end_tick()
+                if pipeline.ticks_completed % FLOW_STATS_CHECKPOINT_EVERY == 0:
+                    flow_stats.save()
+                    if scanner.trade_sizes is not None:
+                        scanner.trade_sizes.save()
+                return outgoing
+            
+            # 各通道在背景佇列發送，不阻塞掃描
+            pipeline = ScanPipeline(scanner, evaluate, lambda alert: fanout.publish(*alert))
+            state.metrics['pipeline'] = pipeline.stats
+            reloader = watch_config(state, scanner, pipeline, scheduler)
+            pipeline.start()
+            try:
+                cycle = 0
+                while cycles is None or cycle < cycles:
+                    if scheduler is None:
+                        await wait_for_next_scan()
+                        due = None
+                    else:
+                        await asyncio.sleep(scheduler.next_wakeup())
+                    reloader.poll()  # 在兩輪之間套用設定檔變更（無到期交易所時也要檢查）
+                    if scheduler is not None:
+                        due = scheduler.due()
+                        if not due:
+                            continue
+                    profiler.begin_tick()
+                    pipeline.submit_tick(due)
+                    cycle += 1
+                await pipeline.drain()
+            finally:
+                await pipeline.stop()
+                if scanner.trade_sizes is not None:
+                    scanner.trade_sizes.save()
+    finally:
+        flow_stats.save()
+        if publisher is not None:
+            publisher.close()
+        if commands_task is not None:
+            commands_task.cancel()
+            await asyncio.gather(commands_task, return_exceptions=True)
+        await fanout.stop()
+        if feed is not None:
+            await feed.stop()
+
+async def run_cluster_monitor(cluster_dir=None, node_id=None, cycles=None, serve_feed=None):
+    """多節點模式：只掃描分配到的交易所，領導者節點評估規則並推送警報
+
+    領導者每輪把警報去重與冷卻狀態寫入協調者，換手後的新領導者先讀回再評估，不會重發已推送的警報；
+    失衡統計改從檢查點重新載入（共用工作目錄時接續前任的最後一次檢查點）；
+    彙總K線從新領導者看到的下一根 1m K線開始，換手當下未收盤的較大時間框架K線不補
+    """
+    cluster_dir = CLUSTER_DIR if cluster_dir is None else cluster_dir
+    node_id = CLUSTER_NODE_ID if node_id is None else node_id
+    serve_feed = FEED_SERVER_ENABLED if serve_feed is None else serve_feed
+    from alert_sinks import AlertFanout
+    from cluster import ClusterNode, FileCoordinator
+    
+    node = ClusterNode(FileCoordinator(cluster_dir), node_id)
+    state = RadarState()
+    state.metrics['cluster'] = node.stats
+    flow_stats = FlowStatsStore.load()
+    rollups = RollupEngine()
+    lead_lag = LeadLagAnalyzer() if LEADLAG_ENABLED else None
+    spreads = SpreadMonitor() if SPREAD_MONITOR_ENABLED else None
+    if spreads is not None:
+        state.metrics['spreads'] = spreads.stats
+    feed = None
+    if serve_feed:
+        from feed_server import FeedServer
+        feed = FeedServer(state)
+        await feed.start()
+    fanout = AlertFanout()
+    await fanout.start()
+    state.metrics['sinks'] = fanout.stats
+    publisher = None  # 同機多個節點共用快照檔，只由領導者寫入合併結果（單一寫入者）
+    
+    try:
+        async with EnhancedExchangeScanner(order_books=create_order_books(state),
+                                           probe_endpoints=ENDPOINT_PROBE_ENABLED) as scanner:
+            state.metrics['requests'] = scanner.coalescer.stats
+            state.metrics['rate_limit'] = scanner.limiter.stats
+            reloader = watch_config(state, scanner, node=node)
+            cycle = 0
+            while cycles is None or cycle < cycles:
+                await wait_for_next_scan()
+                reloader.poll()
+                scan_time = scanner.begin_scan()
+                kline_data = await node.run_tick(scanner, scan_time)
+                cycle += 1
+                if kline_data is None:
+                    # 非領導者只負責掃描與發布；失去領導權時釋出快照寫入端，保持單一寫入者
+                    if publisher is not None:
+                        publisher.close()
+                        publisher = None
+                    continue
+                if node.took_over:
+                    restore_alert_dedup(await node.load_alert_state(), spreads)
+                    flow_stats = FlowStatsStore.load()
+                if publisher is None:
+                    publisher = create_publisher()
+                if publisher is not None:
+                    publisher.publish(kline_data, scan_time.timestamp())
+                # 已收盤K線由各分片隨結果發布（領導者不另外請求其他分片的交易所）
+                for alert_type, alert_data in evaluate_tick(state, flow_stats, rollups, kline_data, scan_time,
+                                                            lead_lag=lead_lag, spreads=spreads,
+                                                            candles=node.candles):
+                    fanout.publish(alert_type, alert_data)
+                await node.save_alert_state(alert_dedup_state(spreads, scan_time.timestamp()))
+                if cycle % FLOW_STATS_CHECKPOINT_EVERY == 0:
+                    flow_stats.save()
+    finally:
+        await node.leave()
+        if node.is_leader:
+            flow_stats.save()
+        if publisher is not None:
+            publisher.close()
+        await fanout.stop()
+        if feed is not None:
+            await feed.stop()
+
 def main():
     print("=" * 60)
     print("🚀 DUSK/USDT多交易所監控系統")
@@ -147,4 +498,24 @@ if __name__ == "__main__":
     if not check_config():
         print("❌ 配置檢查失敗")
         sys.exit(1)
-    main()
+    cluster_arg = next((arg for arg in sys.argv if arg == "--cluster" or arg.startswith("--cluster=")), None)
+    if cluster_arg and HAS_SCANNER:
+        # --cluster[=目錄] [--node-id=名稱]：多節點分片模式
+        cluster_dir = cluster_arg.partition("=")[2] or CLUSTER_DIR
+        if not cluster_dir:
+            print("❌ 多節點模式需要 --cluster=目錄 或 CLUSTER_DIR")
+            sys.exit(1)
+        node_id = next((arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--node-id=")), CLUSTER_NODE_ID)
+        asyncio.run(run_cluster_monitor(cluster_dir, node_id))
+    elif "--live" in sys.argv and HAS_SCANNER:
+        # --profile 分段計時；--profile-sample=cprofile:10 或 tracemalloc:10 抽樣分析
+        # --fixed-interval 關閉自適應輪詢（固定每 CHECK_INTERVAL 秒掃描全部交易所）
+        sample = None
+        for arg in sys.argv:
+            if arg.startswith("--profile-sample="):
+                mode, _, ticks = arg.split("=", 1)[1].partition(":")
+                sample = (mode, int(ticks or 10))
+        asyncio.run(run_live_monitor(profile="--profile" in sys.argv, sample=sample,
+                                     adaptive=POLL_ADAPTIVE and "--fixed-interval" not in sys.argv))
+    else:
+        main()
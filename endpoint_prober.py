@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+交易所端點並發探測器
+同時測試每家交易所所有候選鏡像的連線時間、首字節時間(TTFB)與數據有效性，
+維護排名表供掃描器啟動時讀取，並在背景定期刷新、失敗時自動切換
+"""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from config import (
+    EXCHANGES, EXCHANGE_LIST, SYMBOL, API_TIMEOUT,
+    EXCHANGE_MIRRORS, ENDPOINT_TABLE_FILE, ENDPOINT_PROBE_INTERVAL,
+    format_taiwan_time
+)
+from radar_logging import get_logger, exchange_logger
+
+logger = get_logger("endpoints")
+
+
+@dataclass
+class ProbeResult:
+    """單一端點探測結果"""
+    exchange_id: str
+    base_url: str
+    ok: bool = False
+    connect_ms: Optional[float] = None
+    ttfb_ms: Optional[float] = None
+    total_ms: Optional[float] = None
+    volume: float = 0.0
+    error: str = ""
+
+    @property
+    def score(self) -> float:
+        """排名分數（越小越好，無效端點排最後）"""
+        if not self.ok:
+            return float("inf")
+        return self.ttfb_ms if self.ttfb_ms is not None else self.total_ms
+
+
+def _probe_request(exchange_id: str, base_url: str, symbol: str = SYMBOL):
+    """各交易所的探測請求（Ticker）與成交量解析"""
+    venue_symbol = EXCHANGES[exchange_id]['symbol_mapping'][symbol]
+
+    if exchange_id == "coinbase":
+        # Coinbase 現貨價格端點不含成交量，以價格 > 0 判定有效
+        return (f"{base_url}/v2/prices/{venue_symbol}/spot", {},
+                lambda data: float(data['data']['amount']))
+    if exchange_id == "kraken":
+        return (f"{base_url}/0/public/Ticker", {"pair": venue_symbol},
+                lambda data: float(next(iter(data['result'].values()))['v'][1]))
+    if exchange_id == "okx":
+        return (f"{base_url}/api/v5/market/ticker", {"instId": venue_symbol},
+                lambda data: float(data['data'][0]['vol24h']))
+    if exchange_id == "bybit":
+        return (f"{base_url}/v5/market/tickers", {"category": "spot", "symbol": venue_symbol},
+                lambda data: float(data['result']['list'][0]['volume24h']))
+    if exchange_id == "gateio":
+        return (f"{base_url}/api/v4/spot/tickers", {"currency_pair": venue_symbol},
+                lambda data: float(data[0]['base_volume']))
+    if exchange_id == "mexc":
+        return (f"{base_url}/api/v3/ticker/24hr", {"symbol": venue_symbol},
+                lambda data: float(data['volume']))
+    raise ValueError(f"未知的交易所: {exchange_id}")
+
+
+def _make_trace_config() -> aiohttp.TraceConfig:
+    """以 aiohttp trace 記錄連線與首字節時間"""
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        ctx.trace_request_ctx['start'] = time.perf_counter()
+
+    async def on_connection_create_start(session, ctx, params):
+        ctx.trace_request_ctx['connect_start'] = time.perf_counter()
+
+    async def on_connection_create_end(session, ctx, params):
+        ctx.trace_request_ctx['connect_end'] = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        ctx.trace_request_ctx['headers'] = time.perf_counter()
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
+
+
+class EndpointTable:
+    """各交易所端點排名表（第一項為目前使用的端點）"""
+
+    def __init__(self, path: str = ENDPOINT_TABLE_FILE):
+        self.path = path
+        self.rankings: Dict[str, List[str]] = {
+            ex_id: list(EXCHANGE_MIRRORS.get(ex_id, [EXCHANGES[ex_id]['api_base']]))
+            for ex_id in EXCHANGE_LIST
+        }
+        self.results: Dict[str, List[Dict]] = {}
+        self.failures: Dict[str, int] = {}
+        self.updated_at: Optional[str] = None
+
+    @classmethod
+    def load(cls, path: str = ENDPOINT_TABLE_FILE) -> "EndpointTable":
+        """讀取上次的排名；檔案不存在或損壞時使用配置預設值"""
+        table = cls(path)
+        if not os.path.exists(path):
+            return table
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            for ex_id, ranking in saved.get('rankings', {}).items():
+                if ex_id in table.rankings and ranking:
+                    table.rankings[ex_id] = ranking
+            table.results = saved.get('results', {})
+            table.updated_at = saved.get('updated_at')
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️  端點排名表讀取失敗，使用預設端點: %s", e, extra={"path": path})
+        return table
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"rankings": self.rankings, "results": self.results,
+                       "updated_at": self.updated_at}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def sync(self):
+        """設定熱重載後對齊交易所與鏡像：新增的交易所加入、移除的刪除、鏡像變更的重設排名"""
+        for ex_id in list(self.rankings):
+            if ex_id not in EXCHANGES:
+                del self.rankings[ex_id]
+                self.failures.pop(ex_id, None)
+        for ex_id in EXCHANGE_LIST:
+            mirrors = list(EXCHANGE_MIRRORS.get(ex_id, [EXCHANGES[ex_id]['api_base']]))
+            if set(self.rankings.get(ex_id, [])) != set(mirrors):
+                self.rankings[ex_id] = mirrors
+                self.failures[ex_id] = 0
+
+    def best(self, exchange_id: str) -> str:
+        """目前最佳端點"""
+        ranking = self.rankings.get(exchange_id)
+        return ranking[0] if ranking else EXCHANGES[exchange_id]['api_base']
+
+    def update(self, exchange_id: str, results: List[ProbeResult]):
+        """依探測結果重新排名（全部失敗時保留原排名）"""
+        ranked = sorted(results, key=lambda r: r.score)
+        self.results[exchange_id] = [asdict(r) for r in ranked]
+        if any(r.ok for r in ranked):
+            self.rankings[exchange_id] = [r.base_url for r in ranked]
+            self.failures[exchange_id] = 0
+        self.updated_at = format_taiwan_time()
+
+    def report_success(self, exchange_id: str):
+        self.failures[exchange_id] = 0
+
+    def report_failure(self, exchange_id: str, max_failures: int = 2) -> str:
+        """記錄請求失敗；連續失敗達上限時切換到下一個端點，回傳目前端點"""
+        self.failures[exchange_id] = self.failures.get(exchange_id, 0) + 1
+        ranking = self.rankings.get(exchange_id, [])
+        if self.failures[exchange_id] >= max_failures and len(ranking) > 1:
+            failed = ranking.pop(0)
+            ranking.append(failed)
+            self.failures[exchange_id] = 0
+            exchange_logger(exchange_id).warning(
+                "🔀 %s 切換端點: %s → %s", EXCHANGES[exchange_id]['name'], failed, ranking[0],
+                extra={"exchange": exchange_id, "failed": failed, "endpoint": ranking[0]})
+        return self.best(exchange_id)
+
+
+class EndpointProber:
+    """並發端點探測器"""
+
+    def __init__(self, timeout: float = API_TIMEOUT, symbol: str = SYMBOL):
+        self.timeout = timeout
+        self.symbol = symbol
+
+    async def probe_one(self, session: aiohttp.ClientSession,
+                        exchange_id: str, base_url: str) -> ProbeResult:
+        """探測單一端點"""
+        result = ProbeResult(exchange_id=exchange_id, base_url=base_url)
+        url, params, extract_volume = _probe_request(exchange_id, base_url, self.symbol)
+        timing: Dict[str, float] = {}
+
+        try:
+            async with session.get(url, params=params, trace_request_ctx=timing) as response:
+                body = await response.read()
+            end = time.perf_counter()
+
+            if 'connect_start' in timing and 'connect_end' in timing:
+                result.connect_ms = (timing['connect_end'] - timing['connect_start']) * 1000
+            if 'headers' in timing:
+                result.ttfb_ms = (timing['headers'] - timing['start']) * 1000
+            result.total_ms = (end - timing['start']) * 1000
+
+            if response.status != 200:
+                result.error = f"HTTP {response.status}"
+                return result
+
+            result.volume = extract_volume(json.loads(body))
+            result.ok = result.volume > 0
+            if not result.ok:
+                result.error = "成交量為 0"
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {str(e)[:80]}"
+        return result
+
+    async def probe_all(self, exchanges: Optional[List[str]] = None) -> Dict[str, List[ProbeResult]]:
+        """同時探測所有交易所的所有候選端點"""
+        exchanges = exchanges or EXCHANGE_LIST
+        candidates = [
+            (ex_id, base_url)
+            for ex_id in exchanges
+            for base_url in EXCHANGE_MIRRORS.get(ex_id, [EXCHANGES[ex_id]['api_base']])
+        ]
+        # 每次請求建立新連線，才能量到真實的連線時間
+        connector = aiohttp.TCPConnector(force_close=True)
+        async with aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[_make_trace_config()]
+        ) as session:
+            probed = await asyncio.gather(
+                *[self.probe_one(session, ex_id, base_url) for ex_id, base_url in candidates]
+            )
+
+        results: Dict[str, List[ProbeResult]] = {ex_id: [] for ex_id in exchanges}
+        for result in probed:
+            results[result.exchange_id].append(result)
+        return results
+
+    async def refresh(self, table: EndpointTable) -> Dict[str, List[ProbeResult]]:
+        """探測並更新排名表"""
+        results = await self.probe_all()
+        for ex_id, ex_results in results.items():
+            table.update(ex_id, ex_results)
+        try:
+            table.save()
+        except OSError as e:
+            logger.warning("⚠️  端點排名表儲存失敗: %s", e, extra={"path": table.path})
+        return results
+
+    async def run_forever(self, table: EndpointTable, interval: float = ENDPOINT_PROBE_INTERVAL):
+        """背景定期刷新排名表"""
+        while True:
+            try:
+                await self.refresh(table)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("❌ 端點探測失敗: %s", str(e)[:80], extra={"error": type(e).__name__})
+            await asyncio.sleep(interval)
+
+
+def print_probe_results(results: Dict[str, List[ProbeResult]]):
+    """列印探測結果"""
+    for ex_id, ex_results in results.items():
+        print(f"\n🏦 {EXCHANGES[ex_id]['name']}")
+        for rank, r in enumerate(sorted(ex_results, key=lambda r: r.score), 1):
+            if r.ok:
+                connect = f"{r.connect_ms:.0f}ms" if r.connect_ms is not None else "N/A"
+                print(f"  {rank}. ✅ {r.base_url}  連線 {connect}  TTFB {r.ttfb_ms:.0f}ms  "
+                      f"成交量 {r.volume:,.0f}")
+            else:
+                print(f"  {rank}. ❌ {r.base_url}  {r.error}")
+
+
+async def main():
+    print("🔍 並發探測所有交易所端點...")
+    print(f"🕐 探測時間: {format_taiwan_time()}")
+    print("=" * 60)
+
+    table = EndpointTable.load()
+    started = time.perf_counter()
+    results = await EndpointProber().refresh(table)
+    print_probe_results(results)
+
+    print("\n" + "=" * 60)
+    print(f"✅ 探測完成（{time.perf_counter() - started:.1f} 秒），排名表已寫入 {table.path}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
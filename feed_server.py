@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+本機 HTTP / SSE 數據源
+在監控程序內提供最新快照、近期歷史與有效警報（JSON），
+並以 Server-Sent Events 在每次掃描後推送
+所有回應都來自每次掃描預先序列化的位元組，客戶端數量不影響交易所請求
+
+端點:
+  GET /snapshot          最新掃描
+  GET /history?limit=N   近期掃描（預設全部）
+  GET /alerts            有效警報
+  GET /events            SSE 即時推送
+  GET /health            健康檢查
+"""
+
+import asyncio
+import json
+import math
+import time
+from typing import List, Optional
+
+from aiohttp import web
+
+from config import FEED_SERVER_HOST, FEED_SERVER_PORT, FEED_SSE_QUEUE_SIZE
+from radar_logging import get_logger
+from radar_state import RadarState
+
+logger = get_logger("feed")
+
+JSON_HEADERS = {"Content-Type": "application/json; charset=utf-8", "Cache-Control": "no-cache"}
+SSE_HEARTBEAT = 15  # 秒
+
+
+def _finite(obj):
+    """NaN / ±Infinity 換成 None（標準 JSON 不允許，瀏覽器的 JSON.parse 會失敗）"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
+
+
+def _dumps(obj) -> bytes:
+    try:
+        text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+    except ValueError:
+        # 少見情況（例如無成交時的比率）才逐層清理，一般掃描不多付成本
+        text = json.dumps(_finite(obj), ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+    return text.encode("utf-8")
+
+
+class FeedServer:
+    """嵌入式 HTTP / SSE 伺服器"""
+
+    def __init__(self, state: RadarState, host: str = FEED_SERVER_HOST, port: int = FEED_SERVER_PORT):
+        self.state = state
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+        self._clients: List[asyncio.Queue] = []
+
+        # 每次掃描更新一次的預序列化回應
+        self._snapshot_bytes = b"null"
+        self._history_items: List[bytes] = []
+        self._history_bytes = b"[]"
+        self._alerts_bytes = b"[]"
+        self._metrics_bytes = b"{}"
+        self.stats = {"requests": 0, "sse_clients": 0, "sse_dropped": 0}
+
+        state.add_listener(self._on_tick)
+
+    def _on_tick(self, state: RadarState):
+        """掃描後重建快取並推送 SSE（每次掃描只序列化一次）"""
+        self._snapshot_bytes = _dumps(state.latest_tick)
+        self._history_items.append(self._snapshot_bytes)
+        if len(self._history_items) > state.history.maxlen:
+            del self._history_items[0]
+        self._history_bytes = b"[" + b",".join(self._history_items) + b"]"
+        self._alerts_bytes = _dumps(state.active_alerts())
+        self._metrics_bytes = _dumps(state.metrics)
+
+        event = b"event: tick\ndata: " + self._snapshot_bytes + b"\n\n"
+        for queue in self._clients:
+            if queue.full():
+                queue.get_nowait()  # 慢速客戶端丟棄最舊事件
+                self.stats['sse_dropped'] += 1
+            queue.put_nowait(event)
+
+    def _json(self, body: bytes) -> web.Response:
+        self.stats['requests'] += 1
+        return web.Response(body=body, headers=JSON_HEADERS)
+
+    async def handle_snapshot(self, request: web.Request) -> web.Response:
+        return self._json(self._snapshot_bytes)
+
+    async def handle_history(self, request: web.Request) -> web.Response:
+        limit = request.query.get("limit")
+        if limit is None:
+            return self._json(self._history_bytes)
+        try:
+            limit = max(int(limit), 0)
+        except ValueError:
+            raise web.HTTPBadRequest(text="limit 必須是整數")
+        items = self._history_items[-limit:] if limit else []
+        return self._json(b"[" + b",".join(items) + b"]")
+
+    async def handle_alerts(self, request: web.Request) -> web.Response:
+        return self._json(self._alerts_bytes)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        # 統計在掃描時已序列化，這裡只組合即時的計數
+        head = _dumps({
+            "status": "ok",
+            "tick": self.state.tick_no,
+            "uptime": int(time.time() - self.state.started_at),
+            "sse_clients": len(self._clients),
+        })
+        return self._json(head[:-1] + b',"metrics":' + self._metrics_bytes + b"}")
+
+    async def handle_events(self, request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        await response.prepare(request)
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=FEED_SSE_QUEUE_SIZE)
+        self._clients.append(queue)
+        self.stats['sse_clients'] += 1
+        try:
+            if self.state.latest_tick is not None:
+                await response.write(b"event: tick\ndata: " + self._snapshot_bytes + b"\n\n")
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    event = b": heartbeat\n\n"
+                await response.write(event)
+        except ConnectionResetError:
+            pass
+        finally:
+            # 被取消（客戶端斷線或伺服器關閉）時清理後照常往上拋
+            self._clients.remove(queue)
+        return response
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/snapshot", self.handle_snapshot)
+        app.router.add_get("/history", self.handle_history)
+        app.router.add_get("/alerts", self.handle_alerts)
+        app.router.add_get("/events", self.handle_events)
+        app.router.add_get("/health", self.handle_health)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("🌐 數據源已啟動: http://%s:%s", self.host, self.port)
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+HTTP 傳輸層與錄製/重播（cassette）
+掃描器與K線獲取器的 REST 請求都經過 HttpTransport：
+  HttpTransport       直接以 aiohttp 發出請求
+  RecordingTransport  發出請求並把回應（含耗時）寫入 gzip 壓縮的 JSONL 檔
+  ReplayTransport     從錄製檔回放回應，可依原始時間或盡快重播
+離線重播可在數秒內重跑一整天的掃描，用於回歸測試、效能分析與壓力測試
+
+用法:
+  python http_cassette.py record cassettes/day.jsonl.gz 100   # 錄製100次掃描
+  python http_cassette.py replay cassettes/day.jsonl.gz [--realtime] [--profile]
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import aiohttp
+from multidict import CIMultiDict
+
+from config import API_TIMEOUT, CASSETTE_DIR
+
+CASSETTE_VERSION = 1
+
+# 只保留重播需要的回應標頭（速率限制與快取驗證相關），其餘丟棄以縮小檔案
+_KEPT_HEADERS = ("retry-after", "content-type", "etag", "last-modified")
+
+
+def _keep_header(name: str) -> bool:
+    name = name.lower()
+    return name in _KEPT_HEADERS or name.startswith("x-")
+
+
+def _request_key(url: str, params: Optional[Dict]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return url, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+
+
+class HTTPStatusError(Exception):
+    """HTTP 狀態碼 >= 400"""
+
+    def __init__(self, status: int, url: str):
+        super().__init__(f"HTTP {status}: {url}")
+        self.status = status
+        self.url = url
+
+
+class CassetteMiss(LookupError):
+    """錄製檔中找不到對應請求"""
+
+
+@dataclass
+class HttpResponse:
+    """已讀完的回應"""
+    status: int
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=CIMultiDict)
+    elapsed: float = 0.0  # 秒
+
+    def __post_init__(self):
+        # 標頭名稱不分大小寫（各交易所與代理回傳的大小寫不一，錄製檔也可能是小寫）
+        if not isinstance(self.headers, CIMultiDict):
+            self.headers = CIMultiDict(self.headers)
+
+    def raise_for_status(self, url: str = ""):
+        if self.status >= 400:
+            raise HTTPStatusError(self.status, url)
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class HttpTransport:
+    """以 aiohttp 直接請求"""
+
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None):
+        self.session = session
+
+    def attach(self, session: aiohttp.ClientSession):
+        """由掃描器在建立連線後注入 session"""
+        if self.session is None:
+            self.session = session
+
+    def mark_tick(self):
+        """掃描開始時呼叫（錄製時標記所屬的掃描序號）"""
+
+    async def get(self, url: str, params: Optional[Dict] = None, timeout: float = API_TIMEOUT,
+                  headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        started = time.perf_counter()
+        async with self.session.get(url, params=params, timeout=timeout, headers=headers) as response:
+            body = await response.read()
+            return HttpResponse(response.status, body, CIMultiDict(response.headers),
+                                time.perf_counter() - started)
+
+    def close(self):
+        pass
+
+
+class RecordingTransport(HttpTransport):
+    """發出請求並錄製：每行一筆 {tick, t, url, params, status, headers, elapsed, body}"""
+
+    def __init__(self, path: str, session: Optional[aiohttp.ClientSession] = None):
+        super().__init__(session)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._file.write(json.dumps({"version": CASSETTE_VERSION, "created": time.time()}) + "\n")
+        self._started = time.perf_counter()
+        self.tick = -1
+        self.recorded = 0
+
+    def mark_tick(self):
+        self.tick += 1
+
+    async def get(self, url: str, params: Optional[Dict] = None, timeout: float = API_TIMEOUT,
+                  headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        sent_at = time.perf_counter() - self._started
+        response = await super().get(url, params, timeout, headers)
+        self._file.write(json.dumps({
+            "tick": max(self.tick, 0),
+            "t": round(sent_at, 4),
+            "url": url,
+            "params": {str(k): str(v) for k, v in (params or {}).items()},
+            "status": response.status,
+            "headers": {k: v for k, v in response.headers.items() if _keep_header(k)},
+            "elapsed": round(response.elapsed, 4),
+            "body": response.body.decode("utf-8", "replace"),
+        }, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.recorded += 1
+        return response
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            print(f"💾 已錄製 {self.recorded} 筆請求（{self.tick + 1} 次掃描）: {self.path}")
+
+
+class ReplayTransport(HttpTransport):
+    """從錄製檔回放
+
+    相同請求依錄製順序依序回放；參數不同（如K線起始時間）時退回同 URL 的下一筆。
+    realtime=True 時依錄製的發送時間與耗時等待，否則立即回應。
+    """
+
+    def __init__(self, path: str, realtime: bool = False):
+        super().__init__(None)
+        self.path = path
+        self.realtime = realtime
+        self._by_key: Dict[Tuple, Deque[dict]] = defaultdict(deque)
+        self._by_url: Dict[str, Deque[dict]] = defaultdict(deque)
+        self.ticks = 0
+        self.served = 0
+        self.misses = 0
+        self._started: Optional[float] = None
+
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"錄製檔版本不符: {path}")
+            for line in f:
+                entry = json.loads(line)
+                self._by_key[_request_key(entry['url'], entry['params'])].append(entry)
+                self._by_url[entry['url']].append(entry)
+                self.ticks = max(self.ticks, entry['tick'] + 1)
+
+    def _take(self, url: str, params: Optional[Dict]) -> dict:
+        queue = self._by_key.get(_request_key(url, params))
+        while queue:
+            entry = queue.popleft()
+            if not entry.get('served'):
+                break
+        else:
+            queue = self._by_url.get(url)
+            while queue:
+                entry = queue.popleft()
+                if not entry.get('served'):
+                    break
+            else:
+                self.misses += 1
+                raise CassetteMiss(f"錄製檔中沒有此請求: {url} {params}")
+        entry['served'] = True
+        return entry
+
+    async def get(self, url: str, params: Optional[Dict] = None, timeout: float = API_TIMEOUT,
+                  headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        # 條件請求標頭不影響比對：錄製時的 304 會原樣回放
+        entry = self._take(url, params)
+        if self.realtime:
+            if self._started is None:
+                self._started = time.perf_counter() - entry['t']
+            delay = self._started + entry['t'] + entry['elapsed'] - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self.served += 1
+        return HttpResponse(entry['status'], entry['body'].encode("utf-8"),
+                            entry['headers'], entry['elapsed'])
+
+
+async def record_cassette(path: str, ticks: int):
+    """以真實掃描節奏錄製 ticks 次掃描"""
+    from multi_exchange_scanner import EnhancedExchangeScanner
+    from dusk_monitor import wait_for_next_scan
+
+    transport = RecordingTransport(path)
+    async with EnhancedExchangeScanner(transport=transport) as scanner:
+        for _ in range(ticks):
+            await wait_for_next_scan()
+            await scanner.scan_all_exchanges()
+
+
+async def replay_cassette(path: str, realtime: bool = False) -> Dict[str, Any]:
+    """重播錄製檔中的每次掃描，回傳重播統計
+
+    重播時關閉速率限制與短效快取，避免連續掃描互相命中或被人為延遲
+    """
+    from multi_exchange_scanner import EnhancedExchangeScanner
+    from rate_limiter import RateLimiter
+    from request_coalescer import SingleFlight
+    from scan_profiler import profiler
+
+    transport = ReplayTransport(path, realtime=realtime)
+    started = time.perf_counter()
+    results = []
+    async with EnhancedExchangeScanner(transport=transport, coalescer=SingleFlight(ttl=0),
+                                       limiter=RateLimiter({})) as scanner:
+        for _ in range(transport.ticks):
+            profiler.begin_tick()
+            with profiler.phase("scan"):
+                results.append(await scanner.scan_all_exchanges())
+            profiler.end_tick()
+
+    stats = {
+        "ticks": transport.ticks,
+        "requests": transport.served,
+        "misses": transport.misses,
+        "seconds": round(time.perf_counter() - started, 3),
+        "results": results,
+    }
+    print(f"⏩ 重播完成: {stats['ticks']} 次掃描, {stats['requests']} 筆請求, "
+          f"未命中 {stats['misses']}, 耗時 {stats['seconds']}s")
+    return stats
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ("record", "replay"):
+        print(__doc__)
+        sys.exit(1)
+    cassette = sys.argv[2]
+    if sys.argv[1] == "record":
+        if os.path.dirname(cassette) == "":
+            cassette = os.path.join(CASSETTE_DIR, cassette)
+        asyncio.run(record_cassette(cassette, int(sys.argv[3]) if len(sys.argv) > 3 else 20))
+    else:
+        from scan_profiler import profiler
+        profiler.enabled = "--profile" in sys.argv
+        asyncio.run(replay_cassette(cassette, realtime="--realtime" in sys.argv))
+        if profiler.enabled:
+            print(profiler.report())
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+增量K線獲取器
+使用 config.EXCHANGES 的K線端點與 KLINE_FIELD_MAPPING 解析，
+已收盤K線快取不再重抓，每次只請求最後一根已收盤K線之後的數據
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from config import (
+    EXCHANGES, SYMBOL, TIMEFRAME, API_TIMEOUT,
+    KLINE_FIELD_MAPPING, TIMEFRAME_SECONDS, KLINE_HISTORY_LIMIT
+)
+from http_cassette import HttpTransport
+
+
+@dataclass
+class Candle:
+    """單根K線（時間統一為毫秒）"""
+    time: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    closed: bool = False
+
+    @property
+    def is_red(self) -> bool:
+        return self.close < self.open
+
+    @property
+    def is_green(self) -> bool:
+        return self.close > self.open
+
+
+# 各交易所增量請求規格
+#   since_param: 起始時間參數名
+#   time_unit: 交易所時間單位相對於秒的倍數（1=秒，1000=毫秒）
+#   since_exclusive: since 參數是否不含該時間點本身
+#   limit_param: 數量參數名（None 表示增量請求時不帶數量）
+VENUE_SPECS = {
+    "kraken": {"since_param": "since", "time_unit": 1, "since_exclusive": True, "limit_param": None},
+    "okx": {"since_param": "before", "time_unit": 1000, "since_exclusive": True, "limit_param": "limit"},
+    "bybit": {"since_param": "start", "time_unit": 1000, "since_exclusive": False,
+              "limit_param": "limit", "extra_params": {"category": "spot"}},
+    "gateio": {"since_param": "from", "time_unit": 1, "since_exclusive": False, "limit_param": None},
+    "mexc": {"since_param": "startTime", "time_unit": 1000, "since_exclusive": False, "limit_param": "limit"},
+}
+
+
+def _extract_rows(exchange_id: str, data) -> List[list]:
+    """從回應中取出K線列表"""
+    if exchange_id == "kraken":
+        if data.get('error'):
+            raise ValueError(f"Kraken 錯誤: {data['error']}")
+        return next(rows for key, rows in data['result'].items() if key != "last")
+    if exchange_id == "okx":
+        return data['data']
+    if exchange_id == "bybit":
+        if data.get('retCode') != 0:
+            raise ValueError(f"Bybit 錯誤: {data.get('retMsg')}")
+        return data['result']['list']
+    return data
+
+
+class KlineCache:
+    """單一 (交易所, 交易對, 時間框架) 的K線快取"""
+
+    def __init__(self, max_history: int = KLINE_HISTORY_LIMIT):
+        self.closed: Deque[Candle] = deque(maxlen=max_history)
+        self.open_candle: Optional[Candle] = None
+
+    @property
+    def last_closed_time(self) -> Optional[int]:
+        return self.closed[-1].time if self.closed else None
+
+    def merge(self, candles: List[Candle]) -> int:
+        """合併新K線（需依時間排序），回傳新增的已收盤K線數"""
+        added = 0
+        last_time = self.last_closed_time
+        for candle in candles:
+            if last_time is not None and candle.time <= last_time:
+                continue  # 已收盤K線不會再變動
+            if candle.closed:
+                self.closed.append(candle)
+                last_time = candle.time
+                added += 1
+            else:
+                self.open_candle = candle
+        if self.open_candle is not None and last_time is not None and self.open_candle.time <= last_time:
+            self.open_candle = None
+        return added
+
+    def latest(self) -> Optional[Candle]:
+        """最新K線（優先未收盤K線）"""
+        if self.open_candle is not None:
+            return self.open_candle
+        return self.closed[-1] if self.closed else None
+
+
+class IncrementalKlineFetcher:
+    """增量K線獲取器
+
+    首次請求取 initial_limit 根歷史K線，之後每次只請求最後一根
+    已收盤K線之後的數據，回應大小與快取歷史長度無關。
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, timeframe: str = TIMEFRAME,
+                 initial_limit: int = 100, max_history: int = KLINE_HISTORY_LIMIT,
+                 endpoints=None, limiter=None, transport: Optional[HttpTransport] = None):
+        self.session = session
+        self.transport = transport or HttpTransport(session)
+        self.endpoints = endpoints  # 可選 EndpointTable，使用探測出的最快端點
+        self.limiter = limiter  # 可選 RateLimiter，與掃描器共用額度
+        self.timeframe = timeframe
+        self.interval_seconds = TIMEFRAME_SECONDS[timeframe]
+        self.initial_limit = initial_limit
+        self.max_history = max_history
+        self.caches: Dict[Tuple[str, str], KlineCache] = {}
+        self.stats = {"requests": 0, "bytes": 0, "rows_parsed": 0}
+
+    @staticmethod
+    def supports(exchange_id: str) -> bool:
+        """Coinbase 的配置端點為匯率而非K線，不支援"""
+        return exchange_id in VENUE_SPECS
+
+    def get_cache(self, exchange_id: str, symbol: str = SYMBOL) -> KlineCache:
+        key = (exchange_id, symbol)
+        if key not in self.caches:
+            self.caches[key] = KlineCache(self.max_history)
+        return self.caches[key]
+
+    def closed_due(self, exchange_id: str, symbol: str = SYMBOL, now: Optional[float] = None) -> bool:
+        """快取之後是否已有新K線收盤（尚無快取時為 True）"""
+        last_closed = self.get_cache(exchange_id, symbol).last_closed_time
+        if last_closed is None:
+            return True
+        now_ms = int((now if now is not None else time.time()) * 1000)
+        return now_ms >= last_closed + 2 * self.interval_seconds * 1000
+
+    def build_request(self, exchange_id: str, symbol: str = SYMBOL,
+                      now: Optional[float] = None) -> Tuple[str, Dict]:
+        """依配置組出K線請求（有快取時帶起始時間參數）
+
+        沒有新K線收盤時起始時間之後只有未收盤K線，只請求1根
+        """
+        config = EXCHANGES[exchange_id]
+        spec = VENUE_SPECS[exchange_id]
+        params = dict(spec.get('extra_params', {}))
+        params[config['symbol_param']] = config['symbol_mapping'][symbol]
+        params[config['interval_param']] = config['interval_mapping'][self.timeframe]
+
+        last_closed = self.get_cache(exchange_id, symbol).last_closed_time
+        if last_closed is None:
+            if spec['limit_param']:
+                params[spec['limit_param']] = self.initial_limit
+        else:
+            since_ms = last_closed if spec['since_exclusive'] else last_closed + self.interval_seconds * 1000
+            params[spec['since_param']] = since_ms * spec['time_unit'] // 1000
+            if spec['limit_param']:
+                # 有K線收盤時正常只有1~2根，保留少量餘裕應付漏掃
+                params[spec['limit_param']] = 10 if self.closed_due(exchange_id, symbol, now) else 1
+
+        api_base = self.endpoints.best(exchange_id) if self.endpoints else config['api_base']
+        return f"{api_base}{config['endpoint']}", params
+
+    def parse_rows(self, exchange_id: str, rows: List[list], now: Optional[float] = None) -> List[Candle]:
+        """依 KLINE_FIELD_MAPPING 解析K線並依時間排序"""
+        mapping = KLINE_FIELD_MAPPING[exchange_id]
+        time_unit = VENUE_SPECS[exchange_id]['time_unit']
+        interval_ms = self.interval_seconds * 1000
+        now_ms = int((now if now is not None else time.time()) * 1000)
+
+        candles = []
+        for row in rows:
+            open_time = int(float(row[mapping['time']])) * 1000 // time_unit
+            candles.append(Candle(
+                time=open_time,
+                open=float(row[mapping['open']]),
+                high=float(row[mapping['high']]),
+                low=float(row[mapping['low']]),
+                close=float(row[mapping['close']]),
+                volume=float(row[mapping['volume']]),
+                closed=open_time + interval_ms <= now_ms
+            ))
+        self.stats['rows_parsed'] += len(rows)
+        candles.sort(key=lambda c: c.time)
+        return candles
+
+    async def fetch(self, exchange_id: str, symbol: str = SYMBOL) -> Optional[Candle]:
+        """增量更新並回傳最新K線"""
+        url, params = self.build_request(exchange_id, symbol)
+        if self.limiter:
+            await self.limiter.acquire(exchange_id, url)
+        response = await self.transport.get(url, params, API_TIMEOUT)
+        if self.limiter:
+            self.limiter.observe(exchange_id, response.status, response.headers)
+        response.raise_for_status(url)
+        body = response.body
+        data = json.loads(body)
+
+        self.stats['requests'] += 1
+        self.stats['bytes'] += len(body)
+
+        cache = self.get_cache(exchange_id, symbol)
+        cache.merge(self.parse_rows(exchange_id, _extract_rows(exchange_id, data)))
+        return cache.latest()
+
+    def history(self, exchange_id: str, symbol: str = SYMBOL, include_open: bool = True) -> List[Candle]:
+        """取得快取中的K線歷史（依時間排序）"""
+        cache = self.get_cache(exchange_id, symbol)
+        candles = list(cache.closed)
+        if include_open and cache.open_candle is not None:
+            candles.append(cache.open_candle)
+        return candles
+
+
+async def test_kline_fetcher():
+    """測試增量K線獲取"""
+    print("🧪 測試增量K線獲取器...")
+
+    async with aiohttp.ClientSession() as session:
+        fetcher = IncrementalKlineFetcher(session)
+        exchange_ids = [ex_id for ex_id in EXCHANGES if fetcher.supports(ex_id)]
+        for round_no in range(2):
+            results = await asyncio.gather(
+                *[fetcher.fetch(ex_id) for ex_id in exchange_ids], return_exceptions=True
+            )
+            print(f"\n  第 {round_no + 1} 輪（累計 {fetcher.stats['bytes']:,} bytes）")
+            for ex_id, result in zip(exchange_ids, results):
+                name = EXCHANGES[ex_id]['name']
+                if isinstance(result, Exception) or result is None:
+                    print(f"  ❌ {name}: {str(result)[:60]}")
+                else:
+                    cached = len(fetcher.get_cache(ex_id).closed)
+                    print(f"  ✅ {name}: ${result.close:.5f} {'🔴' if result.is_red else '🟢'} "
+                          f"(快取 {cached} 根)")
+
+if __name__ == "__main__":
+    asyncio.run(test_kline_fetcher())
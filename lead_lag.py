@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+跨交易所領先/落後分析
+把各交易所的掃描快照對齊到固定時間網格（LEADLAG_STEP 秒一格），在滑動視窗內保留：
+  - 報酬率序列：每格收盤價的對數報酬（該格無數據時沿用上一格價格，報酬為 0）
+  - 訂單流序列：每格的主動買賣失衡 (買 - 賣) / (買 + 賣)
+每 LEADLAG_RECOMPUTE_EVERY 格以 NumPy FFT 一次計算所有交易所的頻譜，兩兩相乘得到互相關，
+在 ±LEADLAG_MAX_LAG 格內找峰值：lag > 0 表示第一個交易所領先第二個交易所 lag 格
+各交易所的領先分數（-1 ~ 1）可作為警報權重：權重 = 1 + LEADLAG_ALERT_WEIGHT × 領先分數
+"""
+
+import math
+from dataclasses import dataclass
+from itertools import combinations
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import (
+    EXCHANGES, EXCHANGE_LIST,
+    LEADLAG_STEP, LEADLAG_WINDOW, LEADLAG_MAX_LAG, LEADLAG_RECOMPUTE_EVERY,
+    LEADLAG_MIN_SAMPLES, LEADLAG_MIN_CORR, LEADLAG_ALERT_WEIGHT
+)
+
+SERIES = ("return", "flow")
+
+
+def _name(exchange_id: str) -> str:
+    return EXCHANGES.get(exchange_id, {}).get('name', exchange_id)
+
+
+@dataclass
+class PairLag:
+    """兩個交易所之間的互相關峰值"""
+    leader: str
+    follower: str
+    lag: int  # 領先格數（0 = 同步）
+    corr: float  # 峰值相關係數
+    corr0: float  # 同步（lag 0）相關係數
+
+    @property
+    def lag_seconds(self) -> int:
+        return self.lag * LEADLAG_STEP
+
+    def to_dict(self) -> Dict:
+        return {"leader": _name(self.leader), "follower": _name(self.follower), "lag": self.lag,
+                "lag_sec": self.lag_seconds, "corr": round(self.corr, 3), "corr0": round(self.corr0, 3)}
+
+
+def cross_correlation(series: np.ndarray, max_lag: int) -> np.ndarray:
+    """所有序列兩兩之間的正規化互相關
+
+    series 形狀 (V, N)；回傳 (V, V, 2*max_lag+1)，[i, j, max_lag + k] = Σ x_i[t] · x_j[t+k] / (N σ_i σ_j)
+    每個序列只做一次 FFT（補零到 2N 避免循環重疊），各組合共用頻譜
+    """
+    count, length = series.shape
+    centered = series - series.mean(axis=1, keepdims=True)
+    scale = np.sqrt((centered ** 2).sum(axis=1))
+    size = 1 << int(math.ceil(math.log2(2 * length)))
+    spectra = np.fft.rfft(centered, n=size, axis=1)
+    # conj(X_i) · X_j 的反轉換在 k 的位置為 Σ x_i[t] x_j[t+k]
+    correlation = np.fft.irfft(np.conj(spectra)[:, None, :] * spectra[None, :, :], n=size, axis=2)
+    lags = np.concatenate([correlation[..., size - max_lag:], correlation[..., :max_lag + 1]], axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return lags / (scale[:, None, None] * scale[None, :, None])
+
+
+class LeadLagAnalyzer:
+    """各交易所對齊序列的滑動視窗與領先/落後估計"""
+
+    def __init__(self, exchanges: Optional[List[str]] = None, window: int = LEADLAG_WINDOW,
+                 max_lag: int = LEADLAG_MAX_LAG, step: float = LEADLAG_STEP,
+                 recompute_every: int = LEADLAG_RECOMPUTE_EVERY):
+        self.exchanges = list(exchanges or EXCHANGE_LIST)
+        self.window = window
+        self.max_lag = max_lag
+        self.step = step
+        self.recompute_every = recompute_every
+        count = len(self.exchanges)
+        # 環形緩衝（window + 1 格，多一格價格以計算報酬），_pos 為目前格的欄位
+        self._prices = np.full((count, window + 1), np.nan)
+        self._flows = np.zeros((count, window + 1))
+        self._pos = 0
+        self._filled = 0  # 已有數據的格數（上限 window + 1）
+        self._slot: Optional[int] = None
+        self._pending = 0  # 距上次計算新增的格數
+        self.pairs: Dict[str, List[PairLag]] = {name: [] for name in SERIES}
+        self.scores: Dict[str, float] = {}
+        self.stats = {"slots": 0, "recomputes": 0, "pairs": 0}
+
+    def _advance(self, slot: int):
+        """推進到新的時間格（中間缺少的格沿用上一格價格、訂單流為 0），每格 O(交易所數)"""
+        steps = 1 if self._slot is None else min(slot - self._slot, self.window + 1)
+        size = self.window + 1
+        for _ in range(steps):
+            following = (self._pos + 1) % size
+            self._prices[:, following] = self._prices[:, self._pos]
+            self._flows[:, following] = 0.0
+            self._pos = following
+        self._slot = slot
+        self._filled = min(self._filled + steps, size)
+        self._pending += steps
+        self.stats['slots'] += steps
+
+    def on_tick(self, kline_data: Dict[str, object], scan_time) -> bool:
+        """加入一次掃描結果，到了重新計算的時間時更新估計並回傳 True"""
+        slot = int(scan_time.timestamp() // self.step)
+        if self._slot is None or slot > self._slot:
+            self._advance(slot)
+        elif slot < self._slot:
+            return False  # 遲到的部分結果，該格已過
+
+        for exchange_id, kline in kline_data.items():
+            if exchange_id not in self.exchanges or kline.close <= 0:
+                continue
+            row = self.exchanges.index(exchange_id)
+            self._prices[row, self._pos] = kline.close
+            flow = kline.buy_volume + kline.sell_volume
+            if flow > 0:
+                self._flows[row, self._pos] = (kline.buy_volume - kline.sell_volume) / flow
+
+        if self._pending < self.recompute_every or self._filled - 1 < LEADLAG_MIN_SAMPLES:
+            return False
+        self._pending = 0
+        self.recompute()
+        return True
+
+    def _series(self) -> Dict[str, np.ndarray]:
+        """依時間排序的最近 (已填格數 - 1) 格報酬率與訂單流"""
+        shift = -(self._pos + 1)
+        length = self._filled - 1
+        prices = np.roll(self._prices, shift, axis=1)[:, -(length + 1):]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns = np.diff(np.log(prices), axis=1)
+        return {"return": returns, "flow": np.roll(self._flows, shift, axis=1)[:, -length:]}
+
+    def recompute(self):
+        """重新計算所有組合的互相關峰值與各交易所領先分數"""
+        totals = {exchange_id: [] for exchange_id in self.exchanges}
+        for name, series in self._series().items():
+            # 有效格數不足或沒有變化的交易所不參與，其餘缺值視為無變化
+            finite = np.isfinite(series)
+            series = np.where(finite, series, 0.0)
+            usable = [i for i in range(len(self.exchanges))
+                      if finite[i].sum() >= LEADLAG_MIN_SAMPLES and series[i].std() > 0]
+            pairs = []
+            if len(usable) >= 2:
+                correlation = cross_correlation(series[usable], self.max_lag)
+                for a, b in combinations(range(len(usable)), 2):
+                    curve = correlation[a, b]
+                    peak = int(np.nanargmax(np.abs(curve)))
+                    lag = peak - self.max_lag
+                    first, second = self.exchanges[usable[a]], self.exchanges[usable[b]]
+                    pair = PairLag(first, second, lag, float(curve[peak]), float(curve[self.max_lag]))
+                    if lag < 0:
+                        pair = PairLag(second, first, -lag, pair.corr, pair.corr0)
+                    pairs.append(pair)
+                    if name == "return" and pair.lag > 0 and abs(pair.corr) >= LEADLAG_MIN_CORR:
+                        totals[pair.leader].append(abs(pair.corr))
+                        totals[pair.follower].append(-abs(pair.corr))
+            self.pairs[name] = sorted(pairs, key=lambda p: -abs(p.corr))
+
+        others = max(len(self.exchanges) - 1, 1)
+        self.scores = {exchange_id: sum(values) / others for exchange_id, values in totals.items()}
+        self.stats['recomputes'] += 1
+        self.stats['pairs'] = len(self.pairs["return"])
+
+    def lead_score(self, exchange_id: str) -> float:
+        """-1（總是落後）~ 1（總是領先）；尚未計算時為 0"""
+        return self.scores.get(exchange_id, 0.0)
+
+    def weight(self, exchange_id: str) -> float:
+        """警報權重：領先的交易所大於 1，落後的小於 1"""
+        return 1.0 + LEADLAG_ALERT_WEIGHT * self.lead_score(exchange_id)
+
+    def summary(self, top: int = 3) -> Dict:
+        """STATUS 報告用：領先分數排名與相關性最強的幾組"""
+        ranking = sorted(self.scores.items(), key=lambda item: -item[1])
+        return {
+            "window_sec": max(self._filled - 1, 0) * self.step,
+            "leaders": [{"exchange": _name(ex_id), "score": round(score, 3)} for ex_id, score in ranking],
+            "pairs": {name: [pair.to_dict() for pair in pairs[:top]] for name, pairs in self.pairs.items()},
+        }
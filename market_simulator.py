@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+可重現的模擬市場數據
+產生大量交易對 × 所有交易所的成交頁面（各交易所原生格式），用於壓力測試警報引擎：
+  - 各交易對活躍度差異大（成交率呈對數常態），各交易所分得不同比例的成交
+  - 市場狀態在 正常 / 爆量 / 冷清 之間切換（馬可夫鏈）
+  - 單筆成交量為對數常態分佈，買賣方向依該交易對的訂單流偏向而定
+  - 基準訂單流依 BUY_SELL_THRESHOLD 校準：無異常時最近20筆的買賣比超過門檻的機率約為 BASELINE_EXCEEDANCE
+  - 成交頁與真實端點一樣包含先前已回傳過的最近成交（至少 RECENT_TRADES 筆）
+  - 依機率注入異常事件並記錄真實答案，用於計算偵測召回率：
+      BUY_IN_RED     價格下跌中大量主動買入
+      SELL_IN_GREEN  價格上漲中大量主動賣出
+      LARGE_TRADE    一筆遠大於平常的成交
+相同 seed 產生完全相同的數據
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import EXCHANGE_LIST, TRADE_FIELD_MAPPING, CHECK_INTERVAL, BUY_SELL_THRESHOLD
+
+# 市場狀態：成交率倍數與轉移機率（每輪）
+REGIMES = {
+    "normal": {"rate": 1.0, "next": {"burst": 0.02, "quiet": 0.03}},
+    "burst": {"rate": 6.0, "next": {"normal": 0.25}},
+    "quiet": {"rate": 0.1, "next": {"normal": 0.1}},
+}
+ANOMALY_TYPES = ("BUY_IN_RED", "SELL_IN_GREEN", "LARGE_TRADE")
+PAGE_LIMIT = 100  # 與掃描器請求的成交頁大小相同
+RECENT_TRADES = 50  # 成交頁至少包含的最近成交筆數（掃描器的買賣比視窗最多50筆）
+BASELINE_WINDOW = 20  # 校準用的買賣比視窗筆數（掃描器多數交易所的視窗）
+BASELINE_EXCEEDANCE = 0.01  # 無異常時視窗買賣比超過 BUY_SELL_THRESHOLD 的目標機率（單邊）
+
+
+@dataclass
+class AnomalyEvent:
+    """注入的異常事件（真實答案）"""
+    tick: int
+    symbol: str
+    exchange_id: str
+    kind: str
+
+
+@dataclass
+class SyntheticTick:
+    """一輪模擬數據：{(交易對, 交易所): 原生格式成交頁}，Coinbase 等無成交頁的交易所為報價"""
+    tick: int
+    time_ms: int
+    pages: Dict[Tuple[str, str], list]
+    prices: Dict[Tuple[str, str], float]
+    anomalies: List[AnomalyEvent]
+    trades: int  # 各成交頁的總筆數（含先前已回傳過的成交）
+    new_trades: int  # 本輪新成交筆數
+
+
+def _format_trade(exchange_id: str, symbol: str, price: float, qty: float, is_buy: bool,
+                  ts: int, trade_id: int):
+    """單筆成交轉為交易所原生格式（與 bench_trade_parsing.make_page 相同）"""
+    price, qty = f"{price:.6g}", f"{qty:.4f}"
+    if exchange_id == "kraken":
+        return [price, qty, ts / 1000, "b" if is_buy else "s", "m", "", trade_id]
+    if exchange_id == "okx":
+        return {"instId": symbol, "tradeId": str(trade_id), "px": price, "sz": qty,
+                "side": "buy" if is_buy else "sell", "ts": str(ts)}
+    if exchange_id == "bybit":
+        return {"execId": str(trade_id), "symbol": symbol, "price": price, "size": qty,
+                "side": "Buy" if is_buy else "Sell", "time": str(ts)}
+    if exchange_id == "gateio":
+        return {"id": str(trade_id), "create_time_ms": f"{ts}.000", "side": "buy" if is_buy else "sell",
+                "amount": qty, "price": price}
+    return {"id": None, "price": price, "qty": qty, "quoteQty": "0",
+            "time": ts, "isBuyerMaker": not is_buy, "isBestMatch": True}
+
+
+def _split_sides(count: int, buy_probability: float, carry: float,
+                 rng: np.random.Generator) -> Tuple[np.ndarray, float]:
+    """分配 count 筆成交的買賣方向（True=主動買入），回傳 (方向, 新的累積誤差)
+
+    買入筆數以累積誤差取整、順序隨機：逐筆擲硬幣時20筆視窗的買賣筆數本身就常讓買賣比超過門檻，
+    累積誤差讓任意一段連續成交的買入筆數都接近期望值，買賣比的分散只來自成交量
+    """
+    target = carry + count * buy_probability
+    buys = int(target)
+    sides = np.zeros(count, dtype=bool)
+    sides[:buys] = True
+    rng.shuffle(sides)
+    return sides, target - buys
+
+
+def calibrate_size_sigma(threshold: Optional[float] = None, window: int = BASELINE_WINDOW,
+                         target: float = BASELINE_EXCEEDANCE, seed: int = 0, trades: int = 200_000) -> float:
+    """單筆成交量的對數標準差，使基準訂單流（買賣各半）的視窗買賣比超過門檻的機率約為 target
+
+    以與成交頁相同的方向分配模擬一段長成交流，對分散度二分搜尋（各次共用同一組亂數）
+    """
+    threshold = BUY_SELL_THRESHOLD if threshold is None else threshold
+    rng = np.random.default_rng(seed)
+    pages, carry, total = [], 0.0, 0
+    while total < trades + window:
+        sides, carry = _split_sides(int(rng.poisson(4)), 0.5, carry, rng)
+        pages.append(sides)
+        total += len(sides)
+    is_buy = np.concatenate(pages)
+    noise = rng.standard_normal(len(is_buy))
+    kernel = np.ones(window)
+
+    def exceedance(sigma: float) -> float:
+        qty = np.exp(sigma * noise)
+        buy = np.convolve(qty * is_buy, kernel, "valid")
+        sell = np.convolve(qty * ~is_buy, kernel, "valid")
+        return float(np.mean(buy > threshold * sell))
+
+    low, high = 0.0, 3.0
+    for _ in range(25):
+        middle = (low + high) / 2
+        if exceedance(middle) > target:
+            high = middle
+        else:
+            low = middle
+    return low
+
+
+class SyntheticMarket:
+    """多交易對、多交易所的成交流產生器"""
+
+    def __init__(self, symbols: int = 1000, exchanges: Optional[List[str]] = None, seed: int = 0,
+                 interval: float = CHECK_INTERVAL, anomaly_rate: float = 0.002,
+                 start_ms: int = 1_700_000_000_000):
+        self.rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.exchanges = list(exchanges or EXCHANGE_LIST)
+        self.trade_venues = [ex_id for ex_id in self.exchanges if ex_id in TRADE_FIELD_MAPPING]
+        self.symbols = [f"SYN{i:04d}USDT" for i in range(symbols)]
+        self.interval = interval
+        self.anomaly_rate = anomaly_rate
+        self.time_ms = start_ms
+        self.tick = 0
+        self._trade_id = 0
+
+        count = len(self.symbols)
+        self.price = np.exp(self.rng.normal(0, 2, count))  # 價格跨數個數量級
+        self.volatility = self.rng.uniform(0.0005, 0.003, count)  # 每輪報酬標準差
+        self.rate = np.exp(self.rng.normal(0, 1.2, count))  # 每秒成交數（中位數約 1 筆）
+        self.size_scale = 1000 / self.price  # 單筆成交額中位數約 1,000 USDT
+        self.size_sigma = calibrate_size_sigma(seed=seed)  # 單筆成交量的對數標準差
+        self.buy_bias = self.rng.normal(0, 0.03, count)  # 訂單流偏向
+        self.regime = np.array(["normal"] * count, dtype=object)
+        share = self.rng.dirichlet(np.ones(len(self.trade_venues)) * 2, count) if self.trade_venues else None
+        self.venue_share = share  # 各交易所分得的成交比例
+        self._venue_index = {ex_id: i for i, ex_id in enumerate(self.trade_venues)}
+        self._carry: Dict[Tuple[str, str], float] = {}  # 各串流買入筆數的累積誤差
+        self._recent: Dict[Tuple[str, str], Deque] = {}  # 各串流最近的成交（原生格式，由舊到新）
+
+    def baseline_notional(self, index: int, count: int) -> np.ndarray:
+        """第 index 個交易對無異常時的單筆成交額樣本（不影響成交流的亂數）"""
+        rng = np.random.default_rng([self.seed, index])
+        return self.price[index] * self.size_scale[index] * np.exp(rng.normal(0, self.size_sigma, count))
+
+    def _step_regimes(self):
+        for name, spec in REGIMES.items():
+            members = np.flatnonzero(self.regime == name)
+            if not len(members):
+                continue
+            draws = self.rng.random(len(members))
+            threshold = 0.0
+            for target, probability in spec["next"].items():
+                moved = (draws >= threshold) & (draws < threshold + probability)
+                self.regime[members[moved]] = target
+                threshold += probability
+
+    def _page(self, exchange_id: str, symbol: str, index: int, start: float, end: float,
+              count: int, kind: Optional[str]) -> list:
+        """一個交易所本輪的新成交（原生格式，時間由舊到新）"""
+        span_ms = self.interval * 1000
+        times = np.sort(self.rng.uniform(0, span_ms, count)).astype(np.int64) + self.time_ms - int(span_ms)
+        path = np.linspace(start, end, count) * np.exp(self.rng.normal(0, self.volatility[index] / 4, count))
+        qty = self.size_scale[index] * np.exp(self.rng.normal(0, self.size_sigma, count))
+        if kind in ("BUY_IN_RED", "SELL_IN_GREEN"):
+            sides, _ = _split_sides(count, 0.9 if kind == "BUY_IN_RED" else 0.1, 0.5, self.rng)
+        else:
+            key = (symbol, exchange_id)
+            sides, self._carry[key] = _split_sides(count, 0.5 + self.buy_bias[index],
+                                                   self._carry.get(key, self.rng.random()), self.rng)
+        if kind == "LARGE_TRADE":
+            qty[-1] = self.size_scale[index] * 500  # 約為平常成交額中位數的 500 倍
+        if kind in ("BUY_IN_RED", "SELL_IN_GREEN"):
+            path = np.linspace(start, end, count)  # 明確的單邊走勢，確保K線顏色
+
+        page = []
+        for price, size, is_buy, ts in zip(path, qty, sides, times):
+            self._trade_id += 1
+            page.append(_format_trade(exchange_id, symbol, float(price), float(size), bool(is_buy),
+                                      int(ts), self._trade_id))
+        return page
+
+    def next_tick(self) -> SyntheticTick:
+        """推進一輪（interval 秒）並產生各交易所的成交頁（本輪新成交加上先前的最近成交）"""
+        self.tick += 1
+        self.time_ms += int(self.interval * 1000)
+        self._step_regimes()
+        multiplier = np.array([REGIMES[name]["rate"] for name in self.regime])
+        start = self.price.copy()
+        self.price = self.price * np.exp(self.rng.normal(0, self.volatility))
+
+        injected = self.rng.random(len(self.symbols)) < self.anomaly_rate
+        pages, prices, anomalies, trades, new_trades = {}, {}, [], 0, 0
+        for index, symbol in enumerate(self.symbols):
+            kind = None
+            venue = None
+            if injected[index] and self.trade_venues:
+                kind = ANOMALY_TYPES[self.rng.integers(len(ANOMALY_TYPES))]
+                venue = self.trade_venues[self.rng.integers(len(self.trade_venues))]
+                anomalies.append(AnomalyEvent(self.tick, symbol, venue, kind))
+
+            expected = self.rate[index] * multiplier[index] * self.interval
+            for exchange_id in self.exchanges:
+                if exchange_id not in TRADE_FIELD_MAPPING:
+                    prices[(symbol, exchange_id)] = float(self.price[index])  # 只有報價
+                    continue
+                venue_kind = kind if exchange_id == venue else None
+                end = float(self.price[index])
+                count = self.rng.poisson(expected * self.venue_share[index, self._venue_index[exchange_id]])
+                if venue_kind in ("BUY_IN_RED", "SELL_IN_GREEN"):
+                    count = max(count, 30) * 3
+                    drift = 0.995 if venue_kind == "BUY_IN_RED" else 1.005
+                    end = float(start[index]) * drift
+                elif venue_kind == "LARGE_TRADE":
+                    count = max(count, 5)
+                count = min(count, PAGE_LIMIT)
+                key = (symbol, exchange_id)
+                recent = self._recent.setdefault(key, deque(maxlen=RECENT_TRADES))
+                fresh = self._page(exchange_id, symbol, index, float(start[index]), end, count,
+                                   venue_kind) if count else []
+                page = (list(recent) + fresh)[-max(count, RECENT_TRADES):]
+                recent.extend(fresh)
+                if not page:
+                    continue
+                if TRADE_FIELD_MAPPING[exchange_id]['newest_first']:
+                    page.reverse()
+                pages[key] = page
+                trades += len(page)
+                new_trades += count
+        return SyntheticTick(self.tick, self.time_ms, pages, prices, anomalies, trades, new_trades)
@@ -6,17 +6,30 @@
 """
 
 import asyncio
+import logging
 import aiohttp
 import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Deque, Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 
 from config import (
     EXCHANGES, EXCHANGE_LIST, 
-    SYMBOL, TIMEFRAME, API_TIMEOUT,
+    SYMBOL, TIMEFRAME, API_TIMEOUT, PAYLOAD_CACHE_ENABLED, TRADE_SKETCH_ENABLED,
     get_taiwan_time, format_taiwan_time
 )
+from kline_fetcher import IncrementalKlineFetcher, Candle
+from endpoint_prober import EndpointTable, EndpointProber
+from trade_normalizer import TradeSummary, minute_flow, summarize_trades, normalize_page
+from trade_sketch import TradeSizeStore, WhaleFlow
+from request_coalescer import SingleFlight, shared_flight
+from rate_limiter import RateLimiter, shared_limiter, PRIORITY_NORMAL
+from http_cassette import HttpTransport
+from payload_cache import PayloadCache
+from scan_profiler import profiler
+from radar_logging import get_logger, exchange_logger
+
+logger = get_logger("scanner")
 
 @dataclass
 class EnhancedKlineData:
@@ -30,6 +43,15 @@ class EnhancedKlineData:
     volume: float
     buy_volume: float = 0.0  # 主動買入量
     sell_volume: float = 0.0  # 主動賣出量
+    book_imbalance: Optional[float] = None  # 前N檔盤口失衡（-1 ~ 1）
+    vwap: Optional[float] = None  # 近期成交量加權均價
+    whale_buy_volume: float = 0.0  # 大戶（成交額 ≥ WHALE_QUANTILE 分位）主動買入量
+    whale_sell_volume: float = 0.0  # 大戶主動賣出量
+    large_trade: Optional[Dict[str, Any]] = None  # 本次新成交中的大額成交（見 trade_sketch）
+    bid: Optional[float] = None  # 最優買價（行情或訂單簿提供時）
+    ask: Optional[float] = None  # 最優賣價
+    minute_flow: Optional[Dict[int, Tuple[float, float]]] = None  # 本次新成交依分鐘彙總的 (主動買入量, 主動賣出量)
+    last_trade_time: Optional[int] = None  # 已解析的最新成交時間（毫秒），供彙總K線去重
     is_red: bool = False
     is_green: bool = False
     fetch_time: datetime = None
@@ -52,6 +74,15 @@ class EnhancedKlineData:
             return 99.0  # 只有賣出
         return 1.0
     
+    @property
+    def whale_ratio(self) -> Optional[float]:
+        """大戶買賣比（無大戶成交時為 None）"""
+        if self.whale_sell_volume > 0:
+            return self.whale_buy_volume / self.whale_sell_volume
+        elif self.whale_buy_volume > 0:
+            return 99.0
+        return None
+    
     def __post_init__(self):
         """初始化後計算K線顏色"""
         self.is_red = self.close < self.open
@@ -59,298 +90,423 @@ class EnhancedKlineData:
         if self.fetch_time is None:
             self.fetch_time = get_taiwan_time()
 
+def _quote(ticker: Dict[str, Any], bid_key: str, ask_key: str):
+    """從行情取出最優買賣價（欄位缺少或為空時為 None）"""
+    def value(key):
+        try:
+            price = float(ticker.get(key) or 0)
+        except (TypeError, ValueError):
+            return None
+        return price if price > 0 else None
+    return value(bid_key), value(ask_key)
+
+def _trade_flow(summary: Optional[TradeSummary]):
+    """取出主動買入量、主動賣出量與 VWAP（無成交時為 0, 0, None）"""
+    if summary is None:
+        return 0.0, 0.0, None
+    return summary.buy_volume, summary.sell_volume, summary.vwap
+
+# 計算買賣比的最近成交筆數（未列出的交易所為 20 筆）
+TRADE_WINDOWS = {"kraken": 50}
+
+def summarize_page(exchange_id: str, trades, trade_sizes: Optional[TradeSizeStore] = None,
+                   symbol: str = SYMBOL) -> Tuple[Any, Optional[TradeSummary], Optional[WhaleFlow]]:
+    """解析一頁成交並彙總最近 TRADE_WINDOWS 筆（買賣比視窗），回傳 (整頁成交, 視窗彙總, 大戶買賣量)
+
+    有 trade_sizes 時以整頁新成交更新成交額草圖並判斷大戶與大額成交（掃描器與 bench_alert_engine 共用）
+    小成交頁逐筆解析為 list（TradeRows），大成交頁才建立 NumPy 陣列
+    """
+    page = normalize_page(exchange_id, trades)
+    window = page.tail(TRADE_WINDOWS.get(exchange_id, 20))
+    whale_flow = trade_sizes.ingest(symbol, exchange_id, page, window) if trade_sizes is not None else None
+    return page, summarize_trades(window), whale_flow
+
 class EnhancedExchangeScanner:
     """增強版交易所掃描器（包含買賣數據）"""
     
-    def __init__(self):
+    def __init__(self, order_books=None, probe_endpoints: bool = False, publisher=None,
+                 coalescer: Optional[SingleFlight] = None, limiter: Optional[RateLimiter] = None,
+                 transport: Optional[HttpTransport] = None, payloads: Optional[PayloadCache] = None,
+                 trade_sizes: Optional[TradeSizeStore] = None, scheduler=None):
         self.session = None
+        self.transport = transport or HttpTransport()  # 可換成錄製/重播傳輸層
+        self.coalescer = coalescer or shared_flight  # 預設與同程序其他掃描器共用
+        self.limiter = limiter or shared_limiter
+        self.payloads = payloads or PayloadCache(PAYLOAD_CACHE_ENABLED)  # 未變更的回應跳過解析
+        # 單筆成交額分位數草圖（大戶買賣量與大額成交）
+        self.trade_sizes = trade_sizes or (TradeSizeStore.load() if TRADE_SKETCH_ENABLED else None)
+        self._whale_flow: Optional[WhaleFlow] = None
+        self._minute_flow: Optional[Dict[int, Tuple[float, float]]] = None
+        self.trade_watermark: Dict[str, int] = {}  # 各交易所已累計分鐘買賣量的最新成交時間（毫秒）
+        self.scheduler = scheduler  # 可選 AdaptiveScheduler，依成交到達率調整各交易所輪詢間隔
+        self.order_books = order_books  # 可選 OrderBookManager，提供盤口失衡
+        self.publisher = publisher  # 可選 SnapshotPublisher，發布到共享記憶體
+        self.kline_fetcher = None
+        self.endpoints = EndpointTable.load()  # 啟動時讀取上次的端點排名
+        self.probe_endpoints = probe_endpoints
+        self._probe_task = None
         
     async def __aenter__(self):
         self.session = aiohttp.ClientSession(
             timeout=aiohttp.ClientTimeout(total=API_TIMEOUT)
         )
+        self.transport.attach(self.session)
+        self.kline_fetcher = IncrementalKlineFetcher(self.session, TIMEFRAME, endpoints=self.endpoints,
+                                                     limiter=self.limiter, transport=self.transport)
+        if self.probe_endpoints:
+            self._probe_task = asyncio.create_task(EndpointProber().run_forever(self.endpoints))
+        if self.order_books is not None and self.order_books.session is None:
+            # 訂單簿與掃描器共用連線池與速率限制（快照請求以最高優先排隊）
+            self.order_books.session = self.session
+            self.order_books.limiter = self.order_books.limiter or self.limiter
+            self.order_books.start()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._probe_task:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+        if self.order_books is not None:
+            await self.order_books.stop()
+        self.transport.close()
         if self.session:
             await self.session.close()
     
-    async def fetch_single_exchange(self, exchange_id: str) -> Optional[EnhancedKlineData]:
-        """獲取單一交易所的最新K線數據（包含買賣數據）"""
-        exchange_config = EXCHANGES[exchange_id]
-        exchange_name = exchange_config['name']
+    async def _get_json(self, exchange_id: str, url: str, params: Optional[Dict] = None,
+                        timeout: float = API_TIMEOUT, priority: int = PRIORITY_NORMAL) -> Any:
+        """GET 並解析 JSON（相同請求在同一時間只發出一次，結果短暫快取；實際發出的請求受速率限制）"""
+        key = SingleFlight.make_key(url, params)
         
-        try:
-            # 根據不同交易所使用不同的API
-            if exchange_id == "coinbase":
-                # Coinbase - 使用Ticker和交易紀錄
-                # 先獲取價格
-                ticker_url = f"{exchange_config['api_base']}/v2/prices/DUSK-USD/spot"
-                async with self.session.get(ticker_url, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        price = float(data['data']['amount'])
-                        
-                        # Coinbase可能不提供實時買賣數據
-                        return EnhancedKlineData(
-                            exchange=exchange_name,
-                            symbol=SYMBOL,
-                            open=price,
-                            high=price,
-                            low=price,
-                            close=price,
-                            volume=0,
-                            buy_volume=0,
-                            sell_volume=0
-                        )
+        async def fetch():
+            with profiler.phase("queue", exchange_id):
+                await self.limiter.acquire(exchange_id, url, priority)
+            with profiler.phase("network", exchange_id):
+                response = await self.transport.get(url, params, timeout,
+                                                    self.payloads.conditional_headers(exchange_id, key))
+            self.limiter.observe(exchange_id, response.status, response.headers)
+            response.raise_for_status(url)
+            with profiler.phase("json", exchange_id):
+                return self.payloads.decode(exchange_id, key, response)
+        
+        return await self.coalescer.do(key, fetch)
+    
+    def _summarize(self, exchange_id: str, trades) -> Optional[TradeSummary]:
+        with profiler.phase("trades", exchange_id):
+            # 整頁累計新成交的分鐘買賣量、更新成交額草圖與成交到達率，買賣比仍只看最近幾筆
+            page, summary, self._whale_flow = summarize_page(exchange_id, trades, self.trade_sizes)
+            if len(page):
+                watermark = self.trade_watermark.get(exchange_id)
+                self._minute_flow = minute_flow(page, watermark)
+                self.trade_watermark[exchange_id] = max(page.newest(), watermark or 0)
+            if self.scheduler is not None:
+                self.scheduler.observe_trades(exchange_id, page)
+            return summary
+    
+    async def _timed_fetch(self, exchange_id: str) -> Optional[EnhancedKlineData]:
+        with profiler.phase("fetch", exchange_id):
+            return await self.fetch_single_exchange(exchange_id)
+    
+    async def fetch_raw(self, exchange_id: str) -> Dict[str, Any]:
+        """只發出請求，回傳各端點的原始 JSON（ticker / trades）；交易對代碼取自 EXCHANGES 的 symbol_mapping"""
+        api_base = self.endpoints.best(exchange_id)
+        venue_symbol = EXCHANGES[exchange_id]['symbol_mapping'][SYMBOL]
+        
+        # 根據不同交易所使用不同的API
+        if exchange_id == "coinbase":
+            # Coinbase - 使用Ticker（不提供實時買賣數據）
+            return {"ticker": await self._get_json(exchange_id, f"{api_base}/v2/prices/{venue_symbol}/spot")}
+        
+        elif exchange_id == "kraken":
+            # Kraken - 使用Trades API獲取買賣數據（最近100筆）
+            params = {"pair": venue_symbol, "count": 100}
+            return {"trades": await self._get_json(exchange_id, f"{api_base}/0/public/Trades", params, timeout=15)}
+        
+        elif exchange_id == "okx":
+            # OKX - 使用Tickers和Trades
+            params = {"instId": venue_symbol}
+            paths = ("/api/v5/market/ticker", "/api/v5/market/trades")
+        
+        elif exchange_id == "bybit":
+            # Bybit - 使用Ticker和Recent Trades
+            params = {"category": "spot", "symbol": venue_symbol}
+            paths = ("/v5/market/tickers", "/v5/market/recent-trade")
+        
+        elif exchange_id == "gateio":
+            # Gate.io - 使用Ticker和Trades
+            params = {"currency_pair": venue_symbol}
+            paths = ("/api/v4/spot/tickers", "/api/v4/spot/trades")
+        
+        elif exchange_id == "mexc":
+            # MEXC - 使用Ticker和Recent Trades
+            params = {"symbol": venue_symbol}
+            paths = ("/api/v3/ticker/24hr", "/api/v3/trades")
+        
+        else:
+            return {}
+        
+        ticker, trades = await asyncio.gather(
+            *(self._get_json(exchange_id, f"{api_base}{path}", params) for path in paths)
+        )
+        return {"ticker": ticker, "trades": trades}
+    
+    def normalize(self, exchange_id: str, raw: Dict[str, Any]) -> Optional[EnhancedKlineData]:
+        """把原始 JSON 轉為 EnhancedKlineData（不發出請求；各端點回應都未變更時沿用上次結果）"""
+        kline = self.payloads.normalize(exchange_id, raw, self._parse_with_whales)
+        if self.scheduler is not None:
+            # 回應未變更時沒有新成交，排程器視為冷清
+            self.scheduler.record_poll(exchange_id)
+        return kline
+    
+    def _parse_with_whales(self, exchange_id: str, raw: Dict[str, Any]) -> Optional[EnhancedKlineData]:
+        self._whale_flow = None
+        self._minute_flow = None
+        kline = self._parse(exchange_id, raw)
+        if kline is not None:
+            kline.minute_flow = self._minute_flow
+            kline.last_trade_time = self.trade_watermark.get(exchange_id)
+        if kline is not None and self._whale_flow is not None:
+            kline.whale_buy_volume = self._whale_flow.buy_volume
+            kline.whale_sell_volume = self._whale_flow.sell_volume
+            kline.large_trade = self._whale_flow.large_trade
+        return kline
+    
+    def _parse(self, exchange_id: str, raw: Dict[str, Any]) -> Optional[EnhancedKlineData]:
+        exchange_name = EXCHANGES[exchange_id]['name']
+        
+        if exchange_id == "coinbase":
+            price = float(raw['ticker']['data']['amount'])
             
-            elif exchange_id == "kraken":
-                # Kraken - 使用Trades API獲取買賣數據
-                pair = "DUSKUSD"
-                url = f"{exchange_config['api_base']}/0/public/Trades"
-                params = {"pair": pair, "count": 100}  # 獲取最近100筆交易
-                
-                async with self.session.get(url, params=params, timeout=15) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        trades = data['result'][pair]
-                        
-                        # 分析最近交易
-                        buy_volume = 0.0
-                        sell_volume = 0.0
-                        total_volume = 0.0
-                        prices = []
-                        
-                        for trade in trades[-50:]:  # 分析最近50筆
-                            price = float(trade[0])
-                            volume = float(trade[1])
-                            side = trade[3]  # 'b' = buy, 's' = sell
-                            
-                            prices.append(price)
-                            total_volume += volume
-                            
-                            if side == 'b':
-                                buy_volume += volume
-                            elif side == 's':
-                                sell_volume += volume
-                        
-                        if prices:
-                            current_price = prices[-1]
-                            min_price = min(prices)
-                            max_price = max(prices)
-                            
-                            return EnhancedKlineData(
-                                exchange=exchange_name,
-                                symbol=SYMBOL,
-                                open=prices[0],
-                                high=max_price,
-                                low=min_price,
-                                close=current_price,
-                                volume=total_volume,
-                                buy_volume=buy_volume,
-                                sell_volume=sell_volume
-                            )
+            return EnhancedKlineData(
+                exchange=exchange_name,
+                symbol=SYMBOL,
+                open=price,
+                high=price,
+                low=price,
+                close=price,
+                volume=0,
+                buy_volume=0,
+                sell_volume=0
+            )
+        
+        elif exchange_id == "kraken":
+            # 分析最近50筆交易
+            pair = EXCHANGES['kraken']['symbol_mapping'][SYMBOL]
+            summary = self._summarize("kraken", raw['trades']['result'][pair])
             
-            elif exchange_id == "okx":
-                # OKX - 使用Tickers和Trades
-                # 獲取Ticker
-                ticker_url = f"{exchange_config['api_base']}/api/v5/market/ticker"
-                params = {"instId": "DUSK-USDT"}
-                
-                async with self.session.get(ticker_url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        ticker = data['data'][0]
-                        
-                        # 獲取最近交易
-                        trades_url = f"{exchange_config['api_base']}/api/v5/market/trades"
-                        async with self.session.get(trades_url, params=params, timeout=10) as resp2:
-                            trades_data = await resp2.json()
-                            
-                            # 分析交易方向
-                            buy_vol = 0.0
-                            sell_vol = 0.0
-                            
-                            if trades_data and 'data' in trades_data:
-                                for trade in trades_data['data'][-20:]:  # 最近20筆
-                                    side = trade['side']  # 'buy' or 'sell'
-                                    vol = float(trade['sz'])
-                                    
-                                    if side == 'buy':
-                                        buy_vol += vol
-                                    elif side == 'sell':
-                                        sell_vol += vol
-                            
-                            return EnhancedKlineData(
-                                exchange=exchange_name,
-                                symbol=SYMBOL,
-                                open=float(ticker['open24h']),
-                                high=float(ticker['high24h']),
-                                low=float(ticker['low24h']),
-                                close=float(ticker['last']),
-                                volume=float(ticker['vol24h']),
-                                buy_volume=buy_vol,
-                                sell_volume=sell_vol
-                            )
+            if summary:
+                return EnhancedKlineData(
+                    exchange=exchange_name,
+                    symbol=SYMBOL,
+                    open=summary.open,
+                    high=summary.high,
+                    low=summary.low,
+                    close=summary.close,
+                    volume=summary.volume,
+                    buy_volume=summary.buy_volume,
+                    sell_volume=summary.sell_volume,
+                    vwap=summary.vwap
+                )
+        
+        elif exchange_id == "okx":
+            ticker = raw['ticker']['data'][0]
             
-            elif exchange_id == "bybit":
-                # Bybit - 使用Ticker和Recent Trades
-                ticker_url = f"{exchange_config['api_base']}/v5/market/tickers"
-                params = {"category": "spot", "symbol": "DUSKUSDT"}
-                
-                async with self.session.get(ticker_url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data['retCode'] == 0 and data['result']['list']:
-                            ticker = data['result']['list'][0]
-                            
-                            # 獲取最近交易
-                            trades_url = f"{exchange_config['api_base']}/v5/market/recent-trade"
-                            async with self.session.get(trades_url, params=params, timeout=10) as resp2:
-                                trades_data = await resp2.json()
-                                
-                                buy_vol = 0.0
-                                sell_vol = 0.0
-                                
-                                if trades_data['retCode'] == 0:
-                                    for trade in trades_data['result']['list'][-20:]:
-                                        side = trade['side']
-                                        vol = float(trade['size'])
-                                        
-                                        if side == 'Buy':
-                                            buy_vol += vol
-                                        elif side == 'Sell':
-                                            sell_vol += vol
-                                
-                                return EnhancedKlineData(
-                                    exchange=exchange_name,
-                                    symbol=SYMBOL,
-                                    open=float(ticker['openPrice']),
-                                    high=float(ticker['highPrice24h']),
-                                    low=float(ticker['lowPrice24h']),
-                                    close=float(ticker['lastPrice']),
-                                    volume=float(ticker['volume24h']),
-                                    buy_volume=buy_vol,
-                                    sell_volume=sell_vol
-                                )
+            # 分析最近20筆交易方向
+            trades = raw['trades'].get('data', []) if raw['trades'] else []
+            buy_vol, sell_vol, vwap = _trade_flow(self._summarize("okx", trades))
+            bid, ask = _quote(ticker, 'bidPx', 'askPx')
             
-            elif exchange_id == "gateio":
-                # Gate.io - 使用Ticker和Trades
-                ticker_url = f"{exchange_config['api_base']}/api/v4/spot/tickers"
-                params = {"currency_pair": "DUSK_USDT"}
+            return EnhancedKlineData(
+                exchange=exchange_name,
+                symbol=SYMBOL,
+                open=float(ticker['open24h']),
+                high=float(ticker['high24h']),
+                low=float(ticker['low24h']),
+                close=float(ticker['last']),
+                volume=float(ticker['vol24h']),
+                buy_volume=buy_vol,
+                sell_volume=sell_vol,
+                vwap=vwap,
+                bid=bid,
+                ask=ask
+            )
+        
+        elif exchange_id == "bybit":
+            data, trades_data = raw['ticker'], raw['trades']
+            if data['retCode'] == 0 and data['result']['list']:
+                ticker = data['result']['list'][0]
                 
-                async with self.session.get(ticker_url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        ticker = data[0]
-                        
-                        # 獲取最近交易
-                        trades_url = f"{exchange_config['api_base']}/api/v4/spot/trades"
-                        async with self.session.get(trades_url, params=params, timeout=10) as resp2:
-                            trades_data = await resp2.json()
-                            
-                            buy_vol = 0.0
-                            sell_vol = 0.0
-                            
-                            for trade in trades_data[-20:]:
-                                side = trade['side']  # 'buy' or 'sell'
-                                vol = float(trade['amount'])
-                                
-                                if side == 'buy':
-                                    buy_vol += vol
-                                elif side == 'sell':
-                                    sell_vol += vol
-                            
-                            return EnhancedKlineData(
-                                exchange=exchange_name,
-                                symbol=SYMBOL,
-                                open=float(ticker['open']),
-                                high=float(ticker['high_24h']),
-                                low=float(ticker['low_24h']),
-                                close=float(ticker['last']),
-                                volume=float(ticker['quote_volume']),
-                                buy_volume=buy_vol,
-                                sell_volume=sell_vol
-                            )
-            
-            elif exchange_id == "mexc":
-                # MEXC - 使用Ticker和Recent Trades
-                ticker_url = f"{exchange_config['api_base']}/api/v3/ticker/24hr"
-                params = {"symbol": "DUSKUSDT"}
+                trades = trades_data['result']['list'] if trades_data['retCode'] == 0 else []
+                buy_vol, sell_vol, vwap = _trade_flow(self._summarize("bybit", trades))
+                bid, ask = _quote(ticker, 'bid1Price', 'ask1Price')
                 
-                async with self.session.get(ticker_url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        # 獲取最近交易
-                        trades_url = f"{exchange_config['api_base']}/api/v3/trades"
-                        async with self.session.get(trades_url, params=params, timeout=10) as resp2:
-                            trades_data = await resp2.json()
-                            
-                            buy_vol = 0.0
-                            sell_vol = 0.0
-                            
-                            for trade in trades_data[-20:]:
-                                is_buyer_maker = trade['isBuyerMaker']
-                                vol = float(trade['qty'])
-                                
-                                if not is_buyer_maker:  # 買方主動
-                                    buy_vol += vol
-                                else:  # 賣方主動
-                                    sell_vol += vol
-                            
-                            return EnhancedKlineData(
-                                exchange=exchange_name,
-                                symbol=SYMBOL,
-                                open=float(data['openPrice']),
-                                high=float(data['highPrice']),
-                                low=float(data['lowPrice']),
-                                close=float(data['lastPrice']),
-                                volume=float(data['volume']),
-                                buy_volume=buy_vol,
-                                sell_volume=sell_vol
-                            )
+                return EnhancedKlineData(
+                    exchange=exchange_name,
+                    symbol=SYMBOL,
+                    open=float(ticker['openPrice']),
+                    high=float(ticker['highPrice24h']),
+                    low=float(ticker['lowPrice24h']),
+                    close=float(ticker['lastPrice']),
+                    volume=float(ticker['volume24h']),
+                    buy_volume=buy_vol,
+                    sell_volume=sell_vol,
+                    vwap=vwap,
+                    bid=bid,
+                    ask=ask
+                )
+        
+        elif exchange_id == "gateio":
+            ticker = raw['ticker'][0]
             
-            return None
+            buy_vol, sell_vol, vwap = _trade_flow(self._summarize("gateio", raw['trades']))
+            bid, ask = _quote(ticker, 'highest_bid', 'lowest_ask')
             
+            return EnhancedKlineData(
+                exchange=exchange_name,
+                symbol=SYMBOL,
+                open=float(ticker['open']),
+                high=float(ticker['high_24h']),
+                low=float(ticker['low_24h']),
+                close=float(ticker['last']),
+                volume=float(ticker['quote_volume']),
+                buy_volume=buy_vol,
+                sell_volume=sell_vol,
+                vwap=vwap,
+                bid=bid,
+                ask=ask
+            )
+        
+        elif exchange_id == "mexc":
+            data = raw['ticker']
+            
+            # isBuyerMaker=False 為買方主動
+            buy_vol, sell_vol, vwap = _trade_flow(self._summarize("mexc", raw['trades']))
+            bid, ask = _quote(data, 'bidPrice', 'askPrice')
+            
+            return EnhancedKlineData(
+                exchange=exchange_name,
+                symbol=SYMBOL,
+                open=float(data['openPrice']),
+                high=float(data['highPrice']),
+                low=float(data['lowPrice']),
+                close=float(data['lastPrice']),
+                volume=float(data['volume']),
+                buy_volume=buy_vol,
+                sell_volume=sell_vol,
+                vwap=vwap,
+                bid=bid,
+                ask=ask
+            )
+        
+        return None
+    
+    async def fetch_single_exchange(self, exchange_id: str) -> Optional[EnhancedKlineData]:
+        """獲取單一交易所的最新K線數據（包含買賣數據）"""
+        try:
+            return self.normalize(exchange_id, await self.fetch_raw(exchange_id))
         except Exception as e:
-            print(f"❌ {exchange_name} 請求失敗: {str(e)[:80]}")
+            self.log_fetch_error(exchange_id, e)
             return None
     
+    def log_fetch_error(self, exchange_id: str, error: Exception):
+        exchange_logger(exchange_id).error("❌ %s 請求失敗: %s", EXCHANGES[exchange_id]['name'], str(error)[:80],
+                                           extra={"exchange": exchange_id, "error": type(error).__name__})
+    
+    async def fetch_latest_candles(self, exchanges: Optional[List[str]] = None) -> Dict[str, Candle]:
+        """並發更新各交易所K線快取，回傳最新K線
+
+        已收盤K線走快取，每輪只請求最後一根已收盤K線之後的數據：
+        沒有新K線收盤時只取未收盤K線（1根），讓紅綠K判斷跟上本輪價格
+        """
+        exchange_ids = [ex_id for ex_id in exchanges or EXCHANGE_LIST if self.kline_fetcher.supports(ex_id)]
+        results = await asyncio.gather(*(self.kline_fetcher.fetch(ex_id) for ex_id in exchange_ids),
+                                       return_exceptions=True)
+        for exchange_id, result in zip(exchange_ids, results):
+            if isinstance(result, Exception):
+                exchange_logger(exchange_id).error(
+                    "❌ %s K線獲取失敗: %s", EXCHANGES[exchange_id]['name'], str(result)[:80],
+                    extra={"exchange": exchange_id, "error": type(result).__name__})
+        
+        candles = {}
+        for exchange_id in exchange_ids:
+            latest = self.kline_fetcher.get_cache(exchange_id).latest()
+            if latest is not None:
+                candles[exchange_id] = latest
+        return candles
+    
+    def closed_candles(self, exchanges: Optional[List[str]] = None) -> Dict[str, Deque[Candle]]:
+        """各交易所快取中的已收盤K線（依時間排序，直接引用快取不複製）"""
+        return {ex_id: self.kline_fetcher.get_cache(ex_id).closed
+                for ex_id in exchanges or EXCHANGE_LIST if self.kline_fetcher.supports(ex_id)}
+    
+    def begin_scan(self):
+        """標記新一輪掃描，回傳掃描時間（台灣時間）"""
+        taiwan_now = get_taiwan_time()
+        self.transport.mark_tick()
+        logger.info("\n🔄 掃描開始 (%s 台灣時間)\n%s", taiwan_now.strftime('%H:%M:%S'), "=" * 60)
+        return taiwan_now
+    
     async def scan_all_exchanges(self) -> Dict[str, EnhancedKlineData]:
         """並發掃描所有交易所"""
-        taiwan_now = get_taiwan_time()
-        print(f"\n🔄 掃描開始 ({taiwan_now.strftime('%H:%M:%S')} 台灣時間)")
-        print("=" * 60)
+        taiwan_now = self.begin_scan()
         
-        tasks = [self.fetch_single_exchange(ex_id) for ex_id in EXCHANGE_LIST]
+        tasks = [self._timed_fetch(ex_id) for ex_id in EXCHANGE_LIST]
         results = await asyncio.gather(*tasks, return_exceptions=True)
-        
+        return self.finish_scan(dict(zip(EXCHANGE_LIST, results)), taiwan_now)
+    
+    def finish_scan(self, results: Dict[str, Any], taiwan_now,
+                    exchanges: Optional[List[str]] = None) -> Dict[str, EnhancedKlineData]:
+        """彙整一輪掃描結果（K線 / None / 例外）：回報端點、附加盤口、輸出與發布快照
+
+        exchanges 為本輪輪詢的交易所（自適應輪詢時只有到期的交易所），預設全部
+        """
+        exchanges = exchanges or EXCHANGE_LIST
         kline_data = {}
         successful = 0
         
-        for i, result in enumerate(results):
-            exchange_id = EXCHANGE_LIST[i]
+        for exchange_id in exchanges:
+            result = results.get(exchange_id)
             exchange_name = EXCHANGES[exchange_id]['name']
             
             if isinstance(result, Exception):
-                print(f"❌ {exchange_name}: 錯誤 - {str(result)[:50]}")
+                exchange_logger(exchange_id).error("❌ %s: 錯誤 - %s", exchange_name, str(result)[:50],
+                                                   extra={"exchange": exchange_id, "error": type(result).__name__})
+                self.endpoints.report_failure(exchange_id)
             elif result is None:
-                print(f"❌ {exchange_name}: 無數據")
+                exchange_logger(exchange_id).warning("❌ %s: 無數據", exchange_name, extra={"exchange": exchange_id})
+                self.endpoints.report_failure(exchange_id)
             else:
                 kline_data[exchange_id] = result
                 successful += 1
+                self.endpoints.report_success(exchange_id)
                 
-                # 顯示買賣比率
-                ratio_info = ""
-                if result.buy_volume > 0 or result.sell_volume > 0:
-                    ratio_info = f" 買/賣: {result.buy_sell_ratio:.2f}"
+                if self.order_books is not None:
+                    result.book_imbalance = self.order_books.get_imbalance(exchange_id)
+                    bid, ask = self.order_books.get_quote(exchange_id)
+                    if bid is not None and ask is not None:
+                        result.bid, result.ask = bid, ask
                 
-                print(f"✅ {exchange_name}: ${result.close:.5f} "
-                      f"{'🔴' if result.is_red else '🟢'}{ratio_info}")
+                # 顯示買賣比率
+                ex_logger = exchange_logger(exchange_id)
+                if ex_logger.isEnabledFor(logging.INFO):
+                    ratio_info = ""
+                    if result.buy_volume > 0 or result.sell_volume > 0:
+                        ratio_info = f" 買/賣: {result.buy_sell_ratio:.2f}"
+                    if result.book_imbalance is not None:
+                        ratio_info += f" 盤口: {result.book_imbalance:+.2f}"
+                    
+                    ex_logger.info(
+                        "✅ %s: $%.5f %s%s", exchange_name, result.close,
+                        '🔴' if result.is_red else '🟢', ratio_info,
+                        extra={"exchange": exchange_id, "close": result.close,
+                               "buy_volume": result.buy_volume, "sell_volume": result.sell_volume,
+                               "book_imbalance": result.book_imbalance}
+                    )
+        
+        logger.info("📊 掃描完成: %d/%d 成功\n%s", successful, len(exchanges), "=" * 60,
+                    extra={"successful": successful, "total": len(exchanges)})
         
-        print(f"📊 掃描完成: {successful}/{len(EXCHANGES)} 成功")
-        print("=" * 60)
+        if self.publisher is not None:
+            self.publisher.publish(kline_data, taiwan_now.timestamp())
         
         return kline_data
 
@@ -0,0 +1,689 @@
+#!/usr/bin/env python3
+"""
+訂單簿模組 - Level-2 盤口維護與失衡指標
+REST快照 + WebSocket增量，本地以排序價格檔位維護
+並提供離線測試用的模擬盤口數據源
+"""
+
+import asyncio
+import json
+import random
+import zlib
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from config import (
+    EXCHANGES, EXCHANGE_LIST, SYMBOL, API_TIMEOUT,
+    ORDER_BOOK_CONFIG, ORDER_BOOK_DEPTH,
+    BOOK_IMBALANCE_LEVELS,
+    get_taiwan_time
+)
+from radar_logging import get_logger
+from rate_limiter import PRIORITY_HIGH
+
+logger = get_logger("order_book")
+
+# 增量事件的序號檢查結果
+SEQ_APPLY = "apply"
+SEQ_SKIP = "skip"
+SEQ_RESYNC = "resync"
+
+
+class BookResyncRequired(Exception):
+    """本地訂單簿與交易所不一致，需要重新同步"""
+
+
+@dataclass
+class BookEvent:
+    """標準化的盤口事件（快照或增量）"""
+    kind: str  # "snapshot" 或 "diff"
+    bids: List[Tuple[str, str]] = field(default_factory=list)
+    asks: List[Tuple[str, str]] = field(default_factory=list)
+    seq: Optional[int] = None  # 本事件最後一個更新序號
+    first_seq: Optional[int] = None  # 本事件第一個更新序號
+    checksum: Optional[int] = None
+
+
+class BookSide:
+    """單邊訂單簿：價格檔位以排序陣列維護，最優價在前
+
+    查找以二分搜尋完成，並增量維護前N檔的掛單量總和，
+    讓失衡指標不必每次重新加總。
+    新增 / 刪除檔位需搬移陣列（O(n)），但每次增量後都截斷到 ORDER_BOOK_DEPTH 檔，
+    n 有上限，連續記憶體搬移比純 Python 平衡樹的節點操作更快，因此不另用排序容器。
+    """
+
+    __slots__ = ("is_bid", "top_n", "top_qty", "_keys", "_levels")
+
+    def __init__(self, is_bid: bool, top_n: int):
+        self.is_bid = is_bid
+        self.top_n = top_n
+        self.top_qty = 0.0
+        self._keys: List[float] = []  # 買盤存負價格，使最優價永遠在索引0
+        self._levels: Dict[float, Tuple[str, str, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self):
+        self._keys.clear()
+        self._levels.clear()
+        self.top_qty = 0.0
+
+    def set_level(self, price_str: str, qty_str: str):
+        """更新單一價格檔位（數量為0代表刪除）"""
+        price = float(price_str)
+        qty = float(qty_str)
+        key = -price if self.is_bid else price
+        old = self._levels.get(key)
+
+        if qty <= 0:
+            if old is None:
+                return
+            idx = bisect_left(self._keys, key)
+            del self._keys[idx]
+            del self._levels[key]
+            if idx < self.top_n:
+                self.top_qty -= old[2]
+                # 第N+1檔遞補進前N檔
+                if len(self._keys) >= self.top_n:
+                    self.top_qty += self._levels[self._keys[self.top_n - 1]][2]
+            return
+
+        if old is not None:
+            self._levels[key] = (price_str, qty_str, qty)
+            if bisect_left(self._keys, key) < self.top_n:
+                self.top_qty += qty - old[2]
+            return
+
+        idx = bisect_left(self._keys, key)
+        self._keys.insert(idx, key)
+        self._levels[key] = (price_str, qty_str, qty)
+        if idx < self.top_n:
+            self.top_qty += qty
+            # 原第N檔被擠出前N檔
+            if len(self._keys) > self.top_n:
+                self.top_qty -= self._levels[self._keys[self.top_n]][2]
+
+    def truncate(self, depth: int):
+        """只保留最優的 depth 檔"""
+        while len(self._keys) > depth:
+            del self._levels[self._keys.pop()]
+
+    def recompute_top(self):
+        """重新加總前N檔（消除浮點累積誤差）"""
+        self.top_qty = sum(self._levels[k][2] for k in self._keys[:self.top_n])
+
+    def best(self) -> Optional[Tuple[float, float]]:
+        """最優價格與數量"""
+        if not self._keys:
+            return None
+        level = self._levels[self._keys[0]]
+        return float(level[0]), level[2]
+
+    def top(self, n: int) -> List[Tuple[str, str]]:
+        """前n檔（保留交易所原始字串，供校驗和使用）"""
+        return [self._levels[k][:2] for k in self._keys[:n]]
+
+
+class LocalOrderBook:
+    """本地訂單簿"""
+
+    def __init__(self, exchange_id: str, symbol: str = SYMBOL,
+                 depth: int = ORDER_BOOK_DEPTH, top_n: int = BOOK_IMBALANCE_LEVELS):
+        self.exchange_id = exchange_id
+        self.symbol = symbol
+        self.depth = depth
+        top_n = min(top_n, depth)
+        self.bids = BookSide(is_bid=True, top_n=top_n)
+        self.asks = BookSide(is_bid=False, top_n=top_n)
+        self.seq: Optional[int] = None
+        self.ready = False
+        self.update_count = 0
+        self.updated_at = None
+
+    def apply_snapshot(self, bids, asks, seq: Optional[int] = None):
+        """以快照重建訂單簿"""
+        self.bids.clear()
+        self.asks.clear()
+        for price, qty in bids:
+            self.bids.set_level(price, qty)
+        for price, qty in asks:
+            self.asks.set_level(price, qty)
+        self.bids.truncate(self.depth)
+        self.asks.truncate(self.depth)
+        self.bids.recompute_top()
+        self.asks.recompute_top()
+        self.seq = seq
+        self.ready = True
+        self.updated_at = get_taiwan_time()
+
+    def apply_diff(self, bids, asks, seq: Optional[int] = None):
+        """套用增量更新"""
+        for price, qty in bids:
+            self.bids.set_level(price, qty)
+        for price, qty in asks:
+            self.asks.set_level(price, qty)
+        self.bids.truncate(self.depth)
+        self.asks.truncate(self.depth)
+        if seq is not None:
+            self.seq = seq
+        self.update_count += 1
+        self.updated_at = get_taiwan_time()
+
+    @property
+    def best_bid(self) -> Optional[float]:
+        best = self.bids.best()
+        return best[0] if best else None
+
+    @property
+    def best_ask(self) -> Optional[float]:
+        best = self.asks.best()
+        return best[0] if best else None
+
+    @property
+    def mid_price(self) -> Optional[float]:
+        if self.best_bid is None or self.best_ask is None:
+            return None
+        return (self.best_bid + self.best_ask) / 2
+
+    @property
+    def spread(self) -> Optional[float]:
+        if self.best_bid is None or self.best_ask is None:
+            return None
+        return self.best_ask - self.best_bid
+
+    @property
+    def imbalance(self) -> Optional[float]:
+        """前N檔盤口失衡：(買量-賣量)/(買量+賣量)，範圍 -1 ~ 1"""
+        if not self.ready:
+            return None
+        bid_qty = max(self.bids.top_qty, 0.0)
+        ask_qty = max(self.asks.top_qty, 0.0)
+        total = bid_qty + ask_qty
+        if total <= 0:
+            return None
+        return (bid_qty - ask_qty) / total
+
+
+# ======================
+# 交易所協議適配器
+# ======================
+
+def _pairs(levels) -> List[Tuple[str, str]]:
+    """將 [[價格, 數量, ...], ...] 轉為 (價格字串, 數量字串)"""
+    return [(str(level[0]), str(level[1])) for level in levels]
+
+
+class BookFeedAdapter:
+    """交易所訂單簿協議適配器基類"""
+
+    exchange_id = ""
+    ws_snapshot = False  # WebSocket 訂閱後是否自帶快照
+    depth = ORDER_BOOK_DEPTH
+
+    def __init__(self, symbol: str = SYMBOL):
+        self.symbol = symbol
+        self.book_config = ORDER_BOOK_CONFIG[self.exchange_id]
+        self.venue_symbol = EXCHANGES[self.exchange_id]['symbol_mapping'][symbol]
+
+    @property
+    def ws_url(self) -> str:
+        return self.book_config['ws_url']
+
+    def snapshot_request(self, api_base: Optional[str] = None) -> Tuple[str, Dict]:
+        """REST 快照請求的 URL 與參數"""
+        base = self.book_config.get('rest_base') or api_base or EXCHANGES[self.exchange_id]['api_base']
+        path = self.book_config['rest_path'].format(symbol=self.venue_symbol)
+        return f"{base}{path}", self.snapshot_params()
+
+    def snapshot_params(self) -> Dict:
+        return {}
+
+    def parse_snapshot(self, data) -> BookEvent:
+        raise NotImplementedError
+
+    def subscribe_messages(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def parse_message(self, msg) -> List[BookEvent]:
+        raise NotImplementedError
+
+    def check_sequence(self, book: LocalOrderBook, event: BookEvent) -> str:
+        """預設以 [first_seq, seq] 區間檢查增量是否連續"""
+        if event.seq is None or book.seq is None:
+            return SEQ_APPLY
+        if event.seq <= book.seq:
+            return SEQ_SKIP
+        first = event.first_seq if event.first_seq is not None else event.seq
+        if first <= book.seq + 1:
+            return SEQ_APPLY
+        return SEQ_RESYNC
+
+    def verify_checksum(self, book: LocalOrderBook, checksum: int) -> bool:
+        """交易所未提供校驗和時一律通過"""
+        return True
+
+
+class CoinbaseBookAdapter(BookFeedAdapter):
+    exchange_id = "coinbase"
+    ws_snapshot = True
+
+    def snapshot_params(self) -> Dict:
+        return {"level": 2}
+
+    def parse_snapshot(self, data) -> BookEvent:
+        return BookEvent("snapshot", _pairs(data['bids']), _pairs(data['asks']),
+                         seq=data.get('sequence'))
+
+    def subscribe_messages(self) -> List[Dict]:
+        return [{"type": "subscribe", "product_ids": [self.venue_symbol],
+                 "channels": ["level2_batch"]}]
+
+    def parse_message(self, msg) -> List[BookEvent]:
+        msg_type = msg.get('type')
+        if msg_type == "snapshot":
+            return [BookEvent("snapshot", _pairs(msg['bids']), _pairs(msg['asks']))]
+        if msg_type == "l2update":
+            bids, asks = [], []
+            for side, price, qty in msg.get('changes', []):
+                (bids if side == "buy" else asks).append((price, qty))
+            return [BookEvent("diff", bids, asks)]
+        return []
+
+    def check_sequence(self, book: LocalOrderBook, event: BookEvent) -> str:
+        # level2_batch 不帶序號
+        return SEQ_APPLY
+
+
+class KrakenBookAdapter(BookFeedAdapter):
+    exchange_id = "kraken"
+    ws_snapshot = True
+
+    def __init__(self, symbol: str = SYMBOL):
+        super().__init__(symbol)
+        self.depth = self.book_config.get('ws_depth', 10)
+        self.ws_symbol = self.book_config['ws_symbol_mapping'][symbol]
+
+    def snapshot_params(self) -> Dict:
+        return {"pair": self.venue_symbol, "count": self.depth}
+
+    def parse_snapshot(self, data) -> BookEvent:
+        book = next(iter(data['result'].values()))
+        return BookEvent("snapshot", _pairs(book['bids']), _pairs(book['asks']))
+
+    def subscribe_messages(self) -> List[Dict]:
+        return [{"event": "subscribe", "pair": [self.ws_symbol],
+                 "subscription": {"name": "book", "depth": self.depth}}]
+
+    def parse_message(self, msg) -> List[BookEvent]:
+        # 數據訊息為列表：[channelID, {...}, ({...},) channelName, pair]
+        if not isinstance(msg, list):
+            return []
+        payloads = [part for part in msg[1:-2] if isinstance(part, dict)]
+        if not payloads:
+            return []
+        if "as" in payloads[0] or "bs" in payloads[0]:
+            return [BookEvent("snapshot", _pairs(payloads[0].get('bs', [])),
+                              _pairs(payloads[0].get('as', [])))]
+        bids, asks, checksum = [], [], None
+        for part in payloads:
+            bids.extend(_pairs(part.get('b', [])))
+            asks.extend(_pairs(part.get('a', [])))
+            if 'c' in part:
+                checksum = int(part['c'])
+        return [BookEvent("diff", bids, asks, checksum=checksum)]
+
+    def check_sequence(self, book: LocalOrderBook, event: BookEvent) -> str:
+        # Kraken 以校驗和保證一致性
+        return SEQ_APPLY
+
+    def verify_checksum(self, book: LocalOrderBook, checksum: int) -> bool:
+        def fmt(value: str) -> str:
+            return value.replace('.', '').lstrip('0')
+
+        payload = "".join(fmt(p) + fmt(q) for p, q in book.asks.top(10))
+        payload += "".join(fmt(p) + fmt(q) for p, q in book.bids.top(10))
+        return zlib.crc32(payload.encode()) == checksum
+
+
+class OKXBookAdapter(BookFeedAdapter):
+    exchange_id = "okx"
+    ws_snapshot = True
+    depth = 400
+
+    def snapshot_params(self) -> Dict:
+        return {"instId": self.venue_symbol, "sz": 400}
+
+    def parse_snapshot(self, data) -> BookEvent:
+        book = data['data'][0]
+        return BookEvent("snapshot", _pairs(book['bids']), _pairs(book['asks']))
+
+    def subscribe_messages(self) -> List[Dict]:
+        return [{"op": "subscribe",
+                 "args": [{"channel": "books", "instId": self.venue_symbol}]}]
+
+    def parse_message(self, msg) -> List[BookEvent]:
+        action = msg.get('action')
+        if action not in ("snapshot", "update"):
+            return []
+        events = []
+        for book in msg.get('data', []):
+            events.append(BookEvent(
+                "snapshot" if action == "snapshot" else "diff",
+                _pairs(book.get('bids', [])), _pairs(book.get('asks', [])),
+                seq=book.get('seqId'), first_seq=book.get('prevSeqId'),
+                checksum=book.get('checksum')
+            ))
+        return events
+
+    def check_sequence(self, book: LocalOrderBook, event: BookEvent) -> str:
+        # OKX 的 prevSeqId 應等於上一則訊息的 seqId
+        if event.first_seq is None:
+            return super().check_sequence(book, event)
+        if event.seq is None or book.seq is None:
+            return SEQ_APPLY
+        if event.first_seq == book.seq:
+            return SEQ_APPLY
+        if event.seq <= book.seq:
+            return SEQ_SKIP
+        return SEQ_RESYNC
+
+    def verify_checksum(self, book: LocalOrderBook, checksum: int) -> bool:
+        bids = book.bids.top(25)
+        asks = book.asks.top(25)
+        parts = []
+        for i in range(max(len(bids), len(asks))):
+            if i < len(bids):
+                parts.append(f"{bids[i][0]}:{bids[i][1]}")
+            if i < len(asks):
+                parts.append(f"{asks[i][0]}:{asks[i][1]}")
+        crc = zlib.crc32(":".join(parts).encode())
+        if crc >= 1 << 31:
+            crc -= 1 << 32  # OKX 使用有號32位整數
+        return crc == checksum
+
+
+class BybitBookAdapter(BookFeedAdapter):
+    exchange_id = "bybit"
+    ws_snapshot = True
+    depth = 50
+
+    def snapshot_params(self) -> Dict:
+        return {"category": "spot", "symbol": self.venue_symbol, "limit": self.depth}
+
+    def parse_snapshot(self, data) -> BookEvent:
+        book = data['result']
+        return BookEvent("snapshot", _pairs(book['b']), _pairs(book['a']), seq=book.get('u'))
+
+    def subscribe_messages(self) -> List[Dict]:
+        return [{"op": "subscribe", "args": [f"orderbook.{self.depth}.{self.venue_symbol}"]}]
+
+    def parse_message(self, msg) -> List[BookEvent]:
+        msg_type = msg.get('type')
+        if msg_type not in ("snapshot", "delta"):
+            return []
+        book = msg['data']
+        # u == 1 代表服務重啟後的新快照
+        kind = "snapshot" if msg_type == "snapshot" or book.get('u') == 1 else "diff"
+        return [BookEvent(kind, _pairs(book.get('b', [])), _pairs(book.get('a', [])),
+                          seq=book.get('u'))]
+
+    def check_sequence(self, book: LocalOrderBook, event: BookEvent) -> str:
+        if event.seq is not None and book.seq is not None and event.seq <= book.seq:
+            return SEQ_SKIP
+        return SEQ_APPLY
+
+
+class GateioBookAdapter(BookFeedAdapter):
+    exchange_id = "gateio"
+
+    def snapshot_params(self) -> Dict:
+        return {"currency_pair": self.venue_symbol, "limit": self.depth, "with_id": "true"}
+
+    def parse_snapshot(self, data) -> BookEvent:
+        return BookEvent("snapshot", _pairs(data['bids']), _pairs(data['asks']), seq=data.get('id'))
+
+    def subscribe_messages(self) -> List[Dict]:
+        return [{"time": int(get_taiwan_time().timestamp()),
+                 "channel": "spot.order_book_update", "event": "subscribe",
+                 "payload": [self.venue_symbol, "100ms"]}]
+
+    def parse_message(self, msg) -> List[BookEvent]:
+        if msg.get('channel') != "spot.order_book_update" or msg.get('event') != "update":
+            return []
+        result = msg['result']
+        return [BookEvent("diff", _pairs(result.get('b', [])), _pairs(result.get('a', [])),
+                          seq=result.get('u'), first_seq=result.get('U'))]
+
+
+class MexcBookAdapter(BookFeedAdapter):
+    exchange_id = "mexc"
+
+    def snapshot_params(self) -> Dict:
+        return {"symbol": self.venue_symbol, "limit": self.depth}
+
+    def parse_snapshot(self, data) -> BookEvent:
+        return BookEvent("snapshot", _pairs(data['bids']), _pairs(data['asks']),
+                         seq=data.get('lastUpdateId'))
+
+    def subscribe_messages(self) -> List[Dict]:
+        return [{"method": "SUBSCRIPTION",
+                 "params": [f"spot@public.increase.depth.v3.api@{self.venue_symbol}"]}]
+
+    def parse_message(self, msg) -> List[BookEvent]:
+        data = msg.get('d') if isinstance(msg, dict) else None
+        if not data or 'r' not in data:
+            return []
+        bids = [(level['p'], level['v']) for level in data.get('bids', [])]
+        asks = [(level['p'], level['v']) for level in data.get('asks', [])]
+        return [BookEvent("diff", bids, asks, seq=int(data['r']))]
+
+
+BOOK_ADAPTERS = {
+    "coinbase": CoinbaseBookAdapter,
+    "kraken": KrakenBookAdapter,
+    "okx": OKXBookAdapter,
+    "bybit": BybitBookAdapter,
+    "gateio": GateioBookAdapter,
+    "mexc": MexcBookAdapter,
+}
+
+
+# ======================
+# 模擬數據源（離線測試用）
+# ======================
+
+class SimulatedBookFeed:
+    """模擬盤口數據源：先送快照，再送隨機增量
+
+    bias > 0 時買盤較厚，bias < 0 時賣盤較厚，方便測試失衡警報。
+    """
+
+    def __init__(self, seed: int = 42, mid_price: float = 0.25, tick: float = 0.00001,
+                 levels: int = 50, updates: int = 500, bias: float = 0.0,
+                 interval: float = 0.0):
+        self.rng = random.Random(seed)
+        self.mid_price = mid_price
+        self.tick = tick
+        self.levels = levels
+        self.updates = updates
+        self.bias = bias
+        self.interval = interval
+        self.seq = 0
+
+    def _price(self, ticks: int) -> str:
+        return f"{self.mid_price + ticks * self.tick:.5f}"
+
+    def _qty(self, is_bid: bool) -> str:
+        scale = 1.0 + (self.bias if is_bid else -self.bias)
+        return f"{max(self.rng.uniform(100, 5000) * scale, 1.0):.2f}"
+
+    def snapshot(self) -> BookEvent:
+        self.seq += 1
+        bids = [(self._price(-i), self._qty(True)) for i in range(1, self.levels + 1)]
+        asks = [(self._price(i), self._qty(False)) for i in range(1, self.levels + 1)]
+        return BookEvent("snapshot", bids, asks, seq=self.seq)
+
+    def diff(self) -> BookEvent:
+        self.seq += 1
+        bids, asks = [], []
+        for _ in range(self.rng.randint(1, 5)):
+            is_bid = self.rng.random() < 0.5
+            offset = self.rng.randint(1, self.levels)
+            price = self._price(-offset if is_bid else offset)
+            qty = "0" if self.rng.random() < 0.2 else self._qty(is_bid)
+            (bids if is_bid else asks).append((price, qty))
+        return BookEvent("diff", bids, asks, seq=self.seq)
+
+    async def events(self) -> AsyncIterator[BookEvent]:
+        yield self.snapshot()
+        for _ in range(self.updates):
+            if self.interval:
+                await asyncio.sleep(self.interval)
+            yield self.diff()
+
+
+# ======================
+# 訂單簿管理器
+# ======================
+
+class OrderBookManager:
+    """訂單簿管理器：維護各交易所本地訂單簿並提供失衡指標"""
+
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None,
+                 exchanges: Optional[List[str]] = None, symbol: str = SYMBOL, limiter=None):
+        self.session = session
+        self.limiter = limiter  # 可選 RateLimiter，快照請求以最高優先排隊
+        self.symbol = symbol
+        self.exchanges = exchanges or list(EXCHANGE_LIST)
+        self.adapters = {ex_id: BOOK_ADAPTERS[ex_id](symbol) for ex_id in self.exchanges}
+        self.books = {
+            ex_id: LocalOrderBook(ex_id, symbol, depth=self.adapters[ex_id].depth)
+            for ex_id in self.exchanges
+        }
+        self.stats = {
+            ex_id: {"messages": 0, "resyncs": 0, "checksum_errors": 0, "skipped": 0}
+            for ex_id in self.exchanges
+        }
+        self._tasks: List[asyncio.Task] = []
+
+    def get_imbalance(self, exchange_id: str) -> Optional[float]:
+        """取得交易所前N檔盤口失衡（尚未同步時為 None）"""
+        book = self.books.get(exchange_id)
+        return book.imbalance if book else None
+
+    def get_quote(self, exchange_id: str) -> Tuple[Optional[float], Optional[float]]:
+        """取得交易所最優買賣價（尚未同步時為 None, None）"""
+        book = self.books.get(exchange_id)
+        return (book.best_bid, book.best_ask) if book else (None, None)
+
+    def apply_event(self, exchange_id: str, event: BookEvent):
+        """套用單一事件；不一致時拋出 BookResyncRequired"""
+        book = self.books[exchange_id]
+        adapter = self.adapters[exchange_id]
+        stats = self.stats[exchange_id]
+        stats['messages'] += 1
+
+        if event.kind == "snapshot":
+            book.apply_snapshot(event.bids, event.asks, event.seq)
+        else:
+            if not book.ready:
+                stats['skipped'] += 1
+                return
+            decision = adapter.check_sequence(book, event)
+            if decision == SEQ_SKIP:
+                stats['skipped'] += 1
+                return
+            if decision == SEQ_RESYNC:
+                book.ready = False
+                raise BookResyncRequired(f"{exchange_id} 序號中斷 (本地 {book.seq}, 收到 {event.first_seq})")
+            book.apply_diff(event.bids, event.asks, event.seq)
+
+        if event.checksum is not None and not adapter.verify_checksum(book, event.checksum):
+            stats['checksum_errors'] += 1
+            book.ready = False
+            raise BookResyncRequired(f"{exchange_id} 校驗和不符")
+
+    async def consume(self, exchange_id: str, events: AsyncIterator[BookEvent]):
+        """持續套用事件流（真實 WebSocket 或模擬數據源）"""
+        async for event in events:
+            self.apply_event(exchange_id, event)
+
+    async def fetch_snapshot(self, exchange_id: str) -> LocalOrderBook:
+        """以 REST 取得快照並重建本地訂單簿"""
+        adapter = self.adapters[exchange_id]
+        url, params = adapter.snapshot_request()
+        if self.limiter:
+            await self.limiter.acquire(exchange_id, url, PRIORITY_HIGH)
+        async with self.session.get(url, params=params, timeout=API_TIMEOUT) as response:
+            if self.limiter:
+                self.limiter.observe(exchange_id, response.status, response.headers)
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        self.apply_event(exchange_id, adapter.parse_snapshot(data))
+        return self.books[exchange_id]
+
+    async def _ws_events(self, exchange_id: str) -> AsyncIterator[BookEvent]:
+        adapter = self.adapters[exchange_id]
+        async with self.session.ws_connect(adapter.ws_url, heartbeat=20) as ws:
+            for message in adapter.subscribe_messages():
+                await ws.send_json(message)
+            # 未自帶快照的交易所：訂閱後才取 REST 快照，
+            # 期間收到的增量留在連線緩衝區，由序號檢查過濾
+            if not adapter.ws_snapshot:
+                await self.fetch_snapshot(exchange_id)
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    for event in adapter.parse_message(json.loads(msg.data)):
+                        yield event
+                elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    break
+
+    async def run_exchange(self, exchange_id: str, retry_delay: float = 5.0):
+        """維持單一交易所的訂單簿同步（斷線或不一致時自動重連）"""
+        exchange_name = EXCHANGES[exchange_id]['name']
+        while True:
+            try:
+                await self.consume(exchange_id, self._ws_events(exchange_id))
+            except asyncio.CancelledError:
+                raise
+            except BookResyncRequired as e:
+                self.stats[exchange_id]['resyncs'] += 1
+                logger.warning("⚠️  %s 訂單簿重新同步: %s", exchange_name, e, extra={"exchange": exchange_id})
+                continue
+            except Exception as e:
+                logger.error("❌ %s 訂單簿連線失敗: %s", exchange_name, str(e)[:80],
+                             extra={"exchange": exchange_id, "error": type(e).__name__})
+            self.books[exchange_id].ready = False
+            await asyncio.sleep(retry_delay)
+
+    def start(self):
+        """為每個交易所啟動背景同步任務"""
+        for exchange_id in self.exchanges:
+            self._tasks.append(asyncio.create_task(self.run_exchange(exchange_id)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+async def test_order_book():
+    """以模擬數據源測試訂單簿"""
+    print("🧪 測試訂單簿（模擬數據源）...")
+
+    manager = OrderBookManager()
+    for i, exchange_id in enumerate(manager.exchanges):
+        feed = SimulatedBookFeed(seed=i, bias=0.5 if i % 2 == 0 else -0.5)
+        await manager.consume(exchange_id, feed.events())
+        book = manager.books[exchange_id]
+        print(f"  {EXCHANGES[exchange_id]['name']}: 買一 {book.best_bid} 賣一 {book.best_ask} "
+              f"失衡 {book.imbalance:+.2f} ({book.update_count} 次更新)")
+
+if __name__ == "__main__":
+    asyncio.run(test_order_book())
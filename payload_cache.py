@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+回應變更偵測
+市場清淡時，連續兩次掃描常拿到逐字元相同的 ticker 與成交頁：
+  - 交易所回傳 ETag / Last-Modified 時，下次請求帶 If-None-Match / If-Modified-Since，304 直接沿用上次結果
+  - 其餘以回應內容雜湊比對，相同時沿用上次解析好的 JSON（不再 json.loads）
+  - 同一交易所所有端點都未變更時，沿用上次正規化的 K 線（不再彙總成交）
+"""
+
+import copy
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import get_taiwan_time
+
+
+def payload_digest(body: bytes) -> bytes:
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+@dataclass
+class CachedPayload:
+    """單一端點上次的回應"""
+    digest: bytes
+    value: Any
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class PayloadCache:
+    """以 (交易所, 請求鍵) 記住上次回應與解析結果"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._payloads: Dict[Tuple[str, Any], CachedPayload] = {}
+        self._normalized: Dict[str, Tuple[Dict[str, Any], Any]] = {}
+        self.stats = {"responses": 0, "not_modified": 0, "unchanged": 0, "decoded": 0,
+                      "reused": 0, "normalized": 0, "skip_rate": 0.0}
+
+    def _update_skip_rate(self):
+        skipped = self.stats['not_modified'] + self.stats['unchanged']
+        self.stats['skip_rate'] = round(skipped / self.stats['responses'], 3) if self.stats['responses'] else 0.0
+
+    def conditional_headers(self, exchange_id: str, key: Any) -> Optional[Dict[str, str]]:
+        """上次回應有 ETag / Last-Modified 時的條件請求標頭"""
+        if not self.enabled:
+            return None
+        cached = self._payloads.get((exchange_id, key))
+        if cached is None:
+            return None
+        headers = {}
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        return headers or None
+
+    def decode(self, exchange_id: str, key: Any, response) -> Any:
+        """回傳解析後的 JSON；304 或內容未變更時直接沿用上次的物件"""
+        if not self.enabled:
+            return response.json()
+
+        self.stats['responses'] += 1
+        cached = self._payloads.get((exchange_id, key))
+        if response.status == 304 and cached is not None:
+            self.stats['not_modified'] += 1
+            self._update_skip_rate()
+            return cached.value
+
+        digest = payload_digest(response.body)
+        if cached is not None and cached.digest == digest:
+            self.stats['unchanged'] += 1
+            self._update_skip_rate()
+            return cached.value
+
+        value = response.json()
+        headers = {k.lower(): v for k, v in response.headers.items()}
+        self._payloads[(exchange_id, key)] = CachedPayload(
+            digest, value, headers.get("etag"), headers.get("last-modified")
+        )
+        self.stats['decoded'] += 1
+        self._update_skip_rate()
+        return value
+
+    def normalize(self, exchange_id: str, raw: Dict[str, Any],
+                  normalizer: Callable[[str, Dict[str, Any]], Any]) -> Any:
+        """各端點解析結果都是上次的同一物件時，沿用上次的 K 線（更新擷取時間）"""
+        if not self.enabled:
+            return normalizer(exchange_id, raw)
+
+        previous_raw, previous_kline = self._normalized.get(exchange_id, (None, None))
+        if (previous_kline is not None and previous_raw.keys() == raw.keys()
+                and all(raw[k] is previous_raw[k] for k in raw)):
+            self.stats['reused'] += 1
+            kline = copy.copy(previous_kline)
+            kline.fetch_time = get_taiwan_time()
+            return kline
+
+        kline = normalizer(exchange_id, raw)
+        self._normalized[exchange_id] = (raw, kline)
+        self.stats['normalized'] += 1
+        return kline
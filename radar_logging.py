@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+非阻塞結構化日誌
+掃描熱路徑的輸出改經 logging：記錄先放入佇列，由背景執行緒寫出，
+stdout 是慢速管線（CI、日誌收集器）時不會阻塞事件迴圈
+
+  LOG_FORMAT = "text"  與原本 print 相同的人類可讀輸出（預設）
+  LOG_FORMAT = "json"  每行一筆 JSON，含 extra 傳入的結構化欄位
+
+每家交易所一個 logger（radar.exchange.<id>），可在 EXCHANGE_LOG_LEVELS 個別設定等級；
+相同的警告/錯誤在 LOG_DEDUP_WINDOW 秒內只輸出一次，之後附上被抑制的次數
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+from config import LOG_FORMAT, LOG_LEVEL, LOG_FILE, LOG_DEDUP_WINDOW, EXCHANGE_LOG_LEVELS
+
+ROOT_LOGGER = "radar"
+
+# LogRecord 內建屬性，其餘視為 extra 結構化欄位
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每行一筆 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """與原本 print 輸出相同（訊息本身已含 emoji 前綴）"""
+
+    def __init__(self):
+        super().__init__("%(message)s")
+
+
+class DedupFilter(logging.Filter):
+    """相同的 WARNING 以上訊息在 window 秒內只放行一次"""
+
+    def __init__(self, window: float = LOG_DEDUP_WINDOW):
+        super().__init__()
+        self.window = window
+        self._seen: Dict[Tuple[str, int, str], list] = {}  # key -> [首次放行時間, 抑制次數]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.window <= 0:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        entry = self._seen.get(key)
+        if entry is not None and now - entry[0] < self.window:
+            entry[1] += 1
+            return False
+
+        if entry is not None and entry[1]:
+            record.msg = f"{record.getMessage()}（過去 {self.window:.0f}s 內重複 {entry[1]} 次）"
+            record.args = ()
+            record.suppressed = entry[1]
+        self._seen[key] = [now, 0]
+        if len(self._seen) > 4096:
+            self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+        return True
+
+
+def setup_logging(fmt: str = LOG_FORMAT, level: str = LOG_LEVEL, log_file: Optional[str] = LOG_FILE,
+                  force: bool = False) -> logging.Logger:
+    """設定 radar logger：佇列 → 背景執行緒 → stdout 或檔案"""
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    if root.handlers and not force:
+        return root
+
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if log_file:
+        output = logging.FileHandler(log_file, encoding="utf-8")
+    else:
+        output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(DedupFilter())
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    root.propagate = False
+
+    for exchange_id, exchange_level in EXCHANGE_LOG_LEVELS.items():
+        logging.getLogger(f"{ROOT_LOGGER}.exchange.{exchange_id}").setLevel(exchange_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    return root
+
+
+def flush_logging():
+    """停止背景執行緒並寫出佇列中剩餘的記錄"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logging.getLogger(ROOT_LOGGER).handlers.clear()
+
+
+atexit.register(flush_logging)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """取得 radar.<name> logger（首次使用時以預設配置初始化）"""
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def exchange_logger(exchange_id: str) -> logging.Logger:
+    return get_logger(f"exchange.{exchange_id}")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+雷達即時狀態
+保存最新掃描結果、近期歷史、有效警報與統計，
+供 HTTP 數據源、Telegram 指令與狀態報告共用（不觸發任何交易所請求）
+"""
+
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from config import (
+    EXCHANGES, EXCHANGE_LIST, SYMBOL,
+    FEED_HISTORY_SIZE, FEED_ALERT_TTL,
+    get_taiwan_time, format_taiwan_time
+)
+
+
+def kline_to_dict(kline) -> Dict[str, Any]:
+    """將 EnhancedKlineData 轉為可序列化的字典"""
+    return {
+        "exchange": kline.exchange,
+        "symbol": kline.symbol,
+        "open": kline.open,
+        "high": kline.high,
+        "low": kline.low,
+        "close": kline.close,
+        "volume": kline.volume,
+        "buy_volume": kline.buy_volume,
+        "sell_volume": kline.sell_volume,
+        "buy_sell_ratio": kline.buy_sell_ratio,
+        "book_imbalance": kline.book_imbalance,
+        "vwap": kline.vwap,
+        "whale_buy_volume": kline.whale_buy_volume,
+        "whale_sell_volume": kline.whale_sell_volume,
+        "large_trade": kline.large_trade,
+        "bid": kline.bid,
+        "ask": kline.ask,
+        "minute_flow": kline.minute_flow,
+        "last_trade_time": kline.last_trade_time,
+        "is_red": kline.is_red,
+        "is_green": kline.is_green,
+    }
+
+
+class RadarState:
+    """雷達即時狀態（單一事件迴圈內使用）"""
+
+    def __init__(self, history_size: int = FEED_HISTORY_SIZE):
+        self.started_at = time.time()
+        self.tick_no = 0
+        self.latest: Dict[str, Any] = {}  # exchange_id -> EnhancedKlineData
+        self.latest_tick: Optional[Dict[str, Any]] = None
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self.alerts: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self.scan_count = 0
+        self.alert_counts = {"BUY_IN_RED": 0, "SELL_IN_GREEN": 0, "LARGE_TRADE": 0,
+                             "SPREAD_ARB": 0, "PRICE_DEVIATION": 0}
+        self.exchange_stats = {ex_id: {"success": 0, "total": 0} for ex_id in EXCHANGE_LIST}
+        self.metrics: Dict[str, Dict[str, Any]] = {}  # 各元件登記的即時統計（如請求合併）
+        self.lead_lag: Dict[str, Any] = {}  # 最近一次跨交易所領先/落後估計（LeadLagAnalyzer.summary）
+        self.muted_until = 0.0  # /mute 指令設定的靜音截止時間（Unix 時間戳）
+        self._listeners: List[Callable[["RadarState"], None]] = []
+
+    def add_listener(self, callback: Callable[["RadarState"], None]):
+        """註冊每次掃描後的回呼"""
+        self._listeners.append(callback)
+
+    def update(self, kline_data: Dict[str, Any], alerts: Optional[List[Dict[str, Any]]] = None,
+               exchanges: Optional[List[str]] = None) -> Dict[str, Any]:
+        """記錄一次掃描結果與本次觸發的警報
+
+        exchanges 為本輪輪詢的交易所（自適應輪詢）：未輪詢的交易所沿用上次數據、不計入成功率
+        """
+        now = time.time()
+        self.tick_no += 1
+        self.scan_count += 1
+        if exchanges is None:
+            self.latest = dict(kline_data)
+        else:
+            self.latest = {ex_id: kline for ex_id, kline in self.latest.items() if ex_id not in exchanges}
+            self.latest.update(kline_data)
+
+        for ex_id in self.exchange_stats:
+            if exchanges is not None and ex_id not in exchanges:
+                continue
+            self.exchange_stats[ex_id]['total'] += 1
+            if ex_id in kline_data:
+                self.exchange_stats[ex_id]['success'] += 1
+
+        for alert in alerts or []:
+            alert = dict(alert, timestamp=now)
+            self.alerts.append(alert)
+            if alert.get('alert_type') in self.alert_counts:
+                self.alert_counts[alert['alert_type']] += 1
+
+        self.latest_tick = {
+            "tick": self.tick_no,
+            "time": format_taiwan_time(get_taiwan_time()),
+            "timestamp": now,
+            "symbol": SYMBOL,
+            "exchanges": {ex_id: kline_to_dict(kline) for ex_id, kline in self.latest.items()},
+        }
+        self.history.append(self.latest_tick)
+
+        for callback in self._listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"❌ 狀態回呼失敗: {e}")
+        return self.latest_tick
+
+    def sync_exchanges(self):
+        """設定熱重載後對齊交易所（保留既有交易所的統計）"""
+        self.exchange_stats = {ex_id: self.exchange_stats.get(ex_id, {"success": 0, "total": 0})
+                               for ex_id in EXCHANGE_LIST}
+        self.latest = {ex_id: kline for ex_id, kline in self.latest.items() if ex_id in EXCHANGE_LIST}
+
+    def active_alerts(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """FEED_ALERT_TTL 秒內觸發的警報"""
+        now = now if now is not None else time.time()
+        return [alert for alert in self.alerts if now - alert['timestamp'] <= FEED_ALERT_TTL]
+
+    @property
+    def is_muted(self) -> bool:
+        return time.time() < self.muted_until
+
+    def mute(self, minutes: float):
+        """靜音警報推送 minutes 分鐘（0 = 解除），警報仍會記錄"""
+        self.muted_until = time.time() + minutes * 60 if minutes > 0 else 0.0
+
+    @property
+    def runtime(self) -> str:
+        seconds = int(time.time() - self.started_at)
+        return f"{seconds // 3600}小時{seconds % 3600 // 60}分"
+
+    def status_data(self) -> Dict[str, Any]:
+        """組裝 STATUS 系統訊息所需數據"""
+        total = sum(stats['total'] for stats in self.exchange_stats.values())
+        success = sum(stats['success'] for stats in self.exchange_stats.values())
+        return {
+            "exchange_count": len(EXCHANGES),
+            "status": "運行中",
+            "total_scans": self.scan_count,
+            "total_alerts": sum(self.alert_counts.values()),
+            "success_rate": success / total * 100 if total else 0.0,
+            "runtime": self.runtime,
+            "buy_alerts": self.alert_counts["BUY_IN_RED"],
+            "sell_alerts": self.alert_counts["SELL_IN_GREEN"],
+            "large_trade_alerts": self.alert_counts["LARGE_TRADE"],
+            "spread_alerts": self.alert_counts["SPREAD_ARB"],
+            "deviation_alerts": self.alert_counts["PRICE_DEVIATION"],
+            "exchange_stats": {EXCHANGES[ex_id]['name']: stats for ex_id, stats in self.exchange_stats.items()},
+            "metrics": self.metrics,
+            "lead_lag": self.lead_lag,
+        }
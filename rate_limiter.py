@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+依權重的交易所速率限制
+每家交易所一個令牌桶，請求依路徑權重扣除額度；
+額度不足時依優先順序排隊等待，而不是送出後收到429
+回應帶有限額標頭時即時校正剩餘額度，收到429/418時暫停該交易所
+"""
+
+import asyncio
+import copy
+import heapq
+import itertools
+import time
+from typing import Dict, List, Mapping, Optional
+from urllib.parse import urlsplit
+
+from multidict import CIMultiDict, CIMultiDictProxy
+
+from config import RATE_LIMITS, RATE_LIMIT_HEADROOM, RATE_LIMIT_COOLDOWN
+
+# 數字越小越優先
+PRIORITY_HIGH = 0    # 訂單簿快照、重新同步
+PRIORITY_NORMAL = 1  # 每輪掃描的行情與成交
+PRIORITY_LOW = 2     # K線回補、診斷
+
+
+class TokenBucket:
+    """單一交易所的令牌桶與優先佇列（單一事件迴圈內使用）"""
+
+    def __init__(self, capacity: float, refill: float, weights: Optional[Dict[str, float]] = None,
+                 headers: Optional[Dict[str, str]] = None, headroom: float = RATE_LIMIT_HEADROOM):
+        self.limit = capacity  # 交易所公佈的額度，用於換算 used 標頭
+        self.capacity = capacity * headroom
+        self.refill = refill * headroom
+        self.weights = weights or {}
+        self.headers = headers or {}
+        self.tokens = self.capacity
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._waiters: List[list] = []
+        self._counter = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {"requests": 0, "weight_used": 0.0, "queued": 0, "waited_sec": 0.0,
+                      "throttled": 0, "budget_used_pct": 0.0}
+
+    def weight_for(self, path: str) -> float:
+        return min(self.weights.get(path, 1), self.capacity)
+
+    def _refill_now(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill)
+        self._updated = now
+
+    def _update_budget(self):
+        self.stats['budget_used_pct'] = round((1 - self.tokens / self.capacity) * 100, 1)
+
+    def _try_take(self, weight: float) -> bool:
+        now = time.monotonic()
+        self._refill_now(now)
+        if now < self.paused_until or self.tokens < weight:
+            return False
+        self.tokens -= weight
+        self.stats['requests'] += 1
+        self.stats['weight_used'] += weight
+        self._update_budget()
+        return True
+
+    def _delay_for(self, weight: float) -> float:
+        now = time.monotonic()
+        return max(self.paused_until - now, (weight - self.tokens) / self.refill, 0.001)
+
+    def _dispatch(self):
+        """依優先順序放行等待中的請求，額度不足時排定下次檢查"""
+        self._timer = None
+        while self._waiters:
+            _, _, weight, future = self._waiters[0]
+            if future.done():  # 已取消
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_take(weight):
+                self._timer = asyncio.get_running_loop().call_later(self._delay_for(weight), self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+    def _reschedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+
+    async def acquire(self, weight: float = 1, priority: int = PRIORITY_NORMAL) -> float:
+        """取得額度，回傳等待秒數"""
+        if not self._waiters and self._try_take(weight):
+            return 0.0
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._counter), weight, future])
+        self.stats['queued'] += 1
+        self._reschedule()  # 新請求可能比目前隊首更優先
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            raise
+        waited = time.monotonic() - started
+        self.stats['waited_sec'] = round(self.stats['waited_sec'] + waited, 3)
+        return waited
+
+    def observe(self, status: int, headers: Mapping[str, str]):
+        """依回應狀態與限額標頭校正剩餘額度（標頭名稱不分大小寫）"""
+        if not isinstance(headers, (CIMultiDict, CIMultiDictProxy)):
+            headers = CIMultiDict(headers)
+        now = time.monotonic()
+        self._refill_now(now)
+
+        try:
+            if 'remaining' in self.headers and self.headers['remaining'] in headers:
+                remaining = float(headers[self.headers['remaining']]) * self.capacity / self.limit
+                self.tokens = min(self.tokens, remaining)
+            elif 'used' in self.headers and self.headers['used'] in headers:
+                used = float(headers[self.headers['used']])
+                self.tokens = min(self.tokens, self.capacity - used * self.capacity / self.limit)
+        except ValueError:
+            pass
+
+        if status in (418, 429):
+            self.stats['throttled'] += 1
+            try:
+                retry_after = float(headers.get('Retry-After', RATE_LIMIT_COOLDOWN))
+            except ValueError:
+                retry_after = RATE_LIMIT_COOLDOWN
+            self.paused_until = max(self.paused_until, now + retry_after)
+            self.tokens = 0.0
+        self._update_budget()
+
+        if self._waiters:
+            self._reschedule()
+
+
+class RateLimiter:
+    """各交易所令牌桶的集合（未配置的交易所不限速）"""
+
+    def __init__(self, limits: Optional[Dict[str, Dict]] = None, headroom: float = RATE_LIMIT_HEADROOM):
+        self.headroom = headroom
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.stats: Dict[str, Dict] = {}
+        self._limits: Dict[str, Dict] = {}
+        self.configure(RATE_LIMITS if limits is None else limits)
+
+    def configure(self, limits: Dict[str, Dict]):
+        """套用新的額度設定：只重建設定有變更的令牌桶，移除已不在設定中的交易所"""
+        for ex_id in list(self.buckets):
+            if ex_id not in limits:
+                del self.buckets[ex_id], self.stats[ex_id], self._limits[ex_id]
+        for ex_id, cfg in limits.items():
+            if self._limits.get(ex_id) == cfg:
+                continue
+            bucket = TokenBucket(cfg['capacity'], cfg['refill'], cfg.get('weights'), cfg.get('headers'),
+                                 self.headroom)
+            previous = self.buckets.get(ex_id)
+            if previous is not None:
+                # 已用額度與統計延續，等待中的請求由新桶重新排程
+                if previous._timer is not None:
+                    previous._timer.cancel()
+                bucket.tokens = min(bucket.capacity, previous.tokens)
+                bucket.paused_until = previous.paused_until
+                bucket.stats.update(previous.stats)
+                bucket._waiters = previous._waiters
+                if bucket._waiters:
+                    bucket._reschedule()
+            self.buckets[ex_id] = bucket
+            self.stats[ex_id] = bucket.stats
+            self._limits[ex_id] = copy.deepcopy(cfg)
+
+    async def acquire(self, exchange_id: str, url: str, priority: int = PRIORITY_NORMAL) -> float:
+        bucket = self.buckets.get(exchange_id)
+        if bucket is None:
+            return 0.0
+        return await bucket.acquire(bucket.weight_for(urlsplit(url).path), priority)
+
+    def observe(self, exchange_id: str, status: int, headers: Mapping[str, str]):
+        bucket = self.buckets.get(exchange_id)
+        if bucket is not None:
+            bucket.observe(status, headers)
+
+
+# 程序內共用的預設實例，掃描器、K線與訂單簿共用同一份額度
+shared_limiter = RateLimiter()
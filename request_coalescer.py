@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+請求合併（single-flight）與短效快取
+相同 (URL, 參數) 的並發請求共用同一個進行中的請求（在獨立的 task 中執行），
+完成後結果保留 COALESCE_TTL 秒供同一輪掃描重用
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from config import COALESCE_TTL
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class _Flight:
+    """進行中的請求：執行請求的 task 與目前等待結果的呼叫端數"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """請求合併器
+
+    快取的是解析後的物件且會被多個呼叫端共用，呼叫端不可修改回傳值。
+    請求在獨立的 task 中執行：任一呼叫端（包括發起者）被取消只影響它自己，
+    所有等待者都離開時才取消請求。
+    """
+
+    def __init__(self, ttl: float = COALESCE_TTL, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._cache: Dict[Hashable, Tuple[float, Any]] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict] = None) -> CacheKey:
+        """以 URL 與排序後的參數組成鍵"""
+        if not params:
+            return url, ()
+        return url, tuple(sorted((str(k), str(v)) for k, v in params.items()))
+
+    def _purge_expired(self, now: float):
+        expired = [key for key, (expires, _) in self._cache.items() if expires <= now]
+        for key in expired:
+            del self._cache[key]
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """執行或共用請求"""
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached is not None:
+            if cached[0] > now:
+                self.stats['hits'] += 1
+                return cached[1]
+            del self._cache[key]
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.stats['coalesced'] += 1
+        else:
+            self.stats['misses'] += 1
+            flight = _Flight(asyncio.ensure_future(self._run(key, fetch)))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # 所有等待者都已取消：之後的相同請求重新發出，不會拿到這次的取消
+                self._finish(key, flight)
+                flight.task.cancel()
+
+    async def _run(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+
+        if self.ttl > 0:
+            now = time.monotonic()
+            if len(self._cache) >= self.max_entries:
+                self._purge_expired(now)
+            if len(self._cache) < self.max_entries:
+                self._cache[key] = (now + self.ttl, value)
+        return value
+
+    def _finish(self, key: Hashable, flight: _Flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        if flight.task.done() and not flight.task.cancelled():
+            flight.task.exception()  # 沒有等待者時避免 "exception was never retrieved" 警告
+
+    def clear(self):
+        """清除快取（進行中的請求不受影響）"""
+        self._cache.clear()
+
+
+# 程序內共用的預設實例，讓主循環、狀態報告與診斷的相同請求互相合併
+shared_flight = SingleFlight()
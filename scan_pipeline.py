@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+分段式掃描管線
+  fetch → normalize → aggregate → evaluate → notify
+每段之間是有界 asyncio 佇列，各段可設定並發數；
+已收盤K線快取在背景更新（有新K線收盤時才請求），供 evaluate 彙總多時間框架；
+下游跟不上時佇列丟棄最舊項目，而不是讓掃描一輪輪堆積
+上一輪在下一輪開始時仍未收齊的交易所，以部分結果結算（缺少的視為無數據）
+"""
+
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import EXCHANGE_LIST, PIPELINE_STAGES, PIPELINE_TICK_TIMEOUT
+from radar_logging import get_logger
+from scan_profiler import profiler
+
+logger = get_logger("pipeline")
+
+
+@dataclass
+class ExchangeJob:
+    """單一交易所在某一輪掃描中的工作項目"""
+    tick_no: int
+    exchange_id: str
+    payload: Any = None  # fetch 後為原始 JSON，normalize 後為 EnhancedKlineData 或例外
+
+
+@dataclass
+class TickResult:
+    """彙整完成的一輪掃描"""
+    tick_no: int
+    scan_time: Any
+    kline_data: Dict[str, Any] = field(default_factory=dict)
+    partial: bool = False
+    alerts: List[Dict[str, Any]] = field(default_factory=list)
+    exchanges: List[str] = field(default_factory=list)  # 本輪輪詢的交易所
+
+
+class Stage:
+    """管線的一段：有界佇列 + N 個 worker"""
+
+    def __init__(self, name: str, handler: Callable[[Any], Any], concurrency: int = 1,
+                 queue_size: int = 16, output: Optional["Stage"] = None):
+        self.name = name
+        self.handler = handler
+        self.is_async = inspect.iscoroutinefunction(handler)
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.output = output
+        self._workers: List[asyncio.Task] = []
+        self._latency_total = 0.0
+        self.stats = {"depth": 0, "processed": 0, "dropped": 0, "errors": 0,
+                      "avg_ms": 0.0, "max_ms": 0.0}
+
+    def offer(self, item: Any):
+        """非阻塞放入，佇列已滿時丟棄最舊項目"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.stats['dropped'] += 1
+        self.queue.put_nowait((time.perf_counter(), item))
+        self.stats['depth'] = self.queue.qsize()
+
+    async def _worker(self):
+        while True:
+            enqueued_at, item = await self.queue.get()
+            self.stats['depth'] = self.queue.qsize()
+            try:
+                result = await self.handler(item) if self.is_async else self.handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error("❌ 管線階段 %s 失敗: %s: %s", self.name, type(e).__name__, str(e)[:80],
+                             extra={"stage": self.name, "error": type(e).__name__})
+                continue
+            finally:
+                self.queue.task_done()
+
+            latency = (time.perf_counter() - enqueued_at) * 1000  # 含排隊時間
+            self.stats['processed'] += 1
+            self._latency_total += latency
+            self.stats['avg_ms'] = round(self._latency_total / self.stats['processed'], 1)
+            self.stats['max_ms'] = round(max(self.stats['max_ms'], latency), 1)
+
+            if result is not None and self.output is not None:
+                for out in result if isinstance(result, list) else [result]:
+                    self.output.offer(out)
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+class ScanPipeline:
+    """把掃描器、警報評估與通知串成分段管線
+
+    evaluate(tick_result) 回傳本輪警報列表（同時負責更新狀態）；
+    notify(alert) 發送單一警報（通常是 AlertFanout.publish）
+    """
+
+    def __init__(self, scanner, evaluate: Callable[[TickResult], Any],
+                 notify: Callable[[Dict[str, Any]], Optional[Awaitable]],
+                 exchanges: Optional[List[str]] = None,
+                 stage_config: Optional[Dict[str, Dict[str, int]]] = None,
+                 tick_timeout: Optional[float] = None):
+        # 預設值在建立時讀取（設定熱重載後建立的管線使用新值）
+        stage_config = PIPELINE_STAGES if stage_config is None else stage_config
+        self.scanner = scanner
+        self.exchanges = list(exchanges or EXCHANGE_LIST)
+        self.tick_timeout = PIPELINE_TICK_TIMEOUT if tick_timeout is None else tick_timeout
+        self.tick_no = 0
+        self._pending: Dict[int, TickResult] = {}
+        self._received: Dict[int, Dict[str, Any]] = {}
+        self._started_at: Dict[int, float] = {}
+        self._evaluate = evaluate
+        self._notify = notify
+        self.ticks_completed = 0
+        self.ticks_partial = 0
+        self._candle_task: Optional[asyncio.Task] = None
+
+        def stage(name, handler, output=None):
+            cfg = stage_config.get(name, {})
+            return Stage(name, handler, cfg.get("concurrency", 1), cfg.get("queue_size", 16), output)
+
+        self.notify_stage = stage("notify", self._notify_alert)
+        self.evaluate_stage = stage("evaluate", self._evaluate_tick, self.notify_stage)
+        self.aggregate_stage = stage("aggregate", self._aggregate, self.evaluate_stage)
+        self.normalize_stage = stage("normalize", self._normalize, self.aggregate_stage)
+        self.fetch_stage = stage("fetch", self._fetch, self.normalize_stage)
+        self.stages = [self.fetch_stage, self.normalize_stage, self.aggregate_stage,
+                       self.evaluate_stage, self.notify_stage]
+        self.stats = {s.name: s.stats for s in self.stages}
+
+    # ---------- 各段處理 ----------
+
+    async def _fetch(self, job: ExchangeJob) -> ExchangeJob:
+        try:
+            with profiler.phase("fetch", job.exchange_id):
+                job.payload = await self.scanner.fetch_raw(job.exchange_id)
+        except Exception as e:
+            job.payload = e
+        return job
+
+    def _normalize(self, job: ExchangeJob) -> ExchangeJob:
+        if not isinstance(job.payload, Exception):
+            try:
+                job.payload = self.scanner.normalize(job.exchange_id, job.payload)
+            except Exception as e:
+                job.payload = e
+        if isinstance(job.payload, Exception):
+            self.scanner.log_fetch_error(job.exchange_id, job.payload)
+            job.payload = None
+        return job
+
+    def _aggregate(self, job: ExchangeJob) -> Optional[List[TickResult]]:
+        received = self._received.get(job.tick_no)
+        if received is None:
+            return None  # 該輪已結算（逾時或被新一輪取代）
+        received[job.exchange_id] = job.payload
+        if len(received) < len(self._pending[job.tick_no].exchanges):
+            return None
+        return [self._settle(job.tick_no)]
+
+    def _settle(self, tick_no: int) -> TickResult:
+        received = self._received.pop(tick_no)
+        result = self._pending.pop(tick_no)
+        self._started_at.pop(tick_no, None)
+        result.partial = len(received) < len(result.exchanges)
+        result.kline_data = self.scanner.finish_scan(received, result.scan_time, result.exchanges)
+        self.ticks_completed += 1
+        if result.partial:
+            self.ticks_partial += 1
+        return result
+
+    def _settle_stale(self, now: float) -> List[TickResult]:
+        """結算逾時的舊輪次（以部分結果）"""
+        stale = [tick for tick, started in self._started_at.items() if now - started >= self.tick_timeout]
+        return [self._settle(tick) for tick in sorted(stale)]
+
+    async def _evaluate_tick(self, result: TickResult) -> List[Dict[str, Any]]:
+        alerts = self._evaluate(result)
+        if inspect.isawaitable(alerts):
+            alerts = await alerts
+        result.alerts = alerts or []
+        return result.alerts
+
+    async def _notify_alert(self, alert: Dict[str, Any]):
+        sent = self._notify(alert)
+        if inspect.isawaitable(sent):
+            await sent
+
+    def _refresh_candles(self, exchanges: List[str]):
+        """背景更新K線快取與未收盤K線（上一次尚未完成時略過）"""
+        if self._candle_task is None or self._candle_task.done():
+            self._candle_task = asyncio.create_task(self.scanner.fetch_latest_candles(exchanges))
+
+    # ---------- 控制 ----------
+
+    def submit_tick(self, exchanges: Optional[List[str]] = None) -> int:
+        """開始新一輪：逾時的舊輪次先以部分結果結算，再把各交易所放入 fetch 佇列
+
+        exchanges 指定本輪只輪詢部分交易所（自適應輪詢），預設全部
+        """
+        now = time.monotonic()
+        for result in self._settle_stale(now):
+            logger.warning("⏱️ 第 %d 輪逾時，以部分結果結算", result.tick_no, extra={"tick": result.tick_no})
+            self.evaluate_stage.offer(result)
+
+        self.tick_no += 1
+        scan_time = self.scanner.begin_scan()
+        polled = list(exchanges or self.exchanges)
+        self._pending[self.tick_no] = TickResult(self.tick_no, scan_time, exchanges=polled)
+        self._received[self.tick_no] = {}
+        self._started_at[self.tick_no] = now
+        for exchange_id in polled:
+            self.fetch_stage.offer(ExchangeJob(self.tick_no, exchange_id))
+        self._refresh_candles(polled)
+        return self.tick_no
+
+    async def drain(self, timeout: Optional[float] = None):
+        """等待已提交的輪次全部走完管線（未收齊的輪次以部分結果結算，預設最多 tick_timeout 秒）"""
+        timeout = self.tick_timeout if timeout is None else timeout
+        async def _drain():
+            if self._candle_task is not None:
+                await asyncio.gather(self._candle_task, return_exceptions=True)
+            for s in self.stages[:3]:
+                await s.queue.join()
+            for result in self._settle_stale(float("inf")):
+                self.evaluate_stage.offer(result)
+            for s in self.stages[3:]:
+                await s.queue.join()
+
+        try:
+            await asyncio.wait_for(_drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ 管線排空逾時（%.0f秒）", timeout)
+
+    def start(self):
+        for s in self.stages:
+            s.start()
+
+    async def stop(self):
+        if self._candle_task is not None:
+            self._candle_task.cancel()
+            await asyncio.gather(self._candle_task, return_exceptions=True)
+        for s in self.stages:
+            await s.stop()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+掃描流程的分段計時與抽樣分析
+分段計時（可選）：記錄每家交易所各階段耗時
+  queue    等待速率限制額度
+  network  HTTP 請求
+  json     JSON 解析
+  trades   成交解析
+  fetch    單一交易所完整獲取
+  scan     整輪掃描
+  alerts   警報規則評估
+  notify   Telegram 發送
+抽樣分析（可選）：對接下來 N 次掃描啟用 cProfile 或 tracemalloc，
+輸出 flamegraph.pl / speedscope 可讀的 collapsed stack 檔
+停用時 phase() 回傳共用的空 context manager，幾乎沒有額外負擔
+"""
+
+import cProfile
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+from config import PROFILE_DIR
+
+_NOOP = nullcontext()
+
+SAMPLE_MODES = ("cprofile", "tracemalloc")
+
+
+class _Phase:
+    __slots__ = ("stats", "key", "started")
+
+    def __init__(self, stats: Dict[Tuple[str, str], List[float]], key: Tuple[str, str]):
+        self.stats = stats
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        entry = self.stats.get(self.key)
+        if entry is None:
+            self.stats[self.key] = [1, elapsed, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+        return False
+
+
+def _collapsed_from_pstats(stats: pstats.Stats, max_depth: int = 64) -> List[str]:
+    """由 cProfile 呼叫圖重建 collapsed stack（依呼叫邊的累計時間比例分攤）"""
+    raw = stats.stats  # func -> (cc, nc, tt, ct, callers)
+    callees: Dict[tuple, List[Tuple[tuple, float]]] = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    def label(func) -> str:
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+    lines: Dict[str, float] = {}
+
+    def walk(func, path: List[str], fraction: float, seen: set):
+        _, _, tt, ct, _ = raw[func]
+        path = path + [label(func)]
+        if tt * fraction > 0:
+            key = ";".join(path)
+            lines[key] = lines.get(key, 0.0) + tt * fraction
+        if len(path) >= max_depth:
+            return
+        for child, edge_ct in callees.get(func, []):
+            child_ct = raw[child][3]
+            if child in seen or child_ct <= 0:
+                continue
+            walk(child, path, fraction * edge_ct / child_ct, seen | {child})
+
+    roots = [func for func, value in raw.items() if not value[4]]
+    for root in roots:
+        walk(root, [], 1.0, {root})
+
+    # 以微秒為樣本數
+    return [f"{stack} {int(seconds * 1e6)}" for stack, seconds in lines.items() if seconds * 1e6 >= 1]
+
+
+class ScanProfiler:
+    """掃描分段計時器（單一事件迴圈內使用）"""
+
+    def __init__(self, enabled: bool = False, output_dir: str = PROFILE_DIR):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.stats: Dict[Tuple[str, str], List[float]] = {}  # (phase, exchange) -> [次數, 總秒數, 最大秒數]
+        self.summary: Dict[str, Dict[str, float]] = {}
+        self.last_output: Optional[str] = None
+        self._sample_mode: Optional[str] = None
+        self._sample_ticks = 0
+        self._profile: Optional[cProfile.Profile] = None
+
+    def phase(self, name: str, exchange_id: str = "-"):
+        """計時區塊：with profiler.phase("network", "okx"): ..."""
+        if not self.enabled:
+            return _NOOP
+        return _Phase(self.stats, (name, exchange_id))
+
+    def reset(self):
+        self.stats.clear()
+        self.summary.clear()
+
+    def request_sample(self, mode: str = "cprofile", ticks: int = 10):
+        """對接下來 ticks 次掃描抽樣"""
+        if mode not in SAMPLE_MODES:
+            raise ValueError(f"未知抽樣模式: {mode}（可用: {', '.join(SAMPLE_MODES)}）")
+        self._sample_mode = mode
+        self._sample_ticks = ticks
+
+    @property
+    def sampling(self) -> bool:
+        return self._profile is not None or (self._sample_mode == "tracemalloc" and tracemalloc.is_tracing())
+
+    def begin_tick(self):
+        if self._sample_mode is None or self.sampling:
+            return
+        if self._sample_mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            tracemalloc.start(25)
+
+    def end_tick(self):
+        if self.enabled:
+            self._update_summary()
+        if not self.sampling:
+            return
+        self._sample_ticks -= 1
+        if self._sample_ticks > 0:
+            return
+
+        if self._profile is not None:
+            self._profile.disable()
+            self.last_output = self._write_cprofile(self._profile)
+            self._profile = None
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.last_output = self._write_tracemalloc(snapshot)
+        self._sample_mode = None
+        print(f"🔬 抽樣分析完成: {self.last_output}")
+
+    def _output_path(self, suffix: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, time.strftime(f"scan_%Y%m%d_%H%M%S.{suffix}"))
+
+    def _write_cprofile(self, profile: cProfile.Profile) -> str:
+        path = self._output_path("cprofile.folded")
+        profile.dump_stats(path.replace(".folded", ".prof"))  # 供 snakeviz / pstats 使用
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(_collapsed_from_pstats(pstats.Stats(profile))) + "\n")
+        return path
+
+    def _write_tracemalloc(self, snapshot: tracemalloc.Snapshot) -> str:
+        """以配置位元組數為樣本數"""
+        path = self._output_path("alloc.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stat in snapshot.statistics("traceback"):
+                stack = ";".join(f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in stat.traceback)
+                f.write(f"{stack} {stat.size}\n")
+        return path
+
+    def _update_summary(self):
+        """各階段平均/最大耗時（毫秒）與最慢交易所，供 STATUS 報告"""
+        phases: Dict[str, List] = {}
+        for (name, exchange_id), (count, total, peak) in self.stats.items():
+            entry = phases.setdefault(name, [0, 0.0, 0.0, None, 0.0])
+            entry[0] += count
+            entry[1] += total
+            entry[2] = max(entry[2], peak)
+            avg = total / count
+            if avg > entry[4]:
+                entry[3], entry[4] = exchange_id, avg
+        for name, (count, total, peak, slowest, _) in phases.items():
+            self.summary[name] = {
+                "avg_ms": round(total / count * 1000, 1),
+                "max_ms": round(peak * 1000, 1),
+                "slowest": slowest,
+            }
+
+    def report(self) -> str:
+        """各階段、各交易所耗時表"""
+        lines = [f"{'階段':10} {'交易所':10} {'次數':>6} {'平均ms':>9} {'最大ms':>9}"]
+        for (name, exchange_id), (count, total, peak) in sorted(self.stats.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:10} {exchange_id:10} {count:>6} {total / count * 1000:>9.1f} {peak * 1000:>9.1f}")
+        return "\n".join(lines)
+
+
+# 程序內共用的計時器，預設停用
+profiler = ScanProfiler()
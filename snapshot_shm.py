@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+共享記憶體快照發布
+掃描器每次掃描後把標準化結果寫入固定格式的 mmap 環形緩衝區，
+同機其他程序（測試腳本、Telegram Bot、儀表板）可直接讀取最近 N 次掃描，
+不需鎖、不需網絡請求
+
+檔案格式（小端序）：
+  檔頭   magic, 版本, 交易所數, 容量, 槽大小, 已寫入次數，之後為交易所ID表
+  每槽   seqlock 序號, 掃描序號, 掃描時間, 有效交易所數, 之後為每家交易所一筆記錄
+寫入時槽序號先變奇數、寫完再變偶數；讀取端序號前後一致且為偶數才算讀到完整數據
+"""
+
+import math
+import mmap
+import os
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from config import EXCHANGE_LIST, SNAPSHOT_SHM_PATH, SNAPSHOT_RING_SIZE
+
+MAGIC = b"DSKR"
+LAYOUT_VERSION = 1
+
+HEADER = struct.Struct("<4sHHIIQ")  # magic, version, n_exchanges, capacity, slot_size, write_count
+HEADER_SIZE = 64
+EXCHANGE_ID = struct.Struct("<16s")
+SLOT_HEADER = struct.Struct("<QQdH6x")  # seq, tick_no, tick_time, valid_count
+RECORD = struct.Struct("<BB6x9d")  # valid, color, open, high, low, close, volume, buy, sell, imbalance, vwap
+SEQ = struct.Struct("<Q")
+WRITE_COUNT_OFFSET = 16
+
+COLOR_FLAT, COLOR_RED, COLOR_GREEN = 0, 1, 2
+
+
+def default_shm_path() -> str:
+    """/dev/shm 不存在時（如 macOS）退回暫存目錄"""
+    directory = os.path.dirname(SNAPSHOT_SHM_PATH)
+    if os.path.isdir(directory):
+        return SNAPSHOT_SHM_PATH
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), os.path.basename(SNAPSHOT_SHM_PATH))
+
+
+@dataclass
+class ExchangeSnapshot:
+    """單一交易所的快照記錄"""
+    exchange_id: str
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    buy_volume: float
+    sell_volume: float
+    book_imbalance: Optional[float] = None
+    vwap: Optional[float] = None
+    is_red: bool = False
+    is_green: bool = False
+
+    @property
+    def buy_sell_ratio(self) -> float:
+        if self.sell_volume > 0:
+            return self.buy_volume / self.sell_volume
+        elif self.buy_volume > 0:
+            return 99.0
+        return 1.0
+
+
+@dataclass
+class TickSnapshot:
+    """單次掃描的快照"""
+    tick_no: int
+    tick_time: float  # Unix 時間戳
+    exchanges: Dict[str, ExchangeSnapshot] = field(default_factory=dict)
+
+
+def _layout(n_exchanges: int):
+    slot_size = SLOT_HEADER.size + RECORD.size * n_exchanges
+    slots_offset = HEADER_SIZE + EXCHANGE_ID.size * n_exchanges
+    return slot_size, slots_offset
+
+
+def _nan_if_none(value: Optional[float]) -> float:
+    return float("nan") if value is None else float(value)
+
+
+def _none_if_nan(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+class SnapshotPublisher:
+    """快照發布端（單一寫入者）"""
+
+    def __init__(self, path: Optional[str] = None, capacity: int = SNAPSHOT_RING_SIZE,
+                 exchanges: Optional[List[str]] = None):
+        self.path = path or default_shm_path()
+        self.capacity = capacity
+        self.exchanges = list(exchanges or EXCHANGE_LIST)
+        self.index = {ex_id: i for i, ex_id in enumerate(self.exchanges)}
+        self.slot_size, self.slots_offset = _layout(len(self.exchanges))
+        size = self.slots_offset + self.slot_size * capacity
+
+        # 固定大小檔案：已開啟的讀取端映射仍然有效
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self._mm[:size] = bytes(size)
+        HEADER.pack_into(self._mm, 0, MAGIC, LAYOUT_VERSION, len(self.exchanges),
+                         capacity, self.slot_size, 0)
+        for i, ex_id in enumerate(self.exchanges):
+            EXCHANGE_ID.pack_into(self._mm, HEADER_SIZE + i * EXCHANGE_ID.size, ex_id.encode())
+        self.write_count = 0
+
+    def publish(self, kline_data: Dict, tick_time: Optional[float] = None) -> int:
+        """寫入一次掃描結果（EnhancedKlineData 或 ExchangeSnapshot），回傳掃描序號"""
+        tick_no = self.write_count
+        offset = self.slots_offset + (tick_no % self.capacity) * self.slot_size
+        mm = self._mm
+
+        seq = SEQ.unpack_from(mm, offset)[0]
+        SEQ.pack_into(mm, offset, seq + 1)  # 奇數：寫入中
+
+        records_offset = offset + SLOT_HEADER.size
+        for i in range(len(self.exchanges)):
+            RECORD.pack_into(mm, records_offset + i * RECORD.size, 0, 0, *([0.0] * 9))
+        for ex_id, kline in kline_data.items():
+            i = self.index.get(ex_id)
+            if i is None:
+                continue
+            color = COLOR_RED if kline.is_red else COLOR_GREEN if kline.is_green else COLOR_FLAT
+            RECORD.pack_into(
+                mm, records_offset + i * RECORD.size, 1, color,
+                kline.open, kline.high, kline.low, kline.close, kline.volume,
+                kline.buy_volume, kline.sell_volume,
+                _nan_if_none(kline.book_imbalance), _nan_if_none(kline.vwap)
+            )
+
+        # 槽標頭其餘欄位在序號仍為奇數時寫入，偶數序號必須是最後一次寫入
+        SLOT_HEADER.pack_into(mm, offset, seq + 1, tick_no,
+                              tick_time if tick_time is not None else time.time(), len(kline_data))
+        SEQ.pack_into(mm, offset, seq + 2)
+        self.write_count += 1
+        struct.pack_into("<Q", mm, WRITE_COUNT_OFFSET, self.write_count)
+        return tick_no
+
+    def close(self):
+        self._mm.close()
+
+
+class SnapshotReader:
+    """快照讀取端：無鎖讀取最近 N 次掃描"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_shm_path()
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            self._mm = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+        magic, version, n_exchanges, capacity, slot_size, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            raise ValueError(f"快照檔格式不符: {self.path}")
+        self.capacity = capacity
+        self.slot_size, self.slots_offset = _layout(n_exchanges)
+        if self.slot_size != slot_size:
+            raise ValueError(f"快照檔槽大小不符: {self.path}")
+        self.exchanges = [
+            EXCHANGE_ID.unpack_from(self._mm, HEADER_SIZE + i * EXCHANGE_ID.size)[0].rstrip(b"\0").decode()
+            for i in range(n_exchanges)
+        ]
+
+    @property
+    def write_count(self) -> int:
+        return struct.unpack_from("<Q", self._mm, WRITE_COUNT_OFFSET)[0]
+
+    def _read_slot(self, tick_no: int, retries: int = 100) -> Optional[TickSnapshot]:
+        offset = self.slots_offset + (tick_no % self.capacity) * self.slot_size
+        mm = self._mm
+        for _ in range(retries):
+            seq, slot_tick, tick_time, _ = SLOT_HEADER.unpack_from(mm, offset)
+            if seq & 1:
+                continue  # 寫入中，重試
+            if slot_tick != tick_no or seq == 0:
+                return None  # 已被新一輪覆蓋或尚未寫入
+
+            snapshot = TickSnapshot(tick_no=tick_no, tick_time=tick_time)
+            records_offset = offset + SLOT_HEADER.size
+            for i, ex_id in enumerate(self.exchanges):
+                valid, color, *values = RECORD.unpack_from(mm, records_offset + i * RECORD.size)
+                if not valid:
+                    continue
+                snapshot.exchanges[ex_id] = ExchangeSnapshot(
+                    ex_id, *values[:7],
+                    book_imbalance=_none_if_nan(values[7]), vwap=_none_if_nan(values[8]),
+                    is_red=color == COLOR_RED, is_green=color == COLOR_GREEN
+                )
+
+            if SEQ.unpack_from(mm, offset)[0] == seq:
+                return snapshot
+        return None
+
+    def latest(self, n: int = 1) -> List[TickSnapshot]:
+        """最近 n 次掃描（由新到舊）"""
+        write_count = self.write_count
+        snapshots = []
+        for tick_no in range(write_count - 1, max(write_count - min(n, self.capacity), 0) - 1, -1):
+            snapshot = self._read_slot(tick_no)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        return snapshots
+
+    def wait_for_tick(self, after: int, timeout: float = 30.0, poll: float = 0.05) -> Optional[TickSnapshot]:
+        """輪詢等待掃描序號大於 after 的新快照"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.write_count - 1 > after:
+                latest = self.latest(1)
+                if latest:
+                    return latest[0]
+            time.sleep(poll)
+        return None
+
+    def close(self):
+        self._mm.close()
+
+
+def print_latest(n: int = 5):
+    """列印最近 n 次掃描"""
+    reader = SnapshotReader()
+    for snapshot in reader.latest(n):
+        tick_time = time.strftime("%H:%M:%S", time.localtime(snapshot.tick_time))
+        print(f"\n📸 掃描 #{snapshot.tick_no} ({tick_time})")
+        for ex_id, ex in snapshot.exchanges.items():
+            print(f"  {ex_id:10} ${ex.close:.5f} {'🔴' if ex.is_red else '🟢'} 買/賣: {ex.buy_sell_ratio:.2f}")
+    reader.close()
+
+if __name__ == "__main__":
+    import sys
+    print_latest(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+跨交易所價差監控
+同一交易對已在多家交易所掃描，合併後可直接看出：
+  - 套利價差 (SPREAD_ARB)：在最低賣價的交易所買入、最高買價的交易所賣出，
+    扣除雙邊吃單手續費後淨價差 ≥ SPREAD_ARB_THRESHOLD
+  - 價格偏離 (PRICE_DEVIATION)：某交易所收盤價偏離跨交易所中位數 ≥ PRICE_DEVIATION_THRESHOLD
+每個交易對的各交易所買價 / 賣價分別以索引堆積維護（依含手續費的實際成交價排序），
+單一交易所報價變更為 O(log n)，查詢最優與次優報價為 O(1)；超過 SPREAD_MAX_QUOTE_AGE 秒未更新的報價會移除
+門檻於每次評估時讀取（設定熱重載後立即生效）
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    EXCHANGES, TAKER_FEES,
+    SPREAD_ARB_THRESHOLD, SPREAD_USE_LAST_PRICE, SPREAD_MAX_QUOTE_AGE,
+    PRICE_DEVIATION_THRESHOLD, PRICE_DEVIATION_MIN_VENUES, SPREAD_ALERT_COOLDOWN,
+    format_taiwan_time
+)
+
+
+def _name(exchange_id: str) -> str:
+    return EXCHANGES.get(exchange_id, {}).get('name', exchange_id)
+
+
+def _fee(exchange_id: str) -> float:
+    return TAKER_FEES.get(exchange_id, max(TAKER_FEES.values(), default=0.0))
+
+
+class IndexedHeap:
+    """以鍵索引的二元堆積：插入、更新、刪除任一鍵 O(log n)，最優值 O(1)
+
+    largest_first=True 時堆頂為最大值（買價），否則為最小值（賣價）
+    """
+
+    __slots__ = ("_sign", "_heap", "_pos")
+
+    def __init__(self, largest_first: bool = False):
+        self._sign = -1.0 if largest_first else 1.0
+        self._heap: List[Tuple[float, str]] = []  # (sign × 價格, 鍵)
+        self._pos: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._pos
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._pos[heap[i][1]] = i
+        self._pos[heap[j][1]] = j
+
+    def _sift_up(self, i: int):
+        while i:
+            parent = (i - 1) // 2
+            if self._heap[i][0] >= self._heap[parent][0]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int):
+        size = len(self._heap)
+        while True:
+            best = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and self._heap[child][0] < self._heap[best][0]:
+                    best = child
+            if best == i:
+                return
+            self._swap(i, best)
+            i = best
+
+    def set(self, key: str, value: float):
+        """插入或更新鍵的值"""
+        entry = (self._sign * value, key)
+        i = self._pos.get(key)
+        if i is None:
+            self._heap.append(entry)
+            self._pos[key] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+            return
+        old = self._heap[i][0]
+        self._heap[i] = entry
+        if entry[0] < old:
+            self._sift_up(i)
+        else:
+            self._sift_down(i)
+
+    def remove(self, key: str):
+        i = self._pos.pop(key, None)
+        if i is None:
+            return
+        last = self._heap.pop()
+        if i == len(self._heap):
+            return
+        self._heap[i] = last
+        self._pos[last[1]] = i
+        self._sift_up(i)
+        self._sift_down(self._pos[last[1]])
+
+    def best(self, exclude: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """最優的 (鍵, 值)；exclude 為堆頂時回傳次優（堆頂的子節點之一）"""
+        heap = self._heap
+        if not heap:
+            return None
+        if heap[0][1] != exclude:
+            return heap[0][1], self._sign * heap[0][0]
+        children = heap[1:3]
+        if not children:
+            return None
+        value, key = min(children)
+        return key, self._sign * value
+
+
+@dataclass
+class SymbolQuotes:
+    """單一交易對在各交易所的報價
+
+    堆積以扣除手續費後的實際成交價排序（賣出得 bid × (1 - 費率)、買入付 ask × (1 + 費率)），
+    手續費不同時淨價差最大的組合仍在堆頂；原始報價另存於 prices
+    """
+    bids: IndexedHeap = field(default_factory=lambda: IndexedHeap(largest_first=True))
+    asks: IndexedHeap = field(default_factory=IndexedHeap)
+    prices: Dict[str, Tuple[Optional[float], Optional[float]]] = field(default_factory=dict)  # 交易所 -> (bid, ask)
+    closes: Dict[str, float] = field(default_factory=dict)
+    updated: Dict[str, float] = field(default_factory=dict)  # 交易所 -> 最後更新時間（Unix 秒）
+
+    def update(self, exchange_id: str, bid: Optional[float], ask: Optional[float], close: float, now: float):
+        self.closes[exchange_id] = close
+        self.updated[exchange_id] = now
+        self.prices[exchange_id] = (bid, ask)
+        fee = _fee(exchange_id)
+        for heap, value in ((self.bids, None if bid is None else bid * (1 - fee)),
+                            (self.asks, None if ask is None else ask * (1 + fee))):
+            if value is None:
+                heap.remove(exchange_id)
+            else:
+                heap.set(exchange_id, value)
+
+    def remove(self, exchange_id: str):
+        self.bids.remove(exchange_id)
+        self.asks.remove(exchange_id)
+        self.prices.pop(exchange_id, None)
+        self.closes.pop(exchange_id, None)
+        self.updated.pop(exchange_id, None)
+
+    def expire(self, now: float, max_age: float):
+        for exchange_id in [ex_id for ex_id, at in self.updated.items() if now - at > max_age]:
+            self.remove(exchange_id)
+
+
+class SpreadMonitor:
+    """各交易對的跨交易所最優報價、套利價差與價格偏離"""
+
+    def __init__(self):
+        self.quotes: Dict[str, SymbolQuotes] = {}
+        self._last_alert: Dict[Tuple[str, ...], float] = {}  # 警報鍵 -> 上次警報時間
+        self.stats = {"updates": 0, "arb_alerts": 0, "deviation_alerts": 0, "suppressed": 0,
+                      "best_net_spread": None}
+
+    def update(self, symbol: str, exchange_id: str, bid: Optional[float], ask: Optional[float],
+               close: float, now: float):
+        """記錄交易所的最新報價（無買賣報價時依 SPREAD_USE_LAST_PRICE 以收盤價代替）"""
+        if bid is None or ask is None:
+            bid = ask = close if SPREAD_USE_LAST_PRICE else None
+        book = self.quotes.get(symbol)
+        if book is None:
+            book = self.quotes[symbol] = SymbolQuotes()
+        book.update(exchange_id, bid, ask, close, now)
+        self.stats['updates'] += 1
+
+    def best_spread(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """扣除手續費後淨價差最大的 (買入交易所, 賣出交易所)；少於兩家有報價時為 None"""
+        book = self.quotes.get(symbol)
+        if book is None or len(book.bids) < 2 or len(book.asks) < 2:
+            return None
+        top_bid, top_ask = book.bids.best()[0], book.asks.best()[0]
+        if top_bid != top_ask:
+            candidates = [(top_ask, top_bid)]
+        else:
+            # 最高買價與最低賣價在同一家：比較次優組合
+            candidates = [(book.asks.best(exclude=top_ask)[0], top_bid),
+                          (top_ask, book.bids.best(exclude=top_bid)[0])]
+        best = None
+        for buy_ex, sell_ex in candidates:
+            ask, bid = book.prices[buy_ex][1], book.prices[sell_ex][0]
+            # 淨價差 = 賣出實得 / 買入實付 - 1，與堆積的排序一致
+            net = bid * (1 - _fee(sell_ex)) / (ask * (1 + _fee(buy_ex))) - 1
+            if best is None or net > best["net_spread"]:
+                best = {"buy_exchange": buy_ex, "sell_exchange": sell_ex, "buy_price": ask, "sell_price": bid,
+                        "gross_spread": bid / ask - 1, "fees": _fee(buy_ex) + _fee(sell_ex), "net_spread": net}
+        return best
+
+    def deviations(self, symbol: str, exchanges: Optional[List[str]] = None) -> Tuple[Optional[float], List[Tuple[str, float]]]:
+        """跨交易所收盤價中位數，以及偏離中位數超過門檻的 (交易所, 偏離比例)"""
+        book = self.quotes.get(symbol)
+        if book is None or len(book.closes) < PRICE_DEVIATION_MIN_VENUES:
+            return None, []
+        closes = sorted(book.closes.values())
+        middle = len(closes) // 2
+        median = closes[middle] if len(closes) % 2 else (closes[middle - 1] + closes[middle]) / 2
+        if median <= 0:
+            return None, []
+        outliers = []
+        for exchange_id in exchanges if exchanges is not None else book.closes:
+            deviation = book.closes[exchange_id] / median - 1
+            if abs(deviation) >= PRICE_DEVIATION_THRESHOLD:
+                outliers.append((exchange_id, deviation))
+        return median, outliers
+
+    def cooldowns(self, now: float) -> List[Tuple[List[str], float]]:
+        """仍在冷卻中的 (警報鍵, 上次警報時間)，可序列化（多節點換手時交給新領導者）"""
+        return [(list(key), at) for key, at in self._last_alert.items() if now - at < SPREAD_ALERT_COOLDOWN]
+
+    def restore_cooldowns(self, entries: List[Tuple[List[str], float]]):
+        """併入 cooldowns() 的結果（保留較晚的警報時間）"""
+        for key, at in entries:
+            key = tuple(key)
+            self._last_alert[key] = max(at, self._last_alert.get(key, at))
+
+    def _cooled_down(self, key: Tuple[str, ...], now: float) -> bool:
+        last = self._last_alert.get(key)
+        if last is not None and now - last < SPREAD_ALERT_COOLDOWN:
+            self.stats['suppressed'] += 1
+            return False
+        self._last_alert[key] = now
+        return True
+
+    def on_tick(self, kline_data: Dict[str, Any], scan_time: datetime) -> List[Tuple[str, Dict[str, Any]]]:
+        """加入一次掃描結果，回傳本輪的 (警報類型, 警報數據)"""
+        now = scan_time.timestamp()
+        touched: Dict[str, List[str]] = {}
+        for exchange_id, kline in kline_data.items():
+            if kline.close <= 0:
+                continue
+            self.update(kline.symbol, exchange_id, kline.bid, kline.ask, kline.close, now)
+            touched.setdefault(kline.symbol, []).append(exchange_id)
+
+        alerts = []
+        kline_time = format_taiwan_time(scan_time, "%H:%M:%S")
+        for symbol, exchanges in touched.items():
+            self.quotes[symbol].expire(now, SPREAD_MAX_QUOTE_AGE)
+
+            spread = self.best_spread(symbol)
+            if spread is not None:
+                best = self.stats['best_net_spread']
+                self.stats['best_net_spread'] = round(max(best if best is not None else -1.0, spread['net_spread']), 5)
+                key = ("SPREAD_ARB", symbol, spread['buy_exchange'], spread['sell_exchange'])
+                if spread['net_spread'] >= SPREAD_ARB_THRESHOLD and self._cooled_down(key, now):
+                    self.stats['arb_alerts'] += 1
+                    alerts.append(("SPREAD_ARB", dict(
+                        spread, exchange=f"{_name(spread['buy_exchange'])} → {_name(spread['sell_exchange'])}",
+                        symbol=symbol, price=spread['buy_price'], kline_time=kline_time,
+                        buy_exchange=_name(spread['buy_exchange']), sell_exchange=_name(spread['sell_exchange']),
+                    )))
+
+            median, outliers = self.deviations(symbol, [ex_id for ex_id in exchanges if ex_id in self.quotes[symbol].closes])
+            for exchange_id, deviation in outliers:
+                if not self._cooled_down(("PRICE_DEVIATION", symbol, exchange_id), now):
+                    continue
+                self.stats['deviation_alerts'] += 1
+                alerts.append(("PRICE_DEVIATION", {
+                    "exchange": _name(exchange_id), "symbol": symbol,
+                    "price": self.quotes[symbol].closes[exchange_id], "median": median,
+                    "deviation": deviation, "venues": len(self.quotes[symbol].closes), "kline_time": kline_time,
+                }))
+        return alerts
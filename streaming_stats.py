@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+買賣失衡的串流統計
+每個 (交易對, 交易所) 一組狀態：Welford 累計均值/變異數與 EWMA 均值/變異數（z 分數），
+以及最近 FLOW_PERCENTILE_WINDOW 次掃描的數值（實際百分位，不假設常態；訊號有上下限且常集中在上限），
+每次掃描更新一次，用於取代固定的買賣比閾值
+狀態定期寫入檢查點，重啟後不需重新暖機
+"""
+
+import json
+import math
+import os
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from config import FLOW_EWMA_ALPHA, FLOW_STATS_FILE, ADAPTIVE_MIN_SAMPLES, FLOW_PERCENTILE_WINDOW
+from radar_logging import get_logger
+
+logger = get_logger("flow_stats")
+
+MAX_FLOW_RATIO = 99.0  # 與 buy_sell_ratio 單邊為零時的上限一致
+
+StreamKey = Tuple[str, str]  # (symbol, exchange_id)
+
+
+def flow_signal(kline) -> Optional[float]:
+    """買賣失衡訊號：log(買量/賣量)，買賣對稱；無成交數據時回傳 None"""
+    buy, sell = kline.buy_volume, kline.sell_volume
+    if buy <= 0 and sell <= 0:
+        return None
+    ratio = buy / sell if sell > 0 else MAX_FLOW_RATIO
+    ratio = min(max(ratio, 1 / MAX_FLOW_RATIO), MAX_FLOW_RATIO)
+    return math.log(ratio)
+
+
+class StreamStats:
+    """單一串流的統計狀態（5個數值與最近數值的視窗）"""
+
+    __slots__ = ("n", "mean", "m2", "ew_mean", "ew_var", "recent", "ranked")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0,
+                 ew_mean: float = 0.0, ew_var: float = 0.0, recent: Optional[List[float]] = None):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+        self.ew_mean = ew_mean
+        self.ew_var = ew_var
+        self.recent: Deque[float] = deque(recent or ())  # 依時間
+        self.ranked: List[float] = sorted(self.recent)  # 依數值
+
+    def update(self, x: float, alpha: float = FLOW_EWMA_ALPHA):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+        if self.n == 1:
+            self.ew_mean = x
+            self.ew_var = 0.0
+        else:
+            ew_delta = x - self.ew_mean
+            self.ew_mean += alpha * ew_delta
+            self.ew_var = (1 - alpha) * (self.ew_var + alpha * ew_delta * ew_delta)
+
+        self.recent.append(x)
+        insort(self.ranked, x)
+        while len(self.recent) > FLOW_PERCENTILE_WINDOW:
+            del self.ranked[bisect_left(self.ranked, self.recent.popleft())]
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    @property
+    def ew_std(self) -> float:
+        return math.sqrt(self.ew_var)
+
+    def zscore(self, x: float) -> Optional[float]:
+        """相對 EWMA 分佈的 z 分數（跟隨時段變化）；EWMA 尚無變異時用累計標準差"""
+        std = self.ew_std or self.std
+        if std <= 0:
+            return None
+        return (x - self.ew_mean) / std
+
+    def percentile(self, x: float) -> Optional[float]:
+        """x 在最近 FLOW_PERCENTILE_WINDOW 次掃描中的百分位（0~1，相同數值取中間名次）"""
+        if not self.ranked:
+            return None
+        return (bisect_left(self.ranked, x) + bisect_right(self.ranked, x)) / (2 * len(self.ranked))
+
+    def to_list(self) -> list:
+        return [self.n, self.mean, self.m2, self.ew_mean, self.ew_var, list(self.recent)]
+
+
+class FlowScore:
+    """單次掃描的異常程度"""
+
+    __slots__ = ("value", "zscore", "percentile", "samples")
+
+    def __init__(self, value: float, zscore: Optional[float], percentile: Optional[float], samples: int):
+        self.value = value
+        self.zscore = zscore
+        self.percentile = percentile
+        self.samples = samples
+
+    @property
+    def warmed_up(self) -> bool:
+        return self.samples >= ADAPTIVE_MIN_SAMPLES and self.zscore is not None
+
+
+class FlowStatsStore:
+    """所有串流的統計狀態與檢查點"""
+
+    def __init__(self, path: str = FLOW_STATS_FILE, alpha: float = FLOW_EWMA_ALPHA):
+        self.path = path
+        self.alpha = alpha
+        self.streams: Dict[StreamKey, StreamStats] = {}
+
+    def __len__(self) -> int:
+        return len(self.streams)
+
+    def get(self, symbol: str, exchange_id: str) -> StreamStats:
+        key = (symbol, exchange_id)
+        stats = self.streams.get(key)
+        if stats is None:
+            stats = self.streams[key] = StreamStats()
+        return stats
+
+    def score_and_update(self, symbol: str, exchange_id: str, value: Optional[float]) -> Optional[FlowScore]:
+        """先以更新前的分佈評分，再把本次數值納入統計"""
+        if value is None:
+            return None
+        stats = self.get(symbol, exchange_id)
+        # 舊檢查點載入後視窗從零累積，樣本不足前不給百分位
+        percentile = stats.percentile(value) if len(stats.ranked) >= ADAPTIVE_MIN_SAMPLES else None
+        score = FlowScore(value, stats.zscore(value), percentile, stats.n)
+        stats.update(value, self.alpha)
+        return score
+
+    @classmethod
+    def load(cls, path: str = FLOW_STATS_FILE, alpha: float = FLOW_EWMA_ALPHA) -> "FlowStatsStore":
+        """讀取檢查點；檔案不存在或損壞時從零開始"""
+        store = cls(path, alpha)
+        if not os.path.exists(path):
+            return store
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            for symbol, exchange_id, *values in saved.get('streams', []):
+                # 舊檢查點沒有最近數值的視窗：百分位從零累積
+                recent = [float(x) for x in values[5]] if len(values) > 5 else None
+                store.streams[(symbol, exchange_id)] = StreamStats(int(values[0]), *map(float, values[1:5]),
+                                                                   recent=recent)
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("⚠️  買賣失衡統計讀取失敗，重新累計: %s", e, extra={"path": path})
+        return store
+
+    def save(self):
+        """每個串流一列 [symbol, exchange, n, mean, m2, ew_mean, ew_var, [最近數值]]"""
+        tmp_path = f"{self.path}.tmp"
+        rows = [[symbol, exchange_id, *stats.to_list()] for (symbol, exchange_id), stats in self.streams.items()]
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"alpha": self.alpha, "streams": rows}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Telegram 指令介面
+在監控程序的事件迴圈內以 getUpdates 長輪詢接收指令，
+回覆一律取自 RadarState 的最新快照與統計，不觸發任何交易所請求
+
+指令:
+  /status            系統狀態報告
+  /price [交易所]     最新價格（未指定時列出全部）
+  /ratio             各交易所買賣比
+  /mute [分鐘]        靜音警報推送（預設30分鐘，0 = 解除）
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+import aiohttp
+
+from config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_COMMAND_CHATS,
+    TELEGRAM_OFFSET_FILE, TELEGRAM_POLL_TIMEOUT, TELEGRAM_REPLY_CONCURRENCY,
+    TELEGRAM_DEFAULT_MUTE_MINUTES, EXCHANGES, SYMBOL, TAIWAN_TZ,
+    format_taiwan_time
+)
+from radar_logging import get_logger
+from radar_state import RadarState
+from telegram_bot import bot
+
+logger = get_logger("telegram")
+
+HELP_TEXT = """🤖 <b>可用指令</b>
+/status - 系統狀態報告
+/price [交易所] - 最新價格
+/ratio - 各交易所買賣比
+/mute [分鐘] - 靜音警報（0 = 解除）"""
+
+
+def _find_exchange(name: str) -> Optional[str]:
+    """以交易所ID或顯示名稱（不分大小寫）查找"""
+    key = name.lower().replace(".", "")
+    for ex_id, config in EXCHANGES.items():
+        if key in (ex_id, config['name'].lower().replace(".", "")):
+            return ex_id
+    return None
+
+
+class TelegramCommandHandler:
+    """getUpdates 長輪詢指令處理器"""
+
+    def __init__(self, state: RadarState, token: Optional[str] = TELEGRAM_BOT_TOKEN,
+                 offset_file: str = TELEGRAM_OFFSET_FILE):
+        self.state = state
+        self.base_url = f"https://api.telegram.org/bot{token}"
+        self.offset_file = offset_file
+        self.offset = self._load_offset()
+        self.allowed_chats = {str(chat) for chat in [TELEGRAM_CHAT_ID, *TELEGRAM_COMMAND_CHATS] if chat}
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._reply_slots = asyncio.Semaphore(TELEGRAM_REPLY_CONCURRENCY)
+        self._reply_tasks: set = set()
+        # 同一次掃描內相同指令共用已組好的回覆
+        self._reply_cache: Dict[Tuple[str, str], Tuple[int, str]] = {}
+        self.commands: Dict[str, Callable[[str], str]] = {
+            "status": self.cmd_status,
+            "price": self.cmd_price,
+            "ratio": self.cmd_ratio,
+            "mute": self.cmd_mute,
+            "start": self.cmd_help,
+            "help": self.cmd_help,
+        }
+        self.stats = {"updates": 0, "commands": 0, "replies": 0, "ignored": 0, "errors": 0}
+
+    # ---------- 更新偏移 ----------
+
+    def _load_offset(self) -> int:
+        try:
+            with open(self.offset_file, "r", encoding="utf-8") as f:
+                return int(json.load(f).get("offset", 0))
+        except (OSError, ValueError):
+            return 0
+
+    def _save_offset(self):
+        tmp_path = f"{self.offset_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"offset": self.offset, "updated_at": time.time()}, f)
+        os.replace(tmp_path, self.offset_file)
+
+    # ---------- 指令 ----------
+
+    def cmd_help(self, args: str) -> str:
+        return HELP_TEXT
+
+    def cmd_status(self, args: str) -> str:
+        return bot.create_system_message("STATUS", self.state.status_data())
+
+    def _no_data(self) -> Optional[str]:
+        if not self.state.latest:
+            return "⏳ 尚未完成第一次掃描"
+        return None
+
+    def _scan_time(self) -> str:
+        return self.state.latest_tick['time'] if self.state.latest_tick else "N/A"
+
+    def cmd_price(self, args: str) -> str:
+        no_data = self._no_data()
+        if no_data:
+            return no_data
+        if args:
+            ex_id = _find_exchange(args.split()[0])
+            if ex_id is None:
+                return f"❌ 未知交易所: {args.split()[0]}"
+            if ex_id not in self.state.latest:
+                return f"❌ {EXCHANGES[ex_id]['name']} 最近一次掃描無數據"
+            targets = [ex_id]
+        else:
+            targets = list(self.state.latest)
+
+        lines = [f"💰 <b>{SYMBOL} 最新價格</b>"]
+        for ex_id in targets:
+            kline = self.state.latest[ex_id]
+            lines.append(f"  • {EXCHANGES[ex_id]['name']}: ${kline.close:.5f} {'🔴' if kline.is_red else '🟢'}")
+        lines.append(f"⏰ 掃描時間: {self._scan_time()}")
+        return "\n".join(lines)
+
+    def cmd_ratio(self, args: str) -> str:
+        no_data = self._no_data()
+        if no_data:
+            return no_data
+        lines = [f"📊 <b>{SYMBOL} 買賣比</b>"]
+        for ex_id, kline in self.state.latest.items():
+            if kline.buy_volume <= 0 and kline.sell_volume <= 0:
+                continue
+            line = f"  • {EXCHANGES[ex_id]['name']}: 買/賣 {kline.buy_sell_ratio:.2f}"
+            if kline.book_imbalance is not None:
+                line += f"，盤口 {kline.book_imbalance:+.2f}"
+            lines.append(line)
+        lines.append(f"⏰ 掃描時間: {self._scan_time()}")
+        return "\n".join(lines)
+
+    def cmd_mute(self, args: str) -> str:
+        try:
+            minutes = float(args.split()[0]) if args else TELEGRAM_DEFAULT_MUTE_MINUTES
+        except ValueError:
+            return "❌ 用法: /mute [分鐘]"
+        self.state.mute(minutes)
+        if not self.state.is_muted:
+            return "🔔 已解除靜音"
+        until = format_taiwan_time(datetime.fromtimestamp(self.state.muted_until, TAIWAN_TZ), "%H:%M")
+        return f"🔕 警報已靜音 {minutes:g} 分鐘（至 {until}），期間警報仍會記錄"
+
+    # ---------- 處理與回覆 ----------
+
+    def handle_text(self, text: str) -> Optional[str]:
+        """解析指令並組出回覆（非指令回傳 None）"""
+        if not text.startswith("/"):
+            return None
+        head, _, args = text[1:].partition(" ")
+        command = head.split("@", 1)[0].lower()
+        handler = self.commands.get(command)
+        if handler is None:
+            return None
+        self.stats['commands'] += 1
+
+        args = args.strip()
+        if command == "mute":
+            return handler(args)  # 有副作用，不快取
+
+        cache_key = (command, args.lower())
+        cached = self._reply_cache.get(cache_key)
+        if cached is not None and cached[0] == self.state.tick_no:
+            return cached[1]
+        reply = handler(args)
+        if len(self._reply_cache) > 256:
+            self._reply_cache.clear()
+        self._reply_cache[cache_key] = (self.state.tick_no, reply)
+        return reply
+
+    async def _send_reply(self, chat_id, text: str, reply_to: Optional[int]):
+        async with self._reply_slots:
+            payload = {
+                "chat_id": chat_id,
+                "text": text,
+                "parse_mode": "HTML",
+                "disable_web_page_preview": True,
+            }
+            if reply_to is not None:
+                payload["reply_to_message_id"] = reply_to
+            try:
+                async with self.session.post(f"{self.base_url}/sendMessage", json=payload,
+                                             timeout=aiohttp.ClientTimeout(total=15)) as response:
+                    if response.status == 200:
+                        self.stats['replies'] += 1
+                    else:
+                        self.stats['errors'] += 1
+                        logger.error("❌ Telegram 回覆失敗: HTTP %s", response.status,
+                                     extra={"chat_id": chat_id, "status": response.status})
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.stats['errors'] += 1
+                logger.error("❌ Telegram 回覆失敗: %s", e, extra={"chat_id": chat_id, "error": type(e).__name__})
+
+    def process_update(self, update: Dict):
+        """處理單一更新，回覆以背景任務並發送出"""
+        self.stats['updates'] += 1
+        message = update.get("message") or update.get("edited_message")
+        if not message or "text" not in message:
+            return
+        chat_id = str(message["chat"]["id"])
+        if chat_id not in self.allowed_chats:
+            self.stats['ignored'] += 1
+            return
+        reply = self.handle_text(message["text"])
+        if reply is None:
+            return
+        task = asyncio.create_task(self._send_reply(chat_id, reply, message.get("message_id")))
+        self._reply_tasks.add(task)
+        task.add_done_callback(self._reply_tasks.discard)
+
+    async def poll_once(self):
+        params = {"timeout": TELEGRAM_POLL_TIMEOUT, "allowed_updates": json.dumps(["message", "edited_message"])}
+        if self.offset:
+            params["offset"] = self.offset
+        async with self.session.get(f"{self.base_url}/getUpdates", params=params,
+                                    timeout=aiohttp.ClientTimeout(total=TELEGRAM_POLL_TIMEOUT + 10)) as response:
+            data = await response.json(content_type=None)
+        if not data.get("ok"):
+            raise RuntimeError(data.get("description", "getUpdates 失敗"))
+
+        updates = data.get("result", [])
+        for update in updates:
+            self.process_update(update)
+            self.offset = update["update_id"] + 1
+        if updates:
+            self._save_offset()
+
+    async def run_forever(self):
+        """長輪詢直到被取消，失敗時退避重試"""
+        backoff = 1
+        async with aiohttp.ClientSession() as session:
+            self.session = session
+            logger.info("💬 Telegram 指令介面已啟動（%d 個聊天室）", len(self.allowed_chats))
+            try:
+                while True:
+                    try:
+                        await self.poll_once()
+                        backoff = 1
+                    except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError, ValueError) as e:
+                        logger.warning("⚠️  getUpdates 失敗: %s，%d秒後重試", e, backoff,
+                                       extra={"error": type(e).__name__, "backoff": backoff})
+                        await asyncio.sleep(backoff)
+                        backoff = min(backoff * 2, 60)
+            finally:
+                if self._reply_tasks:
+                    await asyncio.gather(*self._reply_tasks, return_exceptions=True)
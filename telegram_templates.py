@@ -0,0 +1,790 @@
+#!/usr/bin/env python3
+"""
+Telegram 訊息模板
+每種訊息的固定文字以 str.format 格式字串定義（各語系一份），第一次用到某個
+(語系, 訊息類型, 交易所, 交易對) 時把固定文字、交易所名稱、交易對與 hashtag 預先填入，
+快取為只剩動態欄位的格式字串；之後每則警報只計算數值欄位，再以一次 format_map 組成訊息：
+  - 警報時間 / 日期每秒只計算一次，render_batch 一輪掃描的所有警報共用同一個時間
+  - 切換語系（TELEGRAM_LOCALE）只是改用另一組已編譯的模板，不重新產生固定文字
+  - 門檻等可熱重載的設定一律當作動態欄位，不會被快取在模板裡
+"""
+
+import time
+from datetime import datetime
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import (
+    TAIWAN_TZ, TELEGRAM_LOCALE, TELEGRAM_TEMPLATE_CACHE_SIZE,
+    BUY_SELL_THRESHOLD, LARGE_TRADE_QUANTILE, SPREAD_ARB_THRESHOLD, PRICE_DEVIATION_THRESHOLD,
+    format_taiwan_time
+)
+
+DEFAULT_LOCALE = "zh-TW"
+# 編譯時預先填入的欄位（同一交易所 / 交易對的警報共用）
+STATIC_FIELDS = ("symbol", "exchange", "exchange_tag", "buy_exchange", "sell_exchange", "buy_tag", "sell_tag")
+
+LOCALES: Dict[str, Dict[str, Dict[str, str]]] = {
+    "zh-TW": {
+        "templates": {
+            "BUY_IN_RED": """
+🚨 <b>異常買入警報 - {symbol}</b>
+
+🏦 <b>交易所:</b> {exchange}
+📉 <b>K線類型:</b> 陰線下跌{timeframe}
+💰 <b>當前價格:</b> ${price:.6f}
+
+📊 <b>買賣分析:</b>
+  買入量: {buy_volume:,.2f}
+  賣出量: {sell_volume:,.2f}
+  買入比率: {buy_percentage:.1f}%
+  買/賣比: {buy_ratio:.2f}{detail_lines}
+
+📈 <b>成交量:</b> {volume:,.0f}
+🎯 <b>觸發條件:</b> {condition}
+
+⚠️ <b>警報說明:</b>
+陰線下跌中檢測到異常大量買單！
+這可能表示有大戶在低價吸籌。
+
+⏰ <b>數據時間:</b> {kline_time}
+📡 <b>警報時間:</b> {alert_time} (台灣時間)
+🌍 <b>多交易所監控系統</b>
+📅 <b>日期:</b> {date}
+
+#DUSK #買入警報 #{exchange_tag}
+""",
+            "SELL_IN_GREEN": """
+🚨 <b>異常賣出警報 - {symbol}</b>
+
+🏦 <b>交易所:</b> {exchange}
+📈 <b>K線類型:</b> 陽線上漲{timeframe}
+💰 <b>當前價格:</b> ${price:.6f}
+
+📊 <b>買賣分析:</b>
+  買入量: {buy_volume:,.2f}
+  賣出量: {sell_volume:,.2f}
+  賣出比率: {sell_percentage:.1f}%
+  賣/買比: {sell_ratio:.2f}{detail_lines}
+
+📈 <b>成交量:</b> {volume:,.0f}
+🎯 <b>觸發條件:</b> {condition}
+
+⚠️ <b>警報說明:</b>
+陽線上漲中檢測到異常大量賣單！
+這可能表示有大戶在高價出貨。
+
+⏰ <b>數據時間:</b> {kline_time}
+📡 <b>警報時間:</b> {alert_time} (台灣時間)
+🌍 <b>多交易所監控系統</b>
+📅 <b>日期:</b> {date}
+
+#DUSK #賣出警報 #{exchange_tag}
+""",
+            "LARGE_TRADE": """
+🐋 <b>大額成交警報 - {symbol}</b>
+
+🏦 <b>交易所:</b> {exchange}
+📌 <b>方向:</b> {side}
+💰 <b>成交價格:</b> ${trade_price:.6f}
+📦 <b>成交數量:</b> {qty:,.0f}
+💵 <b>成交額:</b> ${notional:,.0f}
+
+📊 <b>規模分析:</b>
+  百分位: {percentile:.2%}
+  門檻（p{quantile:g}）: ${threshold:,.0f}{whale_line}
+
+⏰ <b>成交時間:</b> {kline_time}
+📡 <b>警報時間:</b> {alert_time} (台灣時間)
+🌍 <b>多交易所監控系統</b>
+📅 <b>日期:</b> {date}
+
+#DUSK #大額成交 #{exchange_tag}
+""",
+            "SPREAD_ARB": """
+💱 <b>跨交易所價差警報 - {symbol}</b>
+
+🟢 <b>買入:</b> {buy_exchange} ${buy_price:.6f}
+🔴 <b>賣出:</b> {sell_exchange} ${sell_price:.6f}
+
+📊 <b>價差分析:</b>
+  毛價差: {gross_spread:.2%}
+  雙邊手續費: {fees:.2%}
+  淨價差: {net_spread:.2%}
+
+🎯 <b>觸發條件:</b> 淨價差 ≥ {threshold:.2%}
+
+⏰ <b>數據時間:</b> {kline_time}
+📡 <b>警報時間:</b> {alert_time} (台灣時間)
+🌍 <b>多交易所監控系統</b>
+📅 <b>日期:</b> {date}
+
+#DUSK #價差警報 #{buy_tag} #{sell_tag}
+""",
+            "PRICE_DEVIATION": """
+📐 <b>價格偏離警報 - {symbol}</b>
+
+🏦 <b>交易所:</b> {exchange}
+💰 <b>當前價格:</b> ${price:.6f}
+⚖️ <b>跨所中位數:</b> ${median:.6f}（{venues} 家）
+{direction}中位數 {deviation:.2%}
+
+🎯 <b>觸發條件:</b> 偏離 ≥ {threshold:.2%}
+
+⏰ <b>數據時間:</b> {kline_time}
+📡 <b>警報時間:</b> {alert_time} (台灣時間)
+🌍 <b>多交易所監控系統</b>
+📅 <b>日期:</b> {date}
+
+#DUSK #價格偏離 #{exchange_tag}
+""",
+            "START": """
+🤖 <b>DUSK/USDT 多交易所監控系統啟動</b>
+
+✅ <b>系統狀態:</b> 已啟動並開始實時監控
+🏦 <b>監控交易所:</b> {exchange_count} 家
+📊 <b>交易對:</b> {pair}
+⏰ <b>時間框架:</b> {timeframe} K線
+🔄 <b>掃描頻率:</b> 每15秒（台灣時間 00、15、30、45秒）
+🔔 <b>通知模式:</b> 僅異常時發送
+⏱️  <b>警報冷卻:</b> {cooldown}秒
+
+🎯 <b>警報條件:</b>
+1. 陰線但大量買入（買/賣比 > {threshold}）
+2. 陽線但大量賣出（賣/買比 > {threshold}）
+
+⏰ <b>啟動時間:</b> {now} (台灣時間)
+🌍 <b>多交易所監控系統</b>
+📅 <b>系統版本:</b> 增強版 v2.0
+
+#DUSK #系統啟動 #監控開始
+""",
+            "STOP": """
+🛑 <b>DUSK/USDT 多交易所監控系統停止</b>
+
+✅ <b>監控任務已完成</b>
+📊 <b>總掃描次數:</b> {scan_count}
+🚨 <b>總警報次數:</b> {alert_count}
+⏰ <b>運行時間:</b> {runtime}
+🏦 <b>交易所成功率:</b> {success_rate}%
+
+📈 <b>最後統計:</b>
+  平均掃描時間: {avg_scan_time}秒
+  數據成功率: {data_success_rate}%
+  最後掃描時間: {last_scan}
+
+⏰ <b>停止時間:</b> {now} (台灣時間)
+🌍 <b>多交易所監控系統</b>
+
+#DUSK #系統停止 #監控結束
+""",
+            "ERROR": """
+⚠️ <b>DUSK/USDT 監控系統錯誤</b>
+
+❌ <b>錯誤類型:</b> {error_type}
+📝 <b>錯誤訊息:</b> {error_message}
+
+🔄 <b>系統狀態:</b> 嘗試自動恢復
+🏦 <b>受影響交易所:</b> {affected_exchanges}
+📊 <b>當前掃描次數:</b> {scan_count}
+
+⏰ <b>錯誤時間:</b> {now} (台灣時間)
+🌍 <b>多交易所監控系統</b>
+
+#DUSK #系統錯誤 #自動恢復
+""",
+            "STATUS": """
+📊 <b>DUSK/USDT 監控系統狀態報告</b>
+
+⏰ <b>報告時間:</b> {now} (台灣時間)
+🏦 <b>監控中交易所:</b> {exchange_count} 家
+📈 <b>當前狀態:</b> {status}
+
+📊 <b>統計數據:</b>
+  總掃描次數: {total_scans}
+  總警報次數: {total_alerts}
+  數據成功率: {success_rate:.1f}%
+  運行時間: {runtime}
+
+🎯 <b>警報分佈:</b>
+  買入警報: {buy_alerts} 次
+  賣出警報: {sell_alerts} 次
+  大額成交: {large_trade_alerts} 次
+  跨所價差: {spread_alerts} 次
+  價格偏離: {deviation_alerts} 次
+
+🏦 <b>交易所狀態:</b>
+{exchange_status}
+{lead_lag}{metrics}
+
+🌍 <b>多交易所監控系統</b>
+
+#DUSK #狀態報告 #系統監控
+""",
+        },
+        "labels": {
+            "timeframe": "（{timeframe}）",
+            "flow_line": "\n  失衡 z 分數: {zscore:+.2f}（百分位 {percentile:.2%}）",
+            "whale_line": "\n  大戶買/賣比: {ratio:.2f}",
+            "book_line": "\n  盤口失衡: {imbalance:+.2f}",
+            "lead_line": "\n  領先權重: {weight:.2f}",
+            "buy_condition": "買/賣比 > {threshold:g}",
+            "sell_condition": "賣/買比 > {threshold:g}",
+            "side_buy": "🟢 主動買入",
+            "side_sell": "🔴 主動賣出",
+            "side_unknown": "未知方向",
+            "above": "📈 高於",
+            "below": "📉 低於",
+            "status": "運行中",
+            "timeframe_default": "1分鐘",
+            "error_type": "未知錯誤",
+            "error_message": "無詳細訊息",
+            "affected_exchanges": "未知",
+            "no_exchange_data": "  無數據",
+            "exchange_line": "  • {exchange}: {rate:.1f}% ({success}/{total})",
+            "lead_lag_header": "🧭 <b>領先/落後（近 {minutes} 分鐘）:</b>",
+            "lead_scores": "  領先分數: ",
+            "lead_pair": "  • {leader} → {follower}: 領先 {lag_sec} 秒（r={corr:.2f}）",
+            "sync_pair": "  • {leader} ↔ {follower}: 同步（r={corr:.2f}）",
+            "metrics_header": "📡 <b>運行指標:</b>",
+        },
+    },
+    "en": {
+        "templates": {
+            "BUY_IN_RED": """
+🚨 <b>Unusual Buying - {symbol}</b>
+
+🏦 <b>Exchange:</b> {exchange}
+📉 <b>Candle:</b> red (falling){timeframe}
+💰 <b>Price:</b> ${price:.6f}
+
+📊 <b>Order flow:</b>
+  Buy volume: {buy_volume:,.2f}
+  Sell volume: {sell_volume:,.2f}
+  Buy share: {buy_percentage:.1f}%
+  Buy/sell ratio: {buy_ratio:.2f}{detail_lines}
+
+📈 <b>Volume:</b> {volume:,.0f}
+🎯 <b>Trigger:</b> {condition}
+
+⚠️ <b>What it means:</b>
+Heavy aggressive buying while the price is falling.
+A large player may be accumulating at low prices.
+
+⏰ <b>Data time:</b> {kline_time}
+📡 <b>Alert time:</b> {alert_time} (Taiwan time)
+🌍 <b>Multi-exchange monitor</b>
+📅 <b>Date:</b> {date}
+
+#DUSK #BuyAlert #{exchange_tag}
+""",
+            "SELL_IN_GREEN": """
+🚨 <b>Unusual Selling - {symbol}</b>
+
+🏦 <b>Exchange:</b> {exchange}
+📈 <b>Candle:</b> green (rising){timeframe}
+💰 <b>Price:</b> ${price:.6f}
+
+📊 <b>Order flow:</b>
+  Buy volume: {buy_volume:,.2f}
+  Sell volume: {sell_volume:,.2f}
+  Sell share: {sell_percentage:.1f}%
+  Sell/buy ratio: {sell_ratio:.2f}{detail_lines}
+
+📈 <b>Volume:</b> {volume:,.0f}
+🎯 <b>Trigger:</b> {condition}
+
+⚠️ <b>What it means:</b>
+Heavy aggressive selling while the price is rising.
+A large player may be distributing at high prices.
+
+⏰ <b>Data time:</b> {kline_time}
+📡 <b>Alert time:</b> {alert_time} (Taiwan time)
+🌍 <b>Multi-exchange monitor</b>
+📅 <b>Date:</b> {date}
+
+#DUSK #SellAlert #{exchange_tag}
+""",
+            "LARGE_TRADE": """
+🐋 <b>Large Trade - {symbol}</b>
+
+🏦 <b>Exchange:</b> {exchange}
+📌 <b>Side:</b> {side}
+💰 <b>Price:</b> ${trade_price:.6f}
+📦 <b>Quantity:</b> {qty:,.0f}
+💵 <b>Notional:</b> ${notional:,.0f}
+
+📊 <b>Size:</b>
+  Percentile: {percentile:.2%}
+  Threshold (p{quantile:g}): ${threshold:,.0f}{whale_line}
+
+⏰ <b>Trade time:</b> {kline_time}
+📡 <b>Alert time:</b> {alert_time} (Taiwan time)
+🌍 <b>Multi-exchange monitor</b>
+📅 <b>Date:</b> {date}
+
+#DUSK #LargeTrade #{exchange_tag}
+""",
+            "SPREAD_ARB": """
+💱 <b>Cross-exchange Spread - {symbol}</b>
+
+🟢 <b>Buy:</b> {buy_exchange} ${buy_price:.6f}
+🔴 <b>Sell:</b> {sell_exchange} ${sell_price:.6f}
+
+📊 <b>Spread:</b>
+  Gross: {gross_spread:.2%}
+  Fees (both legs): {fees:.2%}
+  Net: {net_spread:.2%}
+
+🎯 <b>Trigger:</b> net spread ≥ {threshold:.2%}
+
+⏰ <b>Data time:</b> {kline_time}
+📡 <b>Alert time:</b> {alert_time} (Taiwan time)
+🌍 <b>Multi-exchange monitor</b>
+📅 <b>Date:</b> {date}
+
+#DUSK #Spread #{buy_tag} #{sell_tag}
+""",
+            "PRICE_DEVIATION": """
+📐 <b>Price Deviation - {symbol}</b>
+
+🏦 <b>Exchange:</b> {exchange}
+💰 <b>Price:</b> ${price:.6f}
+⚖️ <b>Cross-exchange median:</b> ${median:.6f} ({venues} exchanges)
+{direction} the median by {deviation:.2%}
+
+🎯 <b>Trigger:</b> deviation ≥ {threshold:.2%}
+
+⏰ <b>Data time:</b> {kline_time}
+📡 <b>Alert time:</b> {alert_time} (Taiwan time)
+🌍 <b>Multi-exchange monitor</b>
+📅 <b>Date:</b> {date}
+
+#DUSK #PriceDeviation #{exchange_tag}
+""",
+            "START": """
+🤖 <b>DUSK/USDT multi-exchange monitor started</b>
+
+✅ <b>Status:</b> running, monitoring in real time
+🏦 <b>Exchanges:</b> {exchange_count}
+📊 <b>Pair:</b> {pair}
+⏰ <b>Timeframe:</b> {timeframe} candles
+🔄 <b>Scan interval:</b> every 15 seconds (Taiwan time :00, :15, :30, :45)
+🔔 <b>Notifications:</b> anomalies only
+⏱️  <b>Alert cooldown:</b> {cooldown}s
+
+🎯 <b>Alert conditions:</b>
+1. Red candle with heavy buying (buy/sell ratio > {threshold})
+2. Green candle with heavy selling (sell/buy ratio > {threshold})
+
+⏰ <b>Started at:</b> {now} (Taiwan time)
+🌍 <b>Multi-exchange monitor</b>
+📅 <b>Version:</b> enhanced v2.0
+
+#DUSK #Started #Monitoring
+""",
+            "STOP": """
+🛑 <b>DUSK/USDT multi-exchange monitor stopped</b>
+
+✅ <b>Monitoring finished</b>
+📊 <b>Total scans:</b> {scan_count}
+🚨 <b>Total alerts:</b> {alert_count}
+⏰ <b>Runtime:</b> {runtime}
+🏦 <b>Exchange success rate:</b> {success_rate}%
+
+📈 <b>Final statistics:</b>
+  Average scan time: {avg_scan_time}s
+  Data success rate: {data_success_rate}%
+  Last scan: {last_scan}
+
+⏰ <b>Stopped at:</b> {now} (Taiwan time)
+🌍 <b>Multi-exchange monitor</b>
+
+#DUSK #Stopped #MonitoringEnded
+""",
+            "ERROR": """
+⚠️ <b>DUSK/USDT monitor error</b>
+
+❌ <b>Error type:</b> {error_type}
+📝 <b>Message:</b> {error_message}
+
+🔄 <b>Status:</b> attempting to recover
+🏦 <b>Affected exchanges:</b> {affected_exchanges}
+📊 <b>Scans so far:</b> {scan_count}
+
+⏰ <b>Error time:</b> {now} (Taiwan time)
+🌍 <b>Multi-exchange monitor</b>
+
+#DUSK #Error #AutoRecovery
+""",
+            "STATUS": """
+📊 <b>DUSK/USDT monitor status</b>
+
+⏰ <b>Report time:</b> {now} (Taiwan time)
+🏦 <b>Exchanges:</b> {exchange_count}
+📈 <b>Status:</b> {status}
+
+📊 <b>Statistics:</b>
+  Total scans: {total_scans}
+  Total alerts: {total_alerts}
+  Data success rate: {success_rate:.1f}%
+  Runtime: {runtime}
+
+🎯 <b>Alerts by type:</b>
+  Buying: {buy_alerts}
+  Selling: {sell_alerts}
+  Large trades: {large_trade_alerts}
+  Spreads: {spread_alerts}
+  Price deviations: {deviation_alerts}
+
+🏦 <b>Exchanges:</b>
+{exchange_status}
+{lead_lag}{metrics}
+
+🌍 <b>Multi-exchange monitor</b>
+
+#DUSK #Status #Monitoring
+""",
+        },
+        "labels": {
+            "timeframe": " ({timeframe})",
+            "flow_line": "\n  Imbalance z-score: {zscore:+.2f} (percentile {percentile:.2%})",
+            "whale_line": "\n  Whale buy/sell ratio: {ratio:.2f}",
+            "book_line": "\n  Book imbalance: {imbalance:+.2f}",
+            "lead_line": "\n  Lead weight: {weight:.2f}",
+            "buy_condition": "buy/sell ratio > {threshold:g}",
+            "sell_condition": "sell/buy ratio > {threshold:g}",
+            "side_buy": "🟢 aggressive buy",
+            "side_sell": "🔴 aggressive sell",
+            "side_unknown": "unknown",
+            "above": "📈 Above",
+            "below": "📉 Below",
+            "status": "running",
+            "timeframe_default": "1m",
+            "error_type": "unknown error",
+            "error_message": "no details",
+            "affected_exchanges": "unknown",
+            "no_exchange_data": "  no data",
+            "exchange_line": "  • {exchange}: {rate:.1f}% ({success}/{total})",
+            "lead_lag_header": "🧭 <b>Lead/lag (last {minutes} min):</b>",
+            "lead_scores": "  Lead scores: ",
+            "lead_pair": "  • {leader} → {follower}: leads by {lag_sec}s (r={corr:.2f})",
+            "sync_pair": "  • {leader} ↔ {follower}: in sync (r={corr:.2f})",
+            "metrics_header": "📡 <b>Metrics:</b>",
+        },
+    },
+}
+
+
+def _hashtag(name: str) -> str:
+    return name.replace('.', '').replace(' ', '')
+
+
+def _escape(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def _locale(locale: Optional[str]) -> str:
+    locale = locale or TELEGRAM_LOCALE
+    return locale if locale in LOCALES else DEFAULT_LOCALE
+
+
+@lru_cache(maxsize=None)
+def _static_fields(locale: str, message_type: str) -> Tuple[str, ...]:
+    """模板中屬於 STATIC_FIELDS 的欄位（決定快取鍵）"""
+    names = {field for _, field, _, _ in Formatter().parse(LOCALES[locale]["templates"][message_type]) if field}
+    return tuple(name for name in STATIC_FIELDS if name in names)
+
+
+@lru_cache(maxsize=TELEGRAM_TEMPLATE_CACHE_SIZE)
+def compile_template(locale: str, message_type: str, static: Tuple[Tuple[str, str], ...]) -> str:
+    """把固定欄位填入模板，回傳只剩動態欄位的格式字串"""
+    values = dict(static)
+    parts = []
+    for literal, field, spec, conversion in Formatter().parse(LOCALES[locale]["templates"][message_type]):
+        parts.append(_escape(literal))
+        if field is None:
+            continue
+        if field in values:
+            parts.append(_escape(format(values[field], spec)))
+        else:
+            parts.append("{" + field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}")
+    return "".join(parts)
+
+
+_clock_cache: Dict[str, Any] = {"second": None, "fields": None}
+
+
+def clock_fields(now: Optional[datetime] = None) -> Dict[str, str]:
+    """警報時間、日期與完整時間字串（未指定 now 時每秒只計算一次）"""
+    if now is None:
+        second = int(time.time())
+        if _clock_cache["second"] == second:
+            return _clock_cache["fields"]
+        now = datetime.now(TAIWAN_TZ)
+        _clock_cache["second"] = second
+        _clock_cache["fields"] = fields = _clock(now)
+        return fields
+    return _clock(now)
+
+
+def _clock(now: datetime) -> Dict[str, str]:
+    return {"alert_time": format_taiwan_time(now, '%H:%M:%S'), "date": now.strftime('%Y-%m-%d'),
+            "now": format_taiwan_time(now)}
+
+
+# ---- 各類訊息的動態欄位 ----
+
+def _optional(labels: Dict[str, str], key: str, **values) -> str:
+    """選填的明細行（值為 None 時不顯示）"""
+    if any(value is None for value in values.values()):
+        return ""
+    return labels[key].format(**values)
+
+
+def _detail_lines(alert_data: Dict[str, Any], labels: Dict[str, str]) -> str:
+    zscore = alert_data.get('flow_zscore')
+    flow = "" if zscore is None else labels["flow_line"].format(
+        zscore=zscore, percentile=alert_data.get('flow_percentile', 0))
+    return (flow
+            + _optional(labels, "whale_line", ratio=alert_data.get('whale_ratio'))
+            + _optional(labels, "book_line", imbalance=alert_data.get('book_imbalance'))
+            + _optional(labels, "lead_line", weight=alert_data.get('lead_weight')))
+
+
+def _flow_fields(alert_data: Dict[str, Any], labels: Dict[str, str]) -> Dict[str, Any]:
+    buy_volume = alert_data.get('buy_volume', 0)
+    sell_volume = alert_data.get('sell_volume', 0)
+    total_volume = buy_volume + sell_volume
+    timeframe = alert_data.get('timeframe')
+    return {
+        "timeframe": labels["timeframe"].format(timeframe=timeframe) if timeframe else "",
+        "price": alert_data.get('price', 0),
+        "buy_volume": buy_volume,
+        "sell_volume": sell_volume,
+        "buy_percentage": buy_volume / total_volume * 100 if total_volume > 0 else 0,
+        "sell_percentage": sell_volume / total_volume * 100 if total_volume > 0 else 0,
+        "buy_ratio": alert_data.get('buy_ratio', 0),
+        "sell_ratio": alert_data.get('sell_ratio', 0),
+        "detail_lines": _detail_lines(alert_data, labels),
+        "volume": alert_data.get('volume', 0),
+        "kline_time": alert_data.get('kline_time', 'N/A'),
+    }
+
+
+def _buy_fields(alert_data: Dict[str, Any], labels: Dict[str, str]) -> Dict[str, Any]:
+    condition = labels["buy_condition"].format(threshold=BUY_SELL_THRESHOLD)  # 門檻可熱重載，渲染時才填入
+    return dict(_flow_fields(alert_data, labels), condition=alert_data.get('condition', condition))
+
+
+def _sell_fields(alert_data: Dict[str, Any], labels: Dict[str, str]) -> Dict[str, Any]:
+    condition = labels["sell_condition"].format(threshold=BUY_SELL_THRESHOLD)
+    return dict(_flow_fields(alert_data, labels), condition=alert_data.get('condition', condition))
+
+
+def _large_trade_fields(alert_data: Dict[str, Any], labels: Dict[str, str]) -> Dict[str, Any]:
+    trade = alert_data['large_trade']
+    return {
+        "side": labels.get(f"side_{trade['side']}", labels["side_unknown"]),
+        "trade_price": trade['price'],
+        "qty": trade['qty'],
+        "notional": trade['notional'],
+        "percentile": trade.get('percentile') or 1,
+        "quantile": LARGE_TRADE_QUANTILE * 100,
+        "threshold": trade['threshold'],
+        "whale_line": _optional(labels, "whale_line", ratio=alert_data.get('whale_ratio')),
+        "kline_time": alert_data.get('kline_time', 'N/A'),
+    }
+
+
+def _spread_fields(alert_data: Dict[str, Any], labels: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "buy_price": alert_data['buy_price'],
+        "sell_price": alert_data['sell_price'],
+        "gross_spread": alert_data['gross_spread'],
+        "fees": alert_data['fees'],
+        "net_spread": alert_data['net_spread'],
+        "threshold": SPREAD_ARB_THRESHOLD,
+        "kline_time": alert_data.get('kline_time', 'N/A'),
+    }
+
+
+def _deviation_fields(alert_data: Dict[str, Any], labels: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "price": alert_data['price'],
+        "median": alert_data['median'],
+        "venues": alert_data.get('venues', 0),
+        "direction": labels["above"] if alert_data['deviation'] > 0 else labels["below"],
+        "deviation": abs(alert_data['deviation']),
+        "threshold": PRICE_DEVIATION_THRESHOLD,
+        "kline_time": alert_data.get('kline_time', 'N/A'),
+    }
+
+
+def _start_fields(data: Dict[str, Any], labels: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "exchange_count": data.get('exchange_count', 6),
+        "pair": data.get('symbol', 'DUSKUSDT'),
+        "timeframe": data.get('timeframe', labels["timeframe_default"]),
+        "cooldown": data.get('cooldown', 60),
+        "threshold": data.get('threshold', BUY_SELL_THRESHOLD),
+    }
+
+
+def _stop_fields(data: Dict[str, Any], labels: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "scan_count": data.get('scan_count', 0),
+        "alert_count": data.get('alert_count', 0),
+        "runtime": data.get('runtime', 'N/A'),
+        "success_rate": data.get('success_rate', 'N/A'),
+        "avg_scan_time": data.get('avg_scan_time', 'N/A'),
+        "data_success_rate": data.get('data_success_rate', 'N/A'),
+        "last_scan": data.get('last_scan', 'N/A'),
+    }
+
+
+def _error_fields(data: Dict[str, Any], labels: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "error_type": data.get('error_type', labels["error_type"]),
+        "error_message": data.get('error_message', labels["error_message"])[:200],
+        "affected_exchanges": data.get('affected_exchanges', labels["affected_exchanges"]),
+        "scan_count": data.get('scan_count', 0),
+    }
+
+
+def format_exchange_status(exchange_stats: Dict, labels: Dict[str, str]) -> str:
+    """各交易所成功率"""
+    lines = []
+    for exchange_id, stats in exchange_stats.items():
+        lines.append(labels["exchange_line"].format(
+            exchange=exchange_id, rate=stats['success'] / max(stats['total'], 1) * 100,
+            success=stats['success'], total=stats['total']))
+    return "\n".join(lines) if lines else labels["no_exchange_data"]
+
+
+def format_lead_lag(lead_lag: Dict, labels: Dict[str, str]) -> str:
+    """跨交易所領先/落後（尚未累積足夠數據時不顯示）"""
+    if not lead_lag or not lead_lag.get('leaders'):
+        return ""
+    lines = [labels["lead_lag_header"].format(minutes=lead_lag.get('window_sec', 0) // 60)]
+    lines.append(labels["lead_scores"] + ", ".join(
+        f"{leader['exchange']} {leader['score']:+.2f}" for leader in lead_lag['leaders']))
+    for pair in lead_lag.get('pairs', {}).get('return', []):
+        lines.append(labels["lead_pair" if pair['lag'] > 0 else "sync_pair"].format(**pair))
+    return "\n".join(lines) + "\n"
+
+
+def format_metrics(metrics: Dict, labels: Dict[str, str]) -> str:
+    """運行指標（無指標時不顯示）"""
+    if not metrics:
+        return ""
+    lines = [labels["metrics_header"]]
+    for name, values in metrics.items():
+        if all(isinstance(v, dict) for v in values.values()):
+            # 分組指標（如各交易所速率限制）每組一行
+            lines.append(f"  • {name}:")
+            for group, sub in values.items():
+                lines.append(f"      {group}: " + ", ".join(f"{k}={v}" for k, v in sub.items()))
+            continue
+        fields = ", ".join(f"{k}={v}" for k, v in values.items())
+        lines.append(f"  • {name}: {fields}")
+    return "\n".join(lines) + "\n"
+
+
+def _status_fields(data: Dict[str, Any], labels: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "exchange_count": data.get('exchange_count', 6),
+        "status": data.get('status', labels["status"]),
+        "total_scans": data.get('total_scans', 0),
+        "total_alerts": data.get('total_alerts', 0),
+        "success_rate": data.get('success_rate', 0),
+        "runtime": data.get('runtime', 'N/A'),
+        "buy_alerts": data.get('buy_alerts', 0),
+        "sell_alerts": data.get('sell_alerts', 0),
+        "large_trade_alerts": data.get('large_trade_alerts', 0),
+        "spread_alerts": data.get('spread_alerts', 0),
+        "deviation_alerts": data.get('deviation_alerts', 0),
+        "exchange_status": format_exchange_status(data.get('exchange_stats', {}), labels),
+        "lead_lag": format_lead_lag(data.get('lead_lag', {}), labels),
+        "metrics": format_metrics(data.get('metrics', {}), labels),
+    }
+
+
+FieldBuilder = Callable[[Dict[str, Any], Dict[str, str]], Dict[str, Any]]
+
+ALERT_FIELDS: Dict[str, FieldBuilder] = {
+    "BUY_IN_RED": _buy_fields,
+    "SELL_IN_GREEN": _sell_fields,
+    "LARGE_TRADE": _large_trade_fields,
+    "SPREAD_ARB": _spread_fields,
+    "PRICE_DEVIATION": _deviation_fields,
+}
+SYSTEM_FIELDS: Dict[str, FieldBuilder] = {
+    "START": _start_fields,
+    "STOP": _stop_fields,
+    "ERROR": _error_fields,
+    "STATUS": _status_fields,
+}
+
+
+class TemplateRenderer:
+    """以快取的已編譯模板組成 Telegram 訊息"""
+
+    def __init__(self, locale: Optional[str] = None):
+        self.locale = locale  # None = 使用目前的 TELEGRAM_LOCALE（設定熱重載後立即生效）
+        self.stats = {"rendered": 0, "batches": 0}
+        self._compiled: Dict[Tuple, str] = {}  # 靜態欄位的原始值 -> 已編譯模板（免去每次組快取鍵）
+
+    def _static(self, locale: str, message_type: str, data: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+        values = {}
+        for name in _static_fields(locale, message_type):
+            if name.endswith("_tag"):
+                source = "exchange" if name == "exchange_tag" else name.replace("_tag", "_exchange")
+                values[name] = _hashtag(data[source])
+            else:
+                values[name] = data[name]
+        return tuple(values.items())
+
+    def _render(self, builders: Dict[str, FieldBuilder], message_type: str, data: Dict[str, Any],
+                clock: Dict[str, str]) -> str:
+        builder = builders.get(message_type)
+        if builder is None:
+            return ""
+        locale = _locale(self.locale)
+        labels = LOCALES[locale]["labels"]
+        key = (locale, message_type, data.get('symbol'), data.get('exchange'),
+               data.get('buy_exchange'), data.get('sell_exchange'))
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            if len(self._compiled) >= TELEGRAM_TEMPLATE_CACHE_SIZE:
+                self._compiled.clear()
+            compiled = self._compiled[key] = compile_template(locale, message_type,
+                                                              self._static(locale, message_type, data))
+        fields = builder(data, labels)
+        fields.update(clock)
+        self.stats['rendered'] += 1
+        return compiled.format_map(fields)
+
+    def supports(self, alert_type: str) -> bool:
+        return alert_type in ALERT_FIELDS
+
+    def render(self, alert_type: str, alert_data: Dict[str, Any], now: Optional[datetime] = None) -> str:
+        """渲染單則警報（未知類型回傳空字串）"""
+        return self._render(ALERT_FIELDS, alert_type, alert_data, clock_fields(now))
+
+    def render_batch(self, alerts: List[Tuple[str, Dict[str, Any]]],
+                     now: Optional[datetime] = None) -> List[str]:
+        """渲染一輪掃描的所有警報（共用同一個警報時間）"""
+        clock = clock_fields(now)
+        self.stats['batches'] += 1
+        return [self._render(ALERT_FIELDS, alert_type, alert_data, clock) for alert_type, alert_data in alerts]
+
+    def render_system(self, message_type: str, data: Optional[Dict[str, Any]] = None,
+                      now: Optional[datetime] = None) -> str:
+        """渲染系統訊息（START / STOP / ERROR / STATUS；未知類型回傳空字串）"""
+        return self._render(SYSTEM_FIELDS, message_type, data or {}, clock_fields(now))
+
+    @staticmethod
+    def cache_info():
+        return compile_template.cache_info()
@@ -122,6 +122,26 @@ async def test_exchange_scanner():
         print(f"❌ 掃描器模組導入失敗: {type(e).__name__}: {e}")
         return False
 
+async def test_scanner_replay(cassette: str):
+    """以錄製檔離線測試交易所掃描器（設定 TEST_CASSETTE 時取代即時掃描）"""
+    print(f"\n🔍 測試 2: 交易所掃描器（重播 {cassette}）")
+    print("-" * 40)
+    
+    try:
+        from http_cassette import replay_cassette
+        stats = await replay_cassette(cassette)
+        
+        if stats['misses']:
+            print(f"❌ 重播有 {stats['misses']} 筆請求未命中錄製檔")
+            return False
+        successful = sum(1 for result in stats['results'] if result)
+        print(f"✅ 重播成功: {successful}/{stats['ticks']} 次掃描有數據")
+        return successful > 0
+        
+    except Exception as e:
+        print(f"❌ 重播測試失敗: {type(e).__name__}: {e}")
+        return False
+
 def test_telegram_module():
     """測試 Telegram 模組"""
     print("\n🤖 測試 3: Telegram 通知模組 (telegram_bot.py)")
@@ -196,6 +216,673 @@ def test_telegram_module():
         traceback.print_exc()
         return False
 
+async def test_order_book_offline():
+    """以模擬數據源測試訂單簿（不需網絡）"""
+    print("\n📚 測試 5: 訂單簿 (order_book.py，離線模擬)")
+    print("-" * 40)
+    
+    try:
+        from order_book import OrderBookManager, SimulatedBookFeed
+        
+        manager = OrderBookManager(exchanges=["okx", "bybit"])
+        await manager.consume("okx", SimulatedBookFeed(seed=1, bias=0.8).events())
+        await manager.consume("bybit", SimulatedBookFeed(seed=2, bias=-0.8).events())
+        
+        okx_imbalance = manager.get_imbalance("okx")
+        bybit_imbalance = manager.get_imbalance("bybit")
+        print(f"   OKX 盤口失衡: {okx_imbalance:+.2f}")
+        print(f"   Bybit 盤口失衡: {bybit_imbalance:+.2f}")
+        
+        if okx_imbalance > 0 > bybit_imbalance:
+            print("✅ 訂單簿失衡方向正確")
+            return True
+        print("❌ 訂單簿失衡方向錯誤")
+        return False
+        
+    except Exception as e:
+        print(f"❌ 訂單簿測試失敗: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+async def test_cluster_offline():
+    """以本機檔案協調者測試多節點分片與故障轉移（不需網絡）"""
+    print("\n🧩 測試 6: 多節點分片 (cluster.py，本機協調者)")
+    print("-" * 40)
+    
+    try:
+        import tempfile
+        from cluster import ClusterNode, FileCoordinator
+        from kline_fetcher import Candle
+        from multi_exchange_scanner import EnhancedKlineData
+        
+        class StubScanner:
+            def __init__(self):
+                self.candle_requests = set()
+            
+            async def fetch_raw(self, exchange_id):
+                return {}
+            
+            async def fetch_latest_candles(self, exchanges=None):
+                self.candle_requests.update(exchanges)
+            
+            def closed_candles(self, exchanges=None):
+                return {ex: [Candle(60_000 * i, 0.25, 0.26, 0.24, 0.25, 10.0, closed=True) for i in range(8)]
+                        for ex in exchanges}
+            
+            def normalize(self, exchange_id, raw):
+                return EnhancedKlineData(exchange=exchange_id, symbol="DUSKUSDT", open=0.25, high=0.25,
+                                         low=0.25, close=0.25, volume=1, buy_volume=1, sell_volume=1)
+            
+            def log_fetch_error(self, exchange_id, error):
+                pass
+        
+        directory = tempfile.mkdtemp()
+        nodes = [ClusterNode(FileCoordinator(directory), f"node{i}", exclude=[], collect_timeout=1)
+                 for i in range(3)]
+        scanner = StubScanner()
+        
+        async def run_round(members):
+            scan_time = datetime.now()
+            return await asyncio.gather(*(node.run_tick(scanner, scan_time) for node in members))
+        
+        await run_round(nodes)
+        results = await run_round(nodes)  # 第二輪所有節點都已加入
+        leaders = [node for node in nodes if node.is_leader]
+        shards = sorted(ex for node in nodes for ex in node.shards)
+        print(f"   分片: {', '.join(f'{n.node_id}={len(n.shards)}' for n in nodes)}，領導者: {leaders[0].node_id}")
+        if len(leaders) != 1 or len(shards) != len(set(shards)) or len(results[nodes.index(leaders[0])]) != len(shards):
+            print("❌ 分片重疊或領導者不唯一")
+            return False
+        if (sorted(leaders[0].candles) != shards or scanner.candle_requests != set(shards)
+                or [c.time for c in leaders[0].candles[shards[0]]] != [60_000 * i for i in range(3, 8)]):
+            print("❌ 已收盤K線未隨分片結果發布")
+            return False
+        
+        await leaders[0].leave()
+        survivors = [node for node in nodes if node is not leaders[0]]
+        await run_round(survivors)
+        results = await run_round(survivors)
+        new_leaders = [node for node in survivors if node.is_leader]
+        collected = results[survivors.index(new_leaders[0])] if len(new_leaders) == 1 else {}
+        print(f"   節點離線後: 領導者 {new_leaders[0].node_id if new_leaders else '無'}，收齊 {len(collected)} 家")
+        if len(collected) != len(shards):
+            print("❌ 節點離線後分片未轉移")
+            return False
+        
+        # 領導者當機（未呼叫 leave）：心跳逾時後分片轉移、租約過期後由其他節點接手，並接續警報去重狀態
+        import dusk_monitor
+        from spread_monitor import SpreadMonitor
+        directory = tempfile.mkdtemp()
+        nodes = [ClusterNode(FileCoordinator(directory, heartbeat_ttl=0.5), f"node{i}", exclude=[],
+                             collect_timeout=0.5, lease=0.5) for i in range(2)]
+        await run_round(nodes)
+        await run_round(nodes)
+        leader, follower = (nodes[0], nodes[1]) if nodes[0].is_leader else (nodes[1], nodes[0])
+        dead_shards = list(leader.shards)
+        minute_key = datetime.now().strftime("%Y%m%d%H%M")
+        dusk_monitor.alert_minute_tracker.clear()
+        dusk_monitor.last_large_trade_time.clear()
+        dusk_monitor.alert_minute_tracker[minute_key] = {dead_shards[0]}
+        dusk_monitor.last_large_trade_time[dead_shards[0]] = 1_700_000_000_000
+        spreads = SpreadMonitor()
+        spreads._last_alert[("SPREAD_ARB", "DUSK/USDT", "okx", "mexc")] = time.time()
+        saved = await leader.save_alert_state(dusk_monitor.alert_dedup_state(spreads))
+        dusk_monitor.alert_minute_tracker.clear()  # 新領導者在另一個程序，記憶體中沒有這些狀態
+        dusk_monitor.last_large_trade_time.clear()
+        
+        await asyncio.sleep(0.6)  # 心跳與租約都過期
+        results = await run_round([follower])
+        if not follower.is_leader or not follower.took_over or not saved:
+            print("❌ 租約過期後未由其他節點接手")
+            return False
+        if sorted(follower.shards) != sorted(results[0]) or not set(dead_shards) <= set(follower.shards):
+            print("❌ 當機節點的分片未轉移")
+            return False
+        new_spreads = SpreadMonitor()
+        dusk_monitor.restore_alert_dedup(await follower.load_alert_state(), new_spreads)
+        should_alert, _, _, info = dusk_monitor.check_single_kline_alert(None, dead_shards[0], minute_key)
+        if (should_alert or dead_shards[0] not in dusk_monitor.alert_minute_tracker.get(minute_key, ())
+                or dusk_monitor.last_large_trade_time.get(dead_shards[0]) != 1_700_000_000_000
+                or new_spreads._cooled_down(("SPREAD_ARB", "DUSK/USDT", "okx", "mexc"), time.time())):
+            print("❌ 新領導者未接續警報去重與冷卻狀態")
+            return False
+        if await leader.save_alert_state({}):
+            print("❌ 已失去租約的節點仍可寫入警報狀態")
+            return False
+        dusk_monitor.alert_minute_tracker.clear()
+        dusk_monitor.last_large_trade_time.clear()
+        print(f"   當機後: {follower.node_id} 接手 {len(follower.shards)} 家並接續去重（{info}）")
+        print("✅ 分片與故障轉移正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 多節點測試失敗: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_snapshot_shm():
+    """共享記憶體快照寫入 / 讀取往返與環形覆寫（不需網絡）"""
+    print("\n📸 測試 7: 共享記憶體快照 (snapshot_shm.py)")
+    print("-" * 40)
+    
+    try:
+        import tempfile
+        from snapshot_shm import SnapshotPublisher, SnapshotReader, SLOT_HEADER, SEQ
+        from multi_exchange_scanner import EnhancedKlineData
+        
+        path = os.path.join(tempfile.mkdtemp(), "radar.snap")
+        publisher = SnapshotPublisher(path, capacity=4, exchanges=["okx", "bybit"])
+        reader = SnapshotReader(path)
+        for tick in range(6):  # 容量4，寫入6輪後前兩輪已被覆寫
+            price = 0.25 + tick / 1000
+            publisher.publish({"okx": EnhancedKlineData(
+                exchange="OKX", symbol="DUSKUSDT", open=0.25, high=price, low=0.25, close=price,
+                volume=100 + tick, buy_volume=60, sell_volume=40, vwap=None, book_imbalance=0.5
+            )}, tick_time=1_700_000_000 + tick)
+        
+        latest = reader.latest(10)
+        ticks = [snapshot.tick_no for snapshot in latest]
+        print(f"   寫入 {reader.write_count} 輪，讀回: {ticks}")
+        okx = latest[0].exchanges.get("okx")
+        if ticks != [5, 4, 3, 2] or okx is None or "bybit" in latest[0].exchanges:
+            print("❌ 環形緩衝區讀回的輪次或交易所不符")
+            return False
+        if (okx.close != 0.255 or okx.volume != 105 or okx.vwap is not None or okx.book_imbalance != 0.5
+                or not okx.is_green or latest[0].tick_time != 1_700_000_005):
+            print("❌ 快照欄位往返不一致")
+            return False
+        if reader._read_slot(1) is not None:
+            print("❌ 已覆寫的輪次仍可讀取")
+            return False
+        
+        # 寫入中（奇數序號）的槽不應被讀取
+        offset = publisher.slots_offset + (5 % publisher.capacity) * publisher.slot_size
+        seq = SLOT_HEADER.unpack_from(publisher._mm, offset)[0]
+        SEQ.pack_into(publisher._mm, offset, seq + 1)
+        torn = reader._read_slot(5, retries=3)
+        SEQ.pack_into(publisher._mm, offset, seq)
+        if torn is not None or seq % 2:
+            print("❌ 序號鎖未擋下寫入中的槽")
+            return False
+        
+        reader.close()
+        publisher.close()
+        print("✅ 快照往返、環形覆寫與序號鎖正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 共享記憶體快照測試失敗: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_config_reload():
+    """設定檔熱重載：無效設定檔不套用、有效設定檔更新 config 與各模組綁定（不需網絡）"""
+    print("\n🔄 測試 8: 設定檔熱重載 (config_reload.py)")
+    print("-" * 40)
+    
+    import config
+    before = config.current_config()
+    applied = {}
+    try:
+        import json
+        import tempfile
+        import alert_rules
+        from config_reload import ConfigReloader
+        from candle_rollup import MinuteCandleBuilder
+        from kline_fetcher import Candle
+        from scan_pipeline import ScanPipeline
+        
+        path = os.path.join(tempfile.mkdtemp(), "radar_config.json")
+        reloader = ConfigReloader(path=path)
+        notified = []
+        reloader.on_change(["BUY_SELL_THRESHOLD"], notified.append)
+        
+        # 型別錯誤與未知鍵：整份設定檔不套用
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"BUY_SELL_THRESHOLD": "2.5", "NO_SUCH_SETTING": 1}, f)
+        if reloader.poll(force=True) or reloader.stats['rejected'] != 1:
+            print("❌ 無效設定檔未被拒絕")
+            return False
+        if config.BUY_SELL_THRESHOLD != before['BUY_SELL_THRESHOLD'] or notified:
+            print("❌ 被拒絕的設定檔仍改變了設定")
+            return False
+        print(f"   無效設定檔已拒絕: {reloader.stats['last_error'][:60]}")
+        
+        # 專案目錄以外的模組（第三方套件）即使有同名、同一物件的全域變數也不改寫
+        import types
+        library = types.ModuleType("fake_library")
+        library.__file__ = os.path.join(tempfile.mkdtemp(), "fake_library.py")
+        library.BUY_SELL_THRESHOLD = config.BUY_SELL_THRESHOLD
+        sys.modules["fake_library"] = library
+        
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"BUY_SELL_THRESHOLD": 2.5, "ROLLUP_FLOW_GRACE": 30, "PIPELINE_TICK_TIMEOUT": 4.0}, f)
+        applied = reloader.poll(force=True)
+        del sys.modules["fake_library"]
+        print(f"   已套用: {', '.join(sorted(applied))}")
+        if (config.BUY_SELL_THRESHOLD != 2.5 or alert_rules.BUY_SELL_THRESHOLD != 2.5
+                or notified != [{"BUY_SELL_THRESHOLD": 2.5}] or reloader.stats['last_error'] is not None):
+            print("❌ 有效設定檔未更新 config、模組綁定或訂閱者")
+            return False
+        if library.BUY_SELL_THRESHOLD != before['BUY_SELL_THRESHOLD']:
+            print("❌ 熱重載改寫了專案以外模組的全域變數")
+            return False
+        # 建構參數的預設值在呼叫時讀取
+        builder = MinuteCandleBuilder()
+        builder.last_emitted["okx"] = 0
+        candle = Candle(60_000, 0.25, 0.26, 0.24, 0.25, 100.0, closed=True)
+        emitted = builder.close("okx", [candle], now_ms=120_000 + 45_000)  # 收盤後 45 秒，超過新的 30 秒
+        pipeline = ScanPipeline(None, lambda result: [], lambda alert: None, exchanges=["okx"])
+        if len(emitted) != 1 or pipeline.tick_timeout != 4.0:
+            print("❌ 建構參數仍使用匯入時的預設值")
+            return False
+        
+        print("✅ 無效設定檔不套用，有效設定檔立即生效")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 設定檔熱重載測試失敗: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        from config_reload import ConfigReloader
+        restore = {key: before[key] for key in applied}
+        if restore:
+            ConfigReloader(path=os.devnull).apply(restore)
+
+def test_telegram_templates():
+    """各類警報與系統訊息以固定數據渲染，與模板重構前的輸出比對（不需網絡）"""
+    print("\n📝 測試 9: 訊息模板 (telegram_templates.py)")
+    print("-" * 40)
+    
+    import telegram_templates
+    threshold = telegram_templates.BUY_SELL_THRESHOLD
+    try:
+        import hashlib
+        from config import TAIWAN_TZ
+        from telegram_templates import TemplateRenderer
+        
+        now = TAIWAN_TZ.localize(datetime(2026, 3, 4, 5, 6, 7))
+        base = {"exchange": "Gate.io", "symbol": "DUSKUSDT", "price": 0.251234, "buy_volume": 12345.678,
+                "sell_volume": 2345.6, "volume": 987654.3, "book_imbalance": None, "trigger": "買賣比",
+                "kline_time": "12:00:15", "whale_ratio": None}
+        full = dict(base, flow_zscore=2.71, flow_percentile=0.993, whale_ratio=3.2, book_imbalance=0.41,
+                    lead_weight=1.23, timeframe="5m", condition="z > 2.5", buy_ratio=5.26, sell_ratio=0.19)
+        large = {"notional": 123456.7, "price": 0.25, "qty": 493826.8, "side": "buy", "time": 1,
+                 "threshold": 50000.0, "percentile": 0.9995}
+        status = {"exchange_count": 6, "status": "運行中", "total_scans": 12, "total_alerts": 3, "success_rate": 97.5,
+                  "runtime": "1小時2分", "buy_alerts": 1, "sell_alerts": 1, "large_trade_alerts": 1,
+                  "spread_alerts": 0, "deviation_alerts": 0,
+                  "exchange_stats": {"OKX": {"success": 10, "total": 12}, "MEXC": {"success": 0, "total": 0}},
+                  "metrics": {"requests": {"hits": 3, "misses": 4}, "rate_limit": {"okx": {"waits": 1, "tokens": 2.5}}},
+                  "lead_lag": {"window_sec": 3600,
+                               "leaders": [{"exchange": "OKX", "score": 0.4}, {"exchange": "MEXC", "score": -0.2}],
+                               "pairs": {"return": [
+                                   {"leader": "OKX", "follower": "MEXC", "lag": 2, "lag_sec": 30, "corr": 0.61},
+                                   {"leader": "Bybit", "follower": "Kraken", "lag": 0, "lag_sec": 0, "corr": 0.3}]}}}
+        # (訊息類型, 數據, 重構前輸出的 SHA-256 前16碼)；未知類型為空字串
+        alerts = [
+            ("BUY_IN_RED", dict(base, buy_ratio=5.26), "4328dcb10264252e"),
+            ("BUY_IN_RED", full, "2e104585e3f5a8db"),
+            ("BUY_IN_RED", dict(base, buy_volume=0, sell_volume=0, exchange="OKX"), "bd92511069535b78"),
+            ("SELL_IN_GREEN", dict(base, sell_ratio=2.1, exchange="MEXC"), "8c17224d7e180876"),
+            ("SELL_IN_GREEN", full, "dc96b5afc0de61bc"),
+            ("LARGE_TRADE", dict(base, large_trade=large), "fe9db56ccc1e6b5e"),
+            ("LARGE_TRADE", dict(full, large_trade=dict(large, side="x", percentile=None)), "9da3b5f5c91937dd"),
+            ("SPREAD_ARB", {"buy_exchange": "Gate.io", "sell_exchange": "MEXC", "buy_price": 0.25,
+                            "sell_price": 0.2558, "gross_spread": 0.0232, "fees": 0.0025, "net_spread": 0.0207,
+                            "exchange": "Gate.io → MEXC", "symbol": "DUSKUSDT", "price": 0.25,
+                            "kline_time": "00:00:15"}, "db3c4864d3f29078"),
+            ("PRICE_DEVIATION", {"exchange": "MEXC", "symbol": "DUSKUSDT", "price": 0.256, "median": 0.2501,
+                                 "deviation": 0.0236, "venues": 6, "kline_time": "00:00:15"}, "1bf8017e03579098"),
+            ("PRICE_DEVIATION", {"exchange": "Kraken", "symbol": "DUSKUSDT", "price": 0.24, "median": 0.2501,
+                                 "deviation": -0.04, "kline_time": "00:00:15"}, "f843715af84059bd"),
+            ("UNKNOWN", base, "e3b0c44298fc1c14"),
+        ]
+        system = [
+            ("START", {"exchange_count": 6, "symbol": "DUSKUSDT", "timeframe": "1分鐘", "cooldown": 60,
+                       "threshold": 1.8}, "681679f8c59bab88"),
+            ("START", {}, "681679f8c59bab88"),
+            ("STOP", {"scan_count": 5, "alert_count": 1, "runtime": "5分", "success_rate": 99}, "3a2fa7fb24795ed2"),
+            ("ERROR", {"error_type": "Timeout", "error_message": "x" * 300, "affected_exchanges": "OKX",
+                       "scan_count": 4}, "e6c4b84153d0e9cf"),
+            ("ERROR", {}, "6a0628836463a980"),
+            ("STATUS", status, "5458b476f35b44b4"),
+            ("STATUS", {}, "25bd281559927167"),
+            ("NOPE", {}, "e3b0c44298fc1c14"),
+        ]
+        
+        telegram_templates.BUY_SELL_THRESHOLD = 1.8  # 比對基準以預設門檻產生
+        renderer = TemplateRenderer("zh-TW")
+        rendered = [(t, d, digest, renderer.render(t, d, now)) for t, d, digest in alerts]
+        rendered += [(t, d, digest, renderer.render_system(t, d, now)) for t, d, digest in system]
+        mismatched = 0
+        for message_type, _, digest, message in rendered:
+            if hashlib.sha256(message.encode("utf-8")).hexdigest()[:16] != digest:
+                mismatched += 1
+                print(f"❌ {message_type} 輸出與重構前不同:\n{message}")
+        if mismatched:
+            return False
+        print(f"   {len(rendered)} 則訊息與重構前輸出一致")
+        
+        # 門檻熱重載後（config_reload 重新綁定模組名稱），預設條件與啟動訊息顯示新值
+        telegram_templates.BUY_SELL_THRESHOLD = 2.5
+        if ("買/賣比 > 2.5" not in renderer.render("BUY_IN_RED", dict(base, buy_ratio=5.26), now)
+                or "sell/buy ratio > 2.5" not in TemplateRenderer("en").render("SELL_IN_GREEN", base, now)
+                or "2.5" not in renderer.render_system("START", {}, now)):
+            print("❌ 買賣比門檻未於渲染時讀取")
+            return False
+        
+        print("✅ 模板輸出與重構前一致，門檻於渲染時讀取")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 訊息模板測試失敗: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        telegram_templates.BUY_SELL_THRESHOLD = threshold
+
+async def test_rate_limiter():
+    """令牌桶：限額標頭（不分大小寫）、429暫停與優先佇列順序（不需網絡）"""
+    print("\n🚦 測試 10: 速率限制 (rate_limiter.py)")
+    print("-" * 40)
+    
+    try:
+        from http_cassette import HttpResponse
+        from rate_limiter import RateLimiter, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+        
+        limits = {"mexc": {"capacity": 100, "refill": 1, "headers": {"used": "X-MBX-USED-WEIGHT"}},
+                  "gateio": {"capacity": 100, "refill": 1,
+                             "headers": {"remaining": "X-Gate-RateLimit-Requests-Remain"}}}
+        limiter = RateLimiter(limits, headroom=1.0)
+        
+        # 小寫標頭（aiohttp 回傳原樣、錄製檔與代理常為小寫）也要校正額度
+        limiter.observe("mexc", 200, {"x-mbx-used-weight": "60"})
+        limiter.observe("gateio", 200, HttpResponse(200, b"", {"x-gate-ratelimit-requests-remain": "25"}).headers)
+        mexc, gate = limiter.buckets["mexc"], limiter.buckets["gateio"]
+        if not (39 <= mexc.tokens <= 41 and 24 <= gate.tokens <= 26):
+            print(f"❌ 小寫限額標頭未生效: mexc={mexc.tokens:.1f} gateio={gate.tokens:.1f}")
+            return False
+        print(f"   小寫標頭校正: mexc 剩 {mexc.tokens:.0f}、gateio 剩 {gate.tokens:.0f}")
+        
+        # 429：依小寫 retry-after 暫停並清空額度
+        limiter.observe("mexc", 429, {"retry-after": "30"})
+        if mexc.tokens != 0 or not 29 <= mexc.paused_until - time.monotonic() <= 30 or mexc.stats['throttled'] != 1:
+            print("❌ 429 未依 Retry-After 暫停")
+            return False
+        print("   429 依 retry-after 暫停 30 秒")
+        
+        async def contend():
+            fast = RateLimiter({"okx": {"capacity": 1, "refill": 50}}, headroom=1.0)
+            bucket = fast.buckets["okx"]
+            await fast.acquire("okx", "https://x/a")  # 用完額度，之後的請求都要排隊
+            order = []
+            
+            async def request(name, priority):
+                await bucket.acquire(1, priority)
+                order.append(name)
+            
+            tasks = [asyncio.create_task(request("low", PRIORITY_LOW))]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(request("normal", PRIORITY_NORMAL)))
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(request("high", PRIORITY_HIGH)))
+            # 排隊中取消的請求不可佔用額度
+            cancelled = asyncio.create_task(request("cancelled", PRIORITY_HIGH))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.wait_for(asyncio.gather(*tasks), timeout=2)
+            return order, bucket.stats
+        
+        order, stats = await contend()
+        if order != ["high", "normal", "low"]:
+            print(f"❌ 優先佇列順序錯誤: {order}")
+            return False
+        print(f"   放行順序: {' → '.join(order)}（排隊 {stats['queued']} 次）")
+        
+        print("✅ 限額標頭、429暫停與優先佇列正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 速率限制測試失敗: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+async def test_request_coalescer():
+    """請求合併：並發相同請求只發出一次，發起者被取消時其他等待者仍拿到結果（不需網絡）"""
+    print("\n🔗 測試 11: 請求合併 (request_coalescer.py)")
+    print("-" * 40)
+    
+    try:
+        from request_coalescer import SingleFlight
+        
+        flight = SingleFlight(ttl=60)
+        calls = []
+        
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"price": len(calls)}
+        
+        results = await asyncio.gather(*(flight.do("ticker", fetch) for _ in range(5)))
+        if len(calls) != 1 or any(result != {"price": 1} for result in results) or flight.stats['coalesced'] != 4:
+            print(f"❌ 並發請求未合併: 發出 {len(calls)} 次, {flight.stats}")
+            return False
+        if await flight.do("ticker", fetch) != {"price": 1} or flight.stats['hits'] != 1:
+            print("❌ 快取未命中")
+            return False
+        print(f"   5 個並發呼叫只發出 1 次請求，之後命中快取 ({flight.stats})")
+        
+        # 發起者被取消：請求繼續執行，等待者拿到結果而不是 CancelledError
+        initiator = asyncio.create_task(flight.do("trades", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("trades", fetch))
+        await asyncio.sleep(0)
+        initiator.cancel()
+        value = await asyncio.wait_for(waiter, timeout=1)
+        if not initiator.cancelled() or value != {"price": 2} or len(calls) != 2:
+            print(f"❌ 發起者取消後等待者結果錯誤: {value}")
+            return False
+        print("   發起者取消後等待者仍取得結果")
+        
+        # 所有呼叫端都取消：請求一併取消，下次相同請求重新發出
+        lone = asyncio.create_task(flight.do("depth", fetch))
+        await asyncio.sleep(0.01)
+        lone.cancel()
+        await asyncio.gather(lone, return_exceptions=True)
+        if await asyncio.wait_for(flight.do("depth", fetch), timeout=1) != {"price": 4}:
+            print("❌ 取消後的相同請求未重新發出")
+            return False
+        
+        # 錯誤傳給所有等待者且不快取
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("HTTP 500")
+        
+        errors = await asyncio.gather(*(flight.do("book", failing) for _ in range(3)), return_exceptions=True)
+        if not all(isinstance(error, ValueError) for error in errors) or flight.stats['errors'] != 1:
+            print(f"❌ 錯誤未傳給所有等待者: {errors}")
+            return False
+        print("   全部取消時請求一併取消，錯誤傳給所有等待者")
+        
+        print("✅ 請求合併與取消處理正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 請求合併測試失敗: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_spread_monitor():
+    """價差監控：索引堆積與暴力比對一致，最優買賣價同一家時仍找到淨價差最大的組合（不需網絡）"""
+    print("\n💱 測試 12: 價差監控 (spread_monitor.py)")
+    print("-" * 40)
+    
+    try:
+        import random
+        from spread_monitor import IndexedHeap, SpreadMonitor, _fee
+        
+        rng = random.Random(42)
+        for largest_first in (False, True):
+            heap = IndexedHeap(largest_first=largest_first)
+            expected = {}
+            pick = max if largest_first else min
+            for _ in range(2000):
+                key = f"ex{rng.randrange(12)}"
+                if rng.random() < 0.3:
+                    heap.remove(key)
+                    expected.pop(key, None)
+                else:
+                    expected[key] = round(rng.uniform(0.9, 1.1), 4)
+                    heap.set(key, expected[key])
+                if len(heap) != len(expected):
+                    print(f"❌ 堆積大小錯誤: {len(heap)} != {len(expected)}")
+                    return False
+                if not expected:
+                    if heap.best() is not None:
+                        print("❌ 空堆積仍有最優值")
+                        return False
+                    continue
+                top = heap.best()
+                if top[1] != pick(expected.values()):
+                    print(f"❌ 最優值錯誤: {top} (預期 {pick(expected.values())})")
+                    return False
+                rest = [value for key, value in expected.items() if key != top[0]]
+                second = heap.best(exclude=top[0])
+                if (second[1] if second else None) != (pick(rest) if rest else None):
+                    print(f"❌ 次優值錯誤: {second} (預期 {pick(rest) if rest else None})")
+                    return False
+        print("   最小 / 最大堆積的 set、remove、best(exclude=…) 與暴力比對一致")
+        
+        # 最高買價與最低賣價都在 X：最佳組合必須跨交易所
+        quotes = {"okx": (1.000, 1.001), "bybit": (0.999, 1.002), "gateio": (0.998, 1.003)}
+        monitor = SpreadMonitor()
+        for exchange_id, (bid, ask) in quotes.items():
+            monitor.update("DUSK", exchange_id, bid, ask, (bid + ask) / 2, now=time.time())
+        result = monitor.best_spread("DUSK")
+        brute = max((bid * (1 - _fee(sell)) / (quotes[buy][1] * (1 + _fee(buy))) - 1, buy, sell)
+                    for buy in quotes for sell, (bid, _) in quotes.items() if buy != sell)
+        if result is None or result['buy_exchange'] == result['sell_exchange'] \
+                or abs(result['net_spread'] - brute[0]) > 1e-12:
+            print(f"❌ 同一家最優時價差錯誤: {result} (預期 {brute})")
+            return False
+        print(f"   最優買賣價同一家: {result['buy_exchange']} → {result['sell_exchange']} "
+              f"淨價差 {result['net_spread']:.4%}")
+        
+        # 手續費不同：隨機報價與所有組合的暴力最大值一致
+        venues = ["coinbase", "kraken", "okx", "bybit", "gateio", "mexc"]
+        for _ in range(300):
+            monitor = SpreadMonitor()
+            quotes = {}
+            for exchange_id in rng.sample(venues, rng.randint(2, len(venues))):
+                mid = rng.uniform(0.99, 1.01)
+                quotes[exchange_id] = (mid * 0.9995, mid * 1.0005)
+                monitor.update("DUSK", exchange_id, *quotes[exchange_id], mid, now=time.time())
+            result = monitor.best_spread("DUSK")
+            brute = max(quotes[sell][0] * (1 - _fee(sell)) / (quotes[buy][1] * (1 + _fee(buy))) - 1
+                        for buy in quotes for sell in quotes if buy != sell)
+            if result is None or abs(result['net_spread'] - brute) > 1e-12:
+                print(f"❌ 淨價差非最大: {result} (預期 {brute:.6f})")
+                return False
+        print("   不同手續費下與所有交易所組合的暴力最大值一致")
+        
+        print("✅ 價差監控計算正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 價差監控測試失敗: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_adaptive_scheduler():
+    """自適應輪詢：間隔上下限、整頁新成交減半、429 加倍，無交易所時不出錯（不需網絡）"""
+    print("\n⏱️ 測試 13: 自適應輪詢 (adaptive_poller.py)")
+    print("-" * 40)
+    
+    try:
+        from adaptive_poller import AdaptiveScheduler
+        from rate_limiter import RateLimiter
+        from trade_normalizer import TradeRows
+        
+        def page(first: int, count: int) -> TradeRows:
+            timestamps = list(range(first, first + count))
+            return TradeRows([0.1] * count, [100.0] * count, [1] * count, timestamps)
+        
+        # 活躍市場：每秒 10 筆新成交，間隔壓到 floor
+        scheduler = AdaptiveScheduler(exchanges=["okx"], floor=5.0, ceiling=60.0)
+        scheduler.observe_trades("okx", page(0, 200))
+        scheduler.record_poll("okx", now=0.0)
+        scheduler.observe_trades("okx", page(100, 200))
+        scheduler.record_poll("okx", now=10.0)
+        if scheduler.venues["okx"].interval != 5.0:
+            print(f"❌ 活躍市場未限制在 floor: {scheduler.venues['okx'].interval}")
+            return False
+        
+        # 冷清市場：沒有新成交，間隔拉到 ceiling
+        scheduler = AdaptiveScheduler(exchanges=["okx"], floor=5.0, ceiling=60.0)
+        scheduler.observe_trades("okx", page(0, 50))
+        scheduler.record_poll("okx", now=0.0)
+        scheduler.observe_trades("okx", page(0, 50))
+        scheduler.record_poll("okx", now=100.0)
+        if scheduler.venues["okx"].interval != 60.0:
+            print(f"❌ 冷清市場未限制在 ceiling: {scheduler.venues['okx'].interval}")
+            return False
+        print("   活躍市場間隔 = floor，冷清市場間隔 = ceiling")
+        
+        # 整頁都是新成交：到達率換算的間隔較長時仍減半
+        scheduler = AdaptiveScheduler(exchanges=["okx"], floor=5.0, ceiling=60.0)
+        scheduler.observe_trades("okx", page(0, 10))
+        scheduler.record_poll("okx", now=0.0)
+        previous = scheduler.venues["okx"].interval
+        scheduler.observe_trades("okx", page(1000, 10))
+        scheduler.record_poll("okx", now=60.0)
+        if scheduler.venues["okx"].interval != previous / 2:
+            print(f"❌ 整頁新成交未減半: {previous} → {scheduler.venues['okx'].interval}")
+            return False
+        print(f"   整頁新成交時間隔減半: {previous} → {scheduler.venues['okx'].interval}")
+        
+        # 收到 429：間隔加倍直到 ceiling
+        limiter = RateLimiter({"okx": {"capacity": 20, "refill": 10}})
+        scheduler = AdaptiveScheduler(limiter, exchanges=["okx"], floor=5.0, ceiling=60.0)
+        scheduler.record_poll("okx", now=0.0)
+        intervals = [scheduler.venues["okx"].interval]
+        for step in range(1, 4):
+            limiter.observe("okx", 429, {"Retry-After": "0"})
+            scheduler.record_poll("okx", now=step * 100.0)
+            intervals.append(scheduler.venues["okx"].interval)
+        if intervals[1:] != [min(60.0, intervals[0] * 2 ** n) for n in range(1, 4)]:
+            print(f"❌ 429 未加倍間隔: {intervals}")
+            return False
+        print(f"   429 時間隔加倍: {intervals}")
+        
+        # 移除所有交易所：排程器仍定期醒來（供設定檔熱重載）
+        scheduler.configure([])
+        if scheduler.next_wakeup(now=0.0) != scheduler.ceiling or scheduler.due(now=0.0):
+            print("❌ 無交易所時 next_wakeup 錯誤")
+            return False
+        if AdaptiveScheduler(exchanges=[]).venues:
+            print("❌ 空交易所清單被當成全部交易所")
+            return False
+        print("   無交易所時 next_wakeup 回傳 ceiling")
+        
+        print("✅ 自適應輪詢排程正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 自適應輪詢測試失敗: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 def test_dependencies():
     """測試依賴庫"""
     print("\n📦 測試 4: Python 依賴庫")
@@ -238,14 +925,51 @@ async def main():
     config_ok = await test_config_module()
     test_results.append(("配置模組", config_ok))
     
-    # 測試交易所掃描器
-    scanner_ok = await test_exchange_scanner()
+    # 測試交易所掃描器（有錄製檔時離線重播）
+    cassette = os.environ.get("TEST_CASSETTE")
+    scanner_ok = await (test_scanner_replay(cassette) if cassette else test_exchange_scanner())
     test_results.append(("交易所掃描器", scanner_ok))
     
     # 測試Telegram模組
     telegram_ok = test_telegram_module()
     test_results.append(("Telegram模組", telegram_ok))
     
+    # 測試訂單簿（離線）
+    book_ok = await test_order_book_offline()
+    test_results.append(("訂單簿", book_ok))
+    
+    # 測試多節點分片（離線）
+    cluster_ok = await test_cluster_offline()
+    test_results.append(("多節點分片", cluster_ok))
+    
+    # 測試共享記憶體快照（離線）
+    snapshot_ok = test_snapshot_shm()
+    test_results.append(("共享記憶體快照", snapshot_ok))
+    
+    # 測試設定檔熱重載（離線）
+    reload_ok = test_config_reload()
+    test_results.append(("設定檔熱重載", reload_ok))
+    
+    # 測試訊息模板（離線）
+    templates_ok = test_telegram_templates()
+    test_results.append(("訊息模板", templates_ok))
+    
+    # 測試速率限制（離線）
+    limiter_ok = await test_rate_limiter()
+    test_results.append(("速率限制", limiter_ok))
+    
+    # 測試請求合併（離線）
+    coalescer_ok = await test_request_coalescer()
+    test_results.append(("請求合併", coalescer_ok))
+    
+    # 測試價差監控（離線）
+    spread_ok = test_spread_monitor()
+    test_results.append(("價差監控", spread_ok))
+    
+    # 測試自適應輪詢（離線）
+    scheduler_ok = test_adaptive_scheduler()
+    test_results.append(("自適應輪詢", scheduler_ok))
+    
     # 顯示測試總結
     print("\n" + "=" * 70)
     print("📋 測試總結")
@@ -276,6 +1000,24 @@ async def main():
             print("   3. 檢查網絡連接和API端點")
         if not telegram_ok:
             print("   4. 確認 Telegram Bot Token 和 Chat ID")
+        if not book_ok:
+            print("   5. 檢查 order_book.py 訂單簿邏輯")
+        if not cluster_ok:
+            print("   6. 檢查 cluster.py 分片與協調者")
+        if not snapshot_ok:
+            print("   7. 檢查 snapshot_shm.py 快照格式與序號鎖")
+        if not reload_ok:
+            print("   8. 檢查 config_reload.py 驗證與套用流程")
+        if not templates_ok:
+            print("   9. 檢查 telegram_templates.py 模板與欄位")
+        if not limiter_ok:
+            print("   10. 檢查 rate_limiter.py 令牌桶與優先佇列")
+        if not coalescer_ok:
+            print("   11. 檢查 request_coalescer.py 合併與取消處理")
+        if not spread_ok:
+            print("   12. 檢查 spread_monitor.py 索引堆積與價差計算")
+        if not scheduler_ok:
+            print("   13. 檢查 adaptive_poller.py 輪詢間隔與退避")
     
     print(f"⏰ 測試結束時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 70)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+成交紀錄向量化解析
+將各交易所的成交頁面一次轉為 NumPy 陣列（價格、數量、方向、時間），
+並以向量化運算計算買賣量、VWAP 與高低價
+NumPy 每次呼叫有固定成本：成交頁少於 PAGE_VECTORIZE_MIN_TRADES 筆時改為逐筆解析成 list（TradeRows），
+彙總、分鐘買賣量與成交額草圖都直接走純 Python 迴圈，結果相同（交叉點見 bench_trade_parsing.py）
+"""
+
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import TRADE_FIELD_MAPPING
+
+# 少於此筆數時純 Python 較快（見 bench_trade_parsing.py）
+PAGE_VECTORIZE_MIN_TRADES = 200  # 原始成交頁：掃描器整頁流程（解析、彙總、分鐘買賣量、草圖）
+SUMMARY_MIN_VECTORIZED = 64  # 已解析的 TradeArrays：只比較彙總運算
+
+
+class TradeArrays:
+    """標準化成交陣列（依時間由舊到新排序）
+
+    price/qty 為 float64，side 為 int8（1=主動買入，-1=主動賣出，0=未知）。
+    timestamp（int64 毫秒）在首次存取時才解析，只算彙總時不付這筆成本。
+    """
+
+    __slots__ = ("price", "qty", "side", "_timestamp", "_raw_trades", "_time_key", "_time_scale", "_reverse")
+
+    def __init__(self, price: np.ndarray, qty: np.ndarray, side: np.ndarray,
+                 timestamp: Optional[np.ndarray] = None, raw_trades: Optional[list] = None,
+                 time_key=None, time_scale: int = 1, reverse: bool = False):
+        self.price = price
+        self.qty = qty
+        self.side = side
+        self._timestamp = timestamp
+        self._raw_trades = raw_trades
+        self._time_key = time_key
+        self._time_scale = time_scale
+        self._reverse = reverse
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    @property
+    def timestamp(self) -> np.ndarray:
+        if self._timestamp is None:
+            timestamp = (_floats(self._raw_trades, self._time_key) * self._time_scale).astype(np.int64)
+            self._timestamp = timestamp[::-1] if self._reverse else timestamp
+            self._raw_trades = None
+        return self._timestamp
+
+    def tail(self, n: int) -> "TradeArrays":
+        """最新的 n 筆（視圖，不複製）"""
+        if n >= len(self):
+            return self
+        return TradeArrays(self.price[-n:], self.qty[-n:], self.side[-n:], self.timestamp[-n:])
+
+    def newest(self) -> int:
+        """最新成交時間（毫秒，需至少一筆）"""
+        return int(self.timestamp.max())
+
+    def count_after(self, after: int) -> int:
+        """時間晚於 after（毫秒）的成交筆數"""
+        return int((self.timestamp > after).sum())
+
+
+class TradeRows:
+    """逐筆解析的標準化成交（list，依時間由舊到新），欄位與 TradeArrays 相同
+
+    小成交頁建立 NumPy 陣列與之後每次向量運算的固定成本高於逐筆迴圈，
+    summarize_trades、minute_flow 與 TradeSizeStore.ingest 對兩種型別都適用
+    """
+
+    __slots__ = ("price", "qty", "side", "timestamp")
+
+    def __init__(self, price: List[float], qty: List[float], side: List[int], timestamp: List[int]):
+        self.price = price
+        self.qty = qty
+        self.side = side
+        self.timestamp = timestamp
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    def tail(self, n: int) -> "TradeRows":
+        """最新的 n 筆"""
+        if n >= len(self):
+            return self
+        return TradeRows(self.price[-n:], self.qty[-n:], self.side[-n:], self.timestamp[-n:])
+
+    def newest(self) -> int:
+        return max(self.timestamp)
+
+    def count_after(self, after: int) -> int:
+        return sum(1 for timestamp in self.timestamp if timestamp > after)
+
+
+@dataclass
+class TradeSummary:
+    """成交彙總"""
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    buy_volume: float
+    sell_volume: float
+    vwap: float
+    count: int
+
+
+class _SideLookup(dict):
+    """方向對照表（未知方向視為 0）"""
+
+    def __missing__(self, key):
+        return 0
+
+
+_SIDE_LOOKUPS = {
+    exchange_id: _SideLookup({mapping['buy']: 1, mapping['sell']: -1})
+    for exchange_id, mapping in TRADE_FIELD_MAPPING.items()
+}
+
+
+# 逐筆解析用的欄位：(價格, 數量, 方向, 時間, 時間換算成毫秒的倍數)
+_ROW_FIELDS = {
+    exchange_id: (mapping['price'], mapping['qty'], mapping['side'], mapping['time'], 1000 // mapping['time_unit'])
+    for exchange_id, mapping in TRADE_FIELD_MAPPING.items()
+}
+
+
+def _floats(trades: list, key) -> np.ndarray:
+    """批次取出欄位並轉為 float64（迭代與轉換都在 C 層完成）"""
+    return np.fromiter(map(float, map(itemgetter(key), trades)), dtype=np.float64, count=len(trades))
+
+
+def normalize_trades(exchange_id: str, trades: List, limit: Optional[int] = None) -> TradeArrays:
+    """將交易所原始成交頁面轉為 TradeArrays
+
+    limit 指定時只保留最新的 limit 筆，且只解析這些成交。
+    排序依 TRADE_FIELD_MAPPING 的 newest_first 決定，不需先解析時間戳。
+    """
+    mapping = TRADE_FIELD_MAPPING[exchange_id]
+    newest_first = mapping['newest_first']
+    if limit is not None and len(trades) > limit:
+        trades = trades[:limit] if newest_first else trades[-limit:]
+
+    count = len(trades)
+    if count == 0:
+        return TradeArrays(np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64),
+                           np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int64))
+
+    price = _floats(trades, mapping['price'])
+    qty = _floats(trades, mapping['qty'])
+    side = np.fromiter(
+        map(_SIDE_LOOKUPS[exchange_id].__getitem__, map(itemgetter(mapping['side']), trades)),
+        dtype=np.int8, count=count
+    )
+
+    # 統一排成由舊到新（反轉為視圖，不複製）
+    if newest_first:
+        price, qty, side = price[::-1], qty[::-1], side[::-1]
+
+    return TradeArrays(price, qty, side, raw_trades=trades, time_key=mapping['time'],
+                       time_scale=1000 // mapping['time_unit'], reverse=newest_first)
+
+
+def parse_rows(exchange_id: str, trades: List) -> TradeRows:
+    """單次迴圈把成交頁解析為 TradeRows"""
+    price_key, qty_key, side_key, time_key, time_scale = _ROW_FIELDS[exchange_id]
+    sides = _SIDE_LOOKUPS[exchange_id]
+    if TRADE_FIELD_MAPPING[exchange_id]['newest_first']:
+        trades = trades[::-1]
+    prices, quantities, directions, timestamps = [], [], [], []
+    for trade in trades:
+        prices.append(float(trade[price_key]))
+        quantities.append(float(trade[qty_key]))
+        directions.append(sides[trade[side_key]])
+        timestamps.append(int(float(trade[time_key]) * time_scale))
+    return TradeRows(prices, quantities, directions, timestamps)
+
+
+def normalize_page(exchange_id: str, trades: List, min_vectorized: int = PAGE_VECTORIZE_MIN_TRADES):
+    """掃描器的成交頁入口：少於 min_vectorized 筆時逐筆解析為 TradeRows，否則為 TradeArrays"""
+    if len(trades) < min_vectorized:
+        return parse_rows(exchange_id, trades)
+    return normalize_trades(exchange_id, trades)
+
+
+def _summary(prices: List[float], volume: float, buy_volume: float, sell_volume: float,
+             notional: float) -> TradeSummary:
+    """由依時間由舊到新的價格與累計量組出 TradeSummary"""
+    return TradeSummary(
+        open=prices[0],
+        high=max(prices),
+        low=min(prices),
+        close=prices[-1],
+        volume=volume,
+        buy_volume=buy_volume,
+        sell_volume=sell_volume,
+        vwap=notional / volume if volume > 0 else prices[-1],
+        count=len(prices)
+    )
+
+
+def summarize_trades(trades, min_vectorized: int = SUMMARY_MIN_VECTORIZED) -> Optional[TradeSummary]:
+    """向量化計算買賣量、VWAP 與 OHLC（無成交時回傳 None；TradeRows 或少於 min_vectorized 筆時逐筆計算）"""
+    if len(trades) == 0:
+        return None
+    if isinstance(trades, TradeRows) or len(trades) < min_vectorized:
+        if isinstance(trades, TradeRows):
+            prices, quantities, sides = trades.price, trades.qty, trades.side
+        else:
+            prices, quantities, sides = trades.price.tolist(), trades.qty.tolist(), trades.side.tolist()
+        volume = buy_volume = sell_volume = notional = 0.0
+        for price, qty, side in zip(prices, quantities, sides):
+            volume += qty
+            notional += price * qty
+            if side > 0:
+                buy_volume += qty
+            elif side < 0:
+                sell_volume += qty
+        return _summary(prices, volume, buy_volume, sell_volume, notional)
+
+    qty = trades.qty
+    volume = float(qty.sum())
+    buy_volume = float(np.dot(qty, trades.side > 0))
+    sell_volume = float(np.dot(qty, trades.side < 0))
+    vwap = float(np.dot(trades.price, qty) / volume) if volume > 0 else float(trades.price[-1])
+
+    return TradeSummary(
+        open=float(trades.price[0]),
+        high=float(trades.price.max()),
+        low=float(trades.price.min()),
+        close=float(trades.price[-1]),
+        volume=volume,
+        buy_volume=buy_volume,
+        sell_volume=sell_volume,
+        vwap=vwap,
+        count=len(trades)
+    )
+
+
+def minute_flow(trades, after: Optional[int] = None) -> Dict[int, Tuple[float, float]]:
+    """時間晚於 after（毫秒）的成交，依成交所在分鐘（開盤時間，毫秒）彙總 (主動買入量, 主動賣出量)"""
+    if len(trades) == 0:
+        return {}
+    if isinstance(trades, TradeRows):
+        buckets: Dict[int, List[float]] = {}
+        for timestamp, qty, side in zip(trades.timestamp, trades.qty, trades.side):
+            if after is not None and timestamp <= after:
+                continue
+            bucket = buckets.get(timestamp - timestamp % 60_000)
+            if bucket is None:
+                bucket = buckets[timestamp - timestamp % 60_000] = [0.0, 0.0]
+            if side > 0:
+                bucket[0] += qty
+            elif side < 0:
+                bucket[1] += qty
+        return {minute: (buy, sell) for minute, (buy, sell) in buckets.items()}
+    timestamp, qty, side = trades.timestamp, trades.qty, trades.side
+    if after is not None:
+        fresh = timestamp > after
+        if not fresh.any():
+            return {}
+        timestamp, qty, side = timestamp[fresh], qty[fresh], side[fresh]
+    minutes = timestamp - timestamp % 60_000
+    flow = {}
+    for minute in np.unique(minutes).tolist():
+        in_minute = minutes == minute
+        flow[minute] = (float(np.dot(qty, in_minute & (side > 0))), float(np.dot(qty, in_minute & (side < 0))))
+    return flow
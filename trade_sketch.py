@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+單筆成交額的串流分位數草圖
+買賣量只看總量時，一筆 1,000 DUSK 與一筆 1,000,000 DUSK 的成交權重相同；
+每個 (交易對, 交易所) 以 KLL 草圖累積單筆成交額（價格 × 數量）的分佈，記憶體有上限，
+可跨交易所合併、可寫入檢查點，用於：
+  - 大戶成交：成交額 ≥ WHALE_QUANTILE 分位，另計大戶買賣量
+  - 大額成交警報：新成交中成交額 ≥ LARGE_TRADE_QUANTILE 分位
+各次掃描的成交頁會重疊，只有時間晚於上次已納入成交的紀錄才會更新草圖
+"""
+
+import json
+import math
+import os
+import random
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    TRADE_SKETCH_K, TRADE_SKETCH_FILE, WHALE_QUANTILE, LARGE_TRADE_QUANTILE, WHALE_MIN_SAMPLES
+)
+from radar_logging import get_logger
+from trade_normalizer import TradeArrays, TradeRows
+
+logger = get_logger("trade_sketch")
+
+SketchKey = Tuple[str, str]  # (symbol, exchange_id)
+
+
+class KLLSketch:
+    """KLL 分位數草圖：第 h 層每個數值代表 2^h 筆樣本，滿層時排序後隔一取一併入上層"""
+
+    __slots__ = ("k", "n", "levels", "min", "max", "_random", "_sorted")
+
+    def __init__(self, k: int = TRADE_SKETCH_K):
+        self.k = k
+        self.n = 0
+        self.levels: List[List[float]] = [[]]
+        self.min = math.inf
+        self.max = -math.inf
+        self._random = random.Random(k)  # 隨機取奇偶位，使誤差不偏向一側
+        self._sorted: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items.sort()
+                # 奇數個時最大值留在本層，其餘兩兩取一
+                rest = [items.pop()] if len(items) % 2 else []
+                self.levels[level + 1].extend(items[self._random.getrandbits(1)::2])
+                self.levels[level] = rest
+            level += 1
+
+    def update(self, value: float):
+        self.update_many((value,))
+
+    def update_many(self, values: Iterable[float]):
+        values = [float(v) for v in values]
+        if not values:
+            return
+        self.n += len(values)
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+        self.levels[0].extend(values)
+        self._compress()
+        self._sorted = None
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """併入另一個草圖（原地），回傳自身"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        self._sorted = None
+        return self
+
+    def _weighted(self) -> Tuple[np.ndarray, np.ndarray]:
+        """排序後的數值與累積權重（更新前重複查詢共用）"""
+        if self._sorted is None:
+            values = np.fromiter((v for items in self.levels for v in items), dtype=np.float64)
+            weights = np.fromiter((1 << level for level, items in enumerate(self.levels) for _ in items),
+                                  dtype=np.float64, count=len(values))
+            order = np.argsort(values, kind="stable")
+            self._sorted = (values[order], np.cumsum(weights[order]))
+        return self._sorted
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.n == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        values, cumulative = self._weighted()
+        index = int(np.searchsorted(cumulative, q * cumulative[-1], side="left"))
+        return float(values[min(index, len(values) - 1)])
+
+    def rank(self, value: float) -> Optional[float]:
+        """小於等於 value 的樣本比例"""
+        if self.n == 0:
+            return None
+        values, cumulative = self._weighted()
+        index = int(np.searchsorted(values, value, side="right"))
+        return float(cumulative[index - 1] / cumulative[-1]) if index else 0.0
+
+    def to_dict(self) -> Dict:
+        return {"k": self.k, "n": self.n, "min": self.min, "max": self.max, "levels": self.levels}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "KLLSketch":
+        sketch = cls(int(data["k"]))
+        sketch.n = int(data["n"])
+        sketch.levels = [list(map(float, items)) for items in data["levels"]] or [[]]
+        if sketch.n:
+            sketch.min = float(data["min"])
+            sketch.max = float(data["max"])
+        return sketch
+
+
+@dataclass
+class WhaleFlow:
+    """一次成交頁的大戶統計"""
+    threshold: Optional[float]  # 大戶成交額門檻（樣本不足時為 None）
+    buy_volume: float = 0.0  # 大戶主動買入量
+    sell_volume: float = 0.0  # 大戶主動賣出量
+    large_trade: Optional[Dict] = None  # 本次新成交中最大的一筆大額成交
+
+
+class TradeSizeStore:
+    """所有 (交易對, 交易所) 的成交額草圖與檢查點"""
+
+    def __init__(self, path: str = TRADE_SKETCH_FILE, k: int = TRADE_SKETCH_K):
+        self.path = path
+        self.k = k
+        self.sketches: Dict[SketchKey, KLLSketch] = {}
+        self.last_trade_time: Dict[SketchKey, int] = {}  # 已納入草圖的最新成交時間（毫秒）
+
+    def get(self, symbol: str, exchange_id: str) -> KLLSketch:
+        key = (symbol, exchange_id)
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = KLLSketch(self.k)
+        return sketch
+
+    def merged(self, symbol: str) -> KLLSketch:
+        """該交易對所有交易所合併後的分佈"""
+        merged = KLLSketch(self.k)
+        for (sketch_symbol, _), sketch in self.sketches.items():
+            if sketch_symbol == symbol:
+                merged.merge(sketch)
+        return merged
+
+    def ingest(self, symbol: str, exchange_id: str, trades, window) -> WhaleFlow:
+        """以更新前的分佈判斷大戶成交，再把新成交納入草圖
+
+        trades 為整頁成交（用於更新草圖與大額成交警報），window 為計算買賣比的最近幾筆；
+        兩者為 TradeArrays 或 TradeRows（小成交頁）
+        """
+        key = (symbol, exchange_id)
+        sketch = self.get(symbol, exchange_id)
+        warmed_up = sketch.n >= WHALE_MIN_SAMPLES
+        whale_threshold = sketch.quantile(WHALE_QUANTILE) if warmed_up else None
+        flow = WhaleFlow(whale_threshold)
+        if isinstance(trades, TradeRows):
+            return self._ingest_rows(key, sketch, flow, trades, window)
+
+        if whale_threshold is not None and len(window):
+            notional = window.price * window.qty
+            is_whale = notional >= whale_threshold
+            flow.buy_volume = float(np.dot(window.qty, is_whale & (window.side > 0)))
+            flow.sell_volume = float(np.dot(window.qty, is_whale & (window.side < 0)))
+
+        if not len(trades):
+            return flow
+        timestamp = trades.timestamp
+        last_time = self.last_trade_time.get(key)
+        fresh = timestamp > last_time if last_time is not None else np.ones(len(trades), dtype=bool)
+        if not fresh.any():
+            return flow
+        notional = (trades.price * trades.qty)[fresh]
+        self.last_trade_time[key] = int(timestamp.max())
+
+        if warmed_up:
+            large_threshold = sketch.quantile(LARGE_TRADE_QUANTILE)
+            largest = int(np.argmax(notional))
+            if notional[largest] >= large_threshold:
+                side = int(trades.side[fresh][largest])
+                flow.large_trade = {
+                    "notional": float(notional[largest]),
+                    "price": float(trades.price[fresh][largest]),
+                    "qty": float(trades.qty[fresh][largest]),
+                    "side": "buy" if side > 0 else "sell" if side < 0 else "unknown",
+                    "time": int(timestamp[fresh][largest]),
+                    "threshold": large_threshold,
+                    "percentile": sketch.rank(float(notional[largest])),
+                }
+        sketch.update_many(notional.tolist())
+        return flow
+
+    def _ingest_rows(self, key: SketchKey, sketch: KLLSketch, flow: WhaleFlow,
+                     trades: TradeRows, window: TradeRows) -> WhaleFlow:
+        """ingest 的逐筆版本（與向量化版本結果相同）"""
+        if flow.threshold is not None:
+            for price, qty, side in zip(window.price, window.qty, window.side):
+                if price * qty >= flow.threshold:
+                    if side > 0:
+                        flow.buy_volume += qty
+                    elif side < 0:
+                        flow.sell_volume += qty
+
+        if not len(trades):
+            return flow
+        last_time = self.last_trade_time.get(key)
+        fresh = [i for i, timestamp in enumerate(trades.timestamp) if last_time is None or timestamp > last_time]
+        if not fresh:
+            return flow
+        notional = [trades.price[i] * trades.qty[i] for i in fresh]
+        self.last_trade_time[key] = trades.newest()
+
+        if flow.threshold is not None:
+            large_threshold = sketch.quantile(LARGE_TRADE_QUANTILE)
+            largest = max(range(len(fresh)), key=notional.__getitem__)
+            if notional[largest] >= large_threshold:
+                i = fresh[largest]
+                side = trades.side[i]
+                flow.large_trade = {
+                    "notional": notional[largest],
+                    "price": trades.price[i],
+                    "qty": trades.qty[i],
+                    "side": "buy" if side > 0 else "sell" if side < 0 else "unknown",
+                    "time": trades.timestamp[i],
+                    "threshold": large_threshold,
+                    "percentile": sketch.rank(notional[largest]),
+                }
+        sketch.update_many(notional)
+        return flow
+
+    @classmethod
+    def load(cls, path: str = TRADE_SKETCH_FILE, k: int = TRADE_SKETCH_K) -> "TradeSizeStore":
+        """讀取檢查點；檔案不存在或損壞時從零開始"""
+        store = cls(path, k)
+        if not os.path.exists(path):
+            return store
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            for row in saved.get("sketches", []):
+                key = (row["symbol"], row["exchange"])
+                store.sketches[key] = KLLSketch.from_dict(row["sketch"])
+                if row.get("last_trade_time") is not None:
+                    store.last_trade_time[key] = int(row["last_trade_time"])
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning("⚠️  成交額草圖讀取失敗，重新累計: %s", e, extra={"path": path})
+        return store
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        rows = [{"symbol": symbol, "exchange": exchange_id, "sketch": sketch.to_dict(),
+                 "last_trade_time": self.last_trade_time.get((symbol, exchange_id))}
+                for (symbol, exchange_id), sketch in self.sketches.items()]
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"sketches": rows}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)